@@ -3,18 +3,18 @@
 from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
 from passlib.context import CryptContext
-from pymongo import MongoClient
 from dotenv import load_dotenv
 import os, requests
 from pathlib import Path
 
 # Import our API configuration service
 from app.services.api_config import load_api_key, is_api_configured
+from app.db.mongo import get_client
 
 load_dotenv(dotenv_path=Path(__file__).resolve().parent / ".." / ".env")
 # === MongoDB Setup ===
 MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
-client = MongoClient(MONGO_URI)
+client = get_client(MONGO_URI)
 db = client["chaewon_db"]
 users_collection = db["users"]
 
@@ -10,6 +10,22 @@ class Config:
     DB_NAME = os.getenv("MONGO_DB_NAME", "ProjectATS")
     COLLECTION_NAME = os.getenv("MONGO_COLLECTION", "accounts")
 
+    # MongoClient connection pooling (shared by every client in app.db.mongo)
+    MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "20"))
+    MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "2"))
+    MONGO_MAX_IDLE_TIME_MS = int(os.getenv("MONGO_MAX_IDLE_TIME_MS", "300000"))
+
+    # Raise instead of logging when a hot query's plan regresses to a full scan (see app.db.indexes)
+    STRICT_INDEX_CHECKS = os.getenv("STRICT_INDEX_CHECKS", "0") == "1"
+
+    # Rendered chart PNG cache (see app.services.chart_cache); no directory = memory only
+    CHART_CACHE_MB = int(os.getenv("CHART_CACHE_MB", "64"))
+    CHART_CACHE_DIR = os.getenv("CHART_CACHE_DIR")
+    CHART_CACHE_DISK_MB = int(os.getenv("CHART_CACHE_DISK_MB", "256"))
+
+    # Where run_complete_analysis(save_charts=True) writes hi-res PNG, SVG and thumbnail per chart
+    CHART_EXPORT_DIR = Path(os.getenv("CHART_EXPORT_DIR", "charts"))
+
     # File paths
     ROOT_DIR = Path(os.getenv("ROOT_DIR", "app"))
     SUB_DIR = "auth"
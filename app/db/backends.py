@@ -0,0 +1,286 @@
+"""
+Storage backends for the accounts store, selected through `DBMode`.
+
+Each backend implements the same operations (find / insert / update / match)
+so `db_manager` never branches on the active database. The in-memory backend does
+no I/O at all, which keeps UI and service benchmarks free of DB latency.
+"""
+import copy
+import threading
+from enum import Enum
+
+from pymongo.errors import PyMongoError
+
+from app.db.mongo import get_collection, mongo_supervisor
+from app.db.sqlite import (
+    connect_to_sqlite, close_all_connections, find_user_sqlite, insert_user_sqlite, DBKey, REPLICA_TABLE,
+    update_user_sqlite, check_matching_document_sqlite, update_user_if_changed_sqlite)
+from app.db.replica import replicator, start_replication, stop_replication, server_now, UPDATED_AT
+from app.db.migrate import write_sqlite_batch, COLUMNS
+from app.db.indexes import (
+    ensure_account_indexes, provision_sqlite_indexes, verify_mongo_query_plans, check_query_plans)
+
+
+class DBMode(Enum):
+    MONGO = "MongoDB"
+    SQLITE = "SQLite"
+    MEMORY = "Memory"
+
+
+def _matches(doc: dict, value_checks: dict = None) -> bool:
+    if value_checks:
+        for key, expected_value in value_checks.items():
+            if doc.get(key) != expected_value:
+                return False
+    return True
+
+
+class UserBackend:
+    """Interface every accounts backend implements."""
+
+    mode: DBMode
+
+    def connect(self):
+        """Open the backend. Returns a truthy handle, or None if it is unreachable."""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def find_user(self, username: str):
+        raise NotImplementedError
+
+    def insert_user(self, username: str, hashed_password: str, op: bool = False):
+        raise NotImplementedError
+
+    def update_user(self, filter_query: dict, updated_fields: dict) -> bool:
+        raise NotImplementedError
+
+    def check_matching_document(self, filter_query: dict, value_checks: dict = None) -> bool:
+        raise NotImplementedError
+
+    def update_user_if_changed(self, filter_query: dict, updated_fields: dict) -> dict:
+        """Update only if a field differs. Returns {"matched": int, "modified": int}."""
+        raise NotImplementedError
+
+
+class MongoUserBackend(UserBackend):
+    """MongoDB Atlas, with the local SQLite replica as a read path and fallback."""
+
+    mode = DBMode.MONGO
+
+    def __init__(self):
+        self._active = False
+
+    def connect(self):
+        self._active = True
+        collection = get_collection()
+        if collection is not None:
+            self._on_connected(collection)
+        elif mongo_supervisor.started:
+            # First probe still pending: don't wait for it, finish setup once it connects
+            mongo_supervisor.when_connected(self._on_connected)
+        return collection
+
+    def close(self):
+        self._active = False
+        stop_replication()  # Don't overwrite local edits while working in SQLite mode
+
+    def _on_connected(self, accounts):
+        if not self._active:
+            return  # Switched to SQLite before the cluster came up
+        self._provision_indexes(accounts)
+        start_replication()
+
+    def _provision_indexes(self, accounts):
+        # A plan regression is printed, or raised under STRICT_INDEX_CHECKS (see check_query_plans)
+        try:
+            ensure_account_indexes(accounts)
+            check_query_plans(verify_mongo_query_plans, accounts=accounts)
+        except PyMongoError as e:
+            print(f"⚠️ Could not ensure account indexes: {e}")
+
+    def find_user(self, username: str):
+        # A fresh local replica answers in well under a millisecond; misses still go to Mongo
+        if replicator.is_fresh():
+            user = find_user_sqlite(connect_to_sqlite(), username, REPLICA_TABLE)
+            if user is not None:
+                return user
+
+        # The health monitor already knows Atlas is down: skip the blocking timeout
+        if not mongo_supervisor.known_unreachable():
+            try:
+                collection = get_collection()
+                if collection is not None:
+                    return collection.find_one({DBKey.USERNAME.value: username})
+            except PyMongoError as e:
+                print(f"❌ MongoDB lookup failed: {e}")
+
+        if replicator.has_synced():
+            print("↩️ MongoDB unavailable, serving user from the local replica.")
+            return find_user_sqlite(connect_to_sqlite(), username, REPLICA_TABLE)
+        return None
+
+    def _mirror_to_replica(self, filter_query: dict, updated_fields: dict = None, new_doc: dict = None):
+        """Apply a successful Mongo write to the local replica so it is visible immediately."""
+        try:
+            if new_doc is not None:
+                write_sqlite_batch([new_doc], REPLICA_TABLE)
+                return
+
+            username = filter_query.get(DBKey.USERNAME.value)
+            fields = {key: value for key, value in updated_fields.items() if key in COLUMNS}
+            if isinstance(username, str) and fields:
+                update_user_sqlite(connect_to_sqlite(), {DBKey.USERNAME.value: username}, fields, REPLICA_TABLE)
+            else:
+                replicator.request_sync()
+        except Exception as e:
+            print(f"⚠️ Could not mirror write to the local replica: {e}")
+            replicator.request_sync()
+
+    def insert_user(self, username: str, hashed_password: str, op: bool = False):
+        collection = get_collection()
+        doc = {
+            DBKey.USERNAME.value: username,
+            DBKey.PASSWORD.value: hashed_password,
+            DBKey.OP.value: op,
+            UPDATED_AT: server_now(collection)   # The server's clock, like $currentDate on updates
+        }
+        # A taken username raises DuplicateKeyError (unique index) and leaves that account untouched
+        collection.insert_one(doc)
+        self._mirror_to_replica({}, new_doc=doc)
+
+    def update_user(self, filter_query: dict, updated_fields: dict) -> bool:
+        update_payload = {"$set": updated_fields, "$currentDate": {UPDATED_AT: True}}
+        result = get_collection().update_one(filter_query, update_payload)
+        if result.matched_count > 0:
+            self._mirror_to_replica(filter_query, updated_fields)
+        return result.matched_count > 0
+
+    def check_matching_document(self, filter_query: dict, value_checks: dict = None) -> bool:
+        doc = get_collection().find_one(filter_query)
+        if not doc:
+            return False
+        return _matches(doc, value_checks)
+
+    def update_user_if_changed(self, filter_query: dict, updated_fields: dict) -> dict:
+        # Pipeline update: the fields are always $set (a no-op when equal), and
+        # updated_at only moves if an $or/$ne guard sees a real change. Mongo then
+        # reports matched=1, modified=0 for "no changes" in the same round trip.
+        changed = {"$or": [
+            {"$ne": [f"${key}", {"$literal": value}]} for key, value in updated_fields.items()
+        ]}
+        pipeline = [{"$set": {
+            **{key: {"$literal": value} for key, value in updated_fields.items()},
+            UPDATED_AT: {"$cond": [changed, "$$NOW", f"${UPDATED_AT}"]}
+        }}]
+
+        result = get_collection().update_one(filter_query, pipeline)
+        if result.modified_count > 0:
+            self._mirror_to_replica(filter_query, updated_fields)
+        return {"matched": result.matched_count, "modified": result.modified_count}
+
+
+class SQLiteUserBackend(UserBackend):
+    """Local SQLite file through the per-thread connection pool."""
+
+    mode = DBMode.SQLITE
+
+    def connect(self):
+        conn = connect_to_sqlite()
+        provision_sqlite_indexes(conn)
+        return conn
+
+    def close(self):
+        close_all_connections()
+
+    def find_user(self, username: str):
+        return find_user_sqlite(connect_to_sqlite(), username)
+
+    def insert_user(self, username: str, hashed_password: str, op: bool = False):
+        insert_user_sqlite(connect_to_sqlite(), username, hashed_password, op)
+
+    def update_user(self, filter_query: dict, updated_fields: dict) -> bool:
+        return update_user_sqlite(connect_to_sqlite(), filter_query, updated_fields)
+
+    def check_matching_document(self, filter_query: dict, value_checks: dict = None) -> bool:
+        return check_matching_document_sqlite(connect_to_sqlite(), filter_query, value_checks)
+
+    def update_user_if_changed(self, filter_query: dict, updated_fields: dict) -> dict:
+        return update_user_if_changed_sqlite(connect_to_sqlite(), filter_query, updated_fields)
+
+
+class MemoryUserBackend(UserBackend):
+    """Process-local dict indexed by username. No I/O; for tests and benchmarks."""
+
+    mode = DBMode.MEMORY
+
+    def __init__(self):
+        self._users: dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def connect(self):
+        return self
+
+    def close(self):
+        with self._lock:
+            self._users.clear()
+
+    def _select(self, filter_query: dict) -> list[dict]:
+        username = filter_query.get(DBKey.USERNAME.value)
+        if isinstance(username, str):
+            doc = self._users.get(username)
+            candidates = [doc] if doc is not None else []
+        else:
+            candidates = list(self._users.values())
+        return [doc for doc in candidates if _matches(doc, filter_query)]
+
+    def find_user(self, username: str):
+        with self._lock:
+            doc = self._users.get(username)
+            return copy.deepcopy(doc) if doc is not None else None
+
+    def insert_user(self, username: str, hashed_password: str, op: bool = False):
+        with self._lock:
+            if username in self._users:
+                raise ValueError(f"Duplicate username: {username}")
+            self._users[username] = {
+                DBKey.USERNAME.value: username,
+                DBKey.PASSWORD.value: hashed_password,
+                DBKey.OP.value: op
+            }
+
+    def update_user(self, filter_query: dict, updated_fields: dict) -> bool:
+        with self._lock:
+            matched = self._select(filter_query)[:1]  # update_one semantics
+            for doc in matched:
+                doc.update(updated_fields)
+            return bool(matched)
+
+    def check_matching_document(self, filter_query: dict, value_checks: dict = None) -> bool:
+        with self._lock:
+            matched = self._select(filter_query)
+            return bool(matched) and _matches(matched[0], value_checks)
+
+    def update_user_if_changed(self, filter_query: dict, updated_fields: dict) -> dict:
+        with self._lock:
+            matched = self._select(filter_query)[:1]
+            modified = [doc for doc in matched if not _matches(doc, updated_fields)]
+            for doc in modified:
+                doc.update(updated_fields)
+            return {"matched": len(matched), "modified": len(modified)}
+
+
+# == Registry ==
+BACKENDS: dict[DBMode, UserBackend] = {
+    DBMode.MONGO: MongoUserBackend(),
+    DBMode.SQLITE: SQLiteUserBackend(),
+    DBMode.MEMORY: MemoryUserBackend(),
+}
+
+def register_backend(backend: UserBackend):
+    """Install (or replace) the backend used for `backend.mode`."""
+    BACKENDS[backend.mode] = backend
+
+def get_backend(mode: DBMode) -> UserBackend:
+    return BACKENDS[mode]
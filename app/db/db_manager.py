@@ -1,59 +1,167 @@
 import threading
+import time
+import copy
 import flet as ft
-from enum import Enum
+from collections import OrderedDict
 from typing import Callable
 
 from app.db.mongo import get_collection
-from app.db.sqlite import (
-    connect_to_sqlite, find_user_sqlite, insert_user_sqlite, DBKey, update_user_sqlite,
-    check_matching_document_sqlite)
+from app.db.sqlite import DBKey
+from app.db.backends import DBMode, UserBackend, get_backend
 from app.ui.screens.loading_screen import show_loading_screen
+from app.utils import run_blocking
 
 
-class DBMode(Enum):
-    MONGO = "MongoDB"
-    SQLITE = "SQLite"
-
 mode = "mode"
 db_mode = {mode: DBMode.MONGO}  # Default: MongoDB
-collection = None
-sqlite_conn = None
+connection = None  # Handle returned by the active backend's connect()
 initialized = False
 
 
+class UserCache:
+    """
+    Thread-safe LRU + TTL cache of user documents keyed by username.
+
+    Documents are copied in and out so callers can never mutate a cached entry.
+    A read takes a `read_token()` before going to the backend; its put() is dropped if
+    the user was invalidated since, so a read racing an update cannot re-cache the old record.
+    """
+
+    def __init__(self, max_size: int = 256, ttl: float = 60.0, max_invalidations: int = 1024):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.max_invalidations = max_invalidations
+        self._entries: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        self._version = 0   # Bumped by every invalidate / clear
+        self._invalidated: OrderedDict[str, int] = OrderedDict()   # username -> version of its last invalidation
+        self._floor = 0     # Tokens below this are stale for every user (a clear, or a forgotten invalidation)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, username: str):
+        with self._lock:
+            entry = self._entries.get(username)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            stored_at, doc = entry
+            if time.monotonic() - stored_at > self.ttl:
+                del self._entries[username]
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(username)
+            self.hits += 1
+            return copy.deepcopy(doc)
+
+    def read_token(self) -> int:
+        with self._lock:
+            return self._version
+
+    def put(self, username: str, doc: dict, token: int = None):
+        """Cache `doc`, unless `token` is from before the user's latest invalidation."""
+        with self._lock:
+            if token is not None and (token < self._floor or token < self._invalidated.get(username, 0)):
+                return
+            self._entries[username] = (time.monotonic(), copy.deepcopy(doc))
+            self._entries.move_to_end(username)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, username: str):
+        with self._lock:
+            self._entries.pop(username, None)
+            self._version += 1
+            self._invalidated[username] = self._version
+            self._invalidated.move_to_end(username)
+            while len(self._invalidated) > self.max_invalidations:
+                _, version = self._invalidated.popitem(last=False)
+                self._floor = max(self._floor, version)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._version += 1
+            self._floor = self._version
+            self._invalidated.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
+
+user_cache = UserCache()
+
+def get_user_cache_stats() -> dict:
+    return user_cache.stats()
+
+def _invalidate_users(filter_query: dict):
+    # Only username-keyed filters can be invalidated precisely
+    username = filter_query.get(DBKey.USERNAME.value)
+    if isinstance(username, str):
+        user_cache.invalidate(username)
+    else:
+        user_cache.clear()
+
+
 def toggle_db() -> DBMode:
-    global db_mode, collection, sqlite_conn, initialized
     old_mode = db_mode[mode]
-    db_mode[mode] = DBMode.SQLITE if old_mode == DBMode.MONGO else DBMode.MONGO
-    print(f"Toggled DB mode from {old_mode.value} to {db_mode[mode].value}")
-    
+    new_mode = DBMode.SQLITE if old_mode == DBMode.MONGO else DBMode.MONGO
+    print(f"Toggled DB mode from {old_mode.value} to {new_mode.value}")
+    return set_db_mode(new_mode)
+
+def set_db_mode(new_mode: DBMode) -> DBMode:
+    """Switch to any registered backend (e.g. DBMode.MEMORY for benchmarks)."""
+    global connection, initialized
+    old_mode = db_mode[mode]
+    if old_mode != new_mode:
+        get_backend(old_mode).close()
+
     # Reset initialization state
-    collection = None
-    sqlite_conn = None
+    db_mode[mode] = new_mode
+    connection = None
     initialized = False
+    user_cache.clear()  # Cached documents belong to the previous backend
 
     return db_mode[mode]
 
 def get_current_mode():
     return db_mode[mode]
 
+def current_backend() -> UserBackend:
+    return get_backend(db_mode[mode])
+
 def find_user(username):
-    if db_mode[mode] == DBMode.MONGO:
-        return get_collection().find_one({DBKey.USERNAME.value: username})
-    else:
-        conn = connect_to_sqlite()
-        return find_user_sqlite(conn, username)
+    cached = user_cache.get(username)
+    if cached is not None:
+        return cached
+
+    token = user_cache.read_token()
+    user = current_backend().find_user(username)
+
+    # Misses are not cached so a fresh registration is visible immediately
+    if user is not None:
+        user_cache.put(username, user, token)
+    return user
 
 def insert_user(username: str, hashed_password: str, op: bool = False):
-    if db_mode[mode] == DBMode.MONGO:
-        get_collection().insert_one({
-            DBKey.USERNAME.value: username,
-            DBKey.PASSWORD.value: hashed_password,
-            DBKey.OP.value: op
-        })
-    else:
-        conn = connect_to_sqlite()
-        insert_user_sqlite(conn, username, hashed_password, op)
+    try:
+        current_backend().insert_user(username, hashed_password, op)
+    finally:
+        user_cache.invalidate(username)
 
 def update_user(filter_query: dict, updated_fields: dict) -> bool:
     """
@@ -66,13 +174,11 @@ def update_user(filter_query: dict, updated_fields: dict) -> bool:
     Returns:
         bool: True if the update matched a document, False otherwise
     """
-    if db_mode[mode] == DBMode.MONGO:
-        update_payload = {"$set": updated_fields}
-        result = get_collection().update_one(filter_query, update_payload)
-        return result.matched_count > 0
-    else:
-        conn = connect_to_sqlite()
-        return update_user_sqlite(conn, filter_query, updated_fields)
+    try:
+        return current_backend().update_user(filter_query, updated_fields)
+    finally:
+        # Invalidate after the write; a read that started before it has its put() dropped (see read_token)
+        _invalidate_users(filter_query)
 
 def check_matching_document(filter_query: dict, value_checks: dict = None) -> bool:
     """
@@ -85,43 +191,67 @@ def check_matching_document(filter_query: dict, value_checks: dict = None) -> bo
     Returns:
         bool: True if matching document and all specified fields match, else False.
     """
-    if db_mode[mode] == DBMode.MONGO:
-        doc = get_collection().find_one(filter_query)
-        if not doc:
-            return False
+    return current_backend().check_matching_document(filter_query, value_checks)
 
-        if value_checks:
-            for key, expected_value in value_checks.items():
-                if doc.get(key) != expected_value:
-                    return False
+def update_user_if_changed(filter_query: dict, updated_fields: dict) -> dict:
+    """
+    Update a user only if at least one field differs, in a single conditional write.
 
-        return True
-    else:
-        conn = connect_to_sqlite()
-        return check_matching_document_sqlite(conn, filter_query, value_checks)
+    Replaces the check_matching_document + update_user pair.
+
+    Args:
+        filter_query (dict): The filter used to find the document (e.g. {"username": "chae"})
+        updated_fields (dict): Dictionary of fields to update
+
+    Returns:
+        dict: {"matched": int, "modified": int}. matched=0 means no such user;
+        matched>0 with modified=0 means nothing needed updating.
+    """
+    result = current_backend().update_user_if_changed(filter_query, updated_fields)
+    if result["modified"]:
+        _invalidate_users(filter_query)
+    return result
+
+# == Async facade ==
+# Awaitable versions of the calls above for use inside async Flet handlers.
+# They run on a bounded thread pool so slow round trips never block the event loop.
+
+async def find_user_async(username):
+    return await run_blocking(find_user, username)
+
+async def insert_user_async(username: str, hashed_password: str, op: bool = False):
+    return await run_blocking(insert_user, username, hashed_password, op)
+
+async def update_user_async(filter_query: dict, updated_fields: dict) -> bool:
+    return await run_blocking(update_user, filter_query, updated_fields)
+
+async def check_matching_document_async(filter_query: dict, value_checks: dict = None) -> bool:
+    return await run_blocking(check_matching_document, filter_query, value_checks)
+
+async def update_user_if_changed_async(filter_query: dict, updated_fields: dict) -> dict:
+    return await run_blocking(update_user_if_changed, filter_query, updated_fields)
+
+async def get_collection_async():
+    return await run_blocking(get_collection)
 
 def init_database(page: ft.Page = None, callback: Callable = None):
-    global collection, sqlite_conn, initialized
+    global connection, initialized
     print(f"init_database() Called with mode={db_mode[mode].value}, initialized={initialized}")
 
     if initialized:
         if callback:
             callback()
-        return collection if db_mode[mode] == DBMode.MONGO else sqlite_conn
+        return connection
 
     def db_init():
-        global collection, sqlite_conn, initialized
+        global connection, initialized
 
         if initialized:
             if callback:
                 callback()
             return
 
-        if db_mode[mode] == DBMode.MONGO:
-            collection = get_collection()
-        else:
-            sqlite_conn = connect_to_sqlite()
-
+        connection = current_backend().connect()
         initialized = True
 
         if callback:
@@ -133,7 +263,7 @@ def init_database(page: ft.Page = None, callback: Callable = None):
         return None
     else:
         db_init()
-        return collection if db_mode[mode] == DBMode.MONGO else sqlite_conn
+        return connection
 
 
 def test():
@@ -143,5 +273,41 @@ def test():
     print("\nTime to switch.\n")
     toggle_db()
 
+def benchmark_login_path(iterations: int = 10_000) -> dict:
+    """
+    Time the login lookup against the in-memory backend, so the numbers reflect
+    db_manager overhead (dispatch + cache) rather than database latency.
+    """
+    previous_mode = get_current_mode()
+    set_db_mode(DBMode.MEMORY)
+    try:
+        insert_user("bench_user", "not-a-real-hash")
+        backend = current_backend()
+
+        start = time.perf_counter()
+        for _ in range(iterations):
+            backend.find_user("bench_user")
+        backend_us = (time.perf_counter() - start) / iterations * 1e6
+
+        start = time.perf_counter()
+        for _ in range(iterations):
+            find_user("bench_user")
+        cached_us = (time.perf_counter() - start) / iterations * 1e6
+
+        start = time.perf_counter()
+        for _ in range(iterations):
+            user_cache.invalidate("bench_user")
+            find_user("bench_user")
+        uncached_us = (time.perf_counter() - start) / iterations * 1e6
+    finally:
+        set_db_mode(previous_mode)
+
+    results = {"backend_us": backend_us, "cached_us": cached_us, "uncached_us": uncached_us}
+    print(f"⏱️ Login lookup ({iterations} runs, in-memory): backend {backend_us:.2f} µs, "
+          f"find_user cached {cached_us:.2f} µs, uncached {uncached_us:.2f} µs")
+    return results
+
 if __name__ == "__main__":
     test()
+    benchmark_login_path()
+    print(f"User cache: {get_user_cache_stats()}")
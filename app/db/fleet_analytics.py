@@ -0,0 +1,340 @@
+"""
+Fleet-wide ride KPIs for the operator control center.
+
+The per-user `ride_stats` summaries are already partial aggregates, so fleet numbers
+never touch the rides themselves: users are split into key ranges, every range is
+folded into one partial (plain counters, added) in a worker process that reads only
+the summary fields it needs from its slice of `ride_stats`, and the partials are
+merged. Wait percentiles come from the summed 1-minute wait histograms, so they are
+exact to the minute and cost nothing per user beyond adding counters.
+
+Results are cached with their `computed_at` time. A stale result is still served
+immediately while one background refresh recomputes it, so only the very first
+load of a process waits for the computation.
+
+Benchmark on synthetic users (written to a throwaway SQLite database):
+py -m app.db.fleet_analytics --benchmark 200000
+"""
+import argparse
+import math
+import multiprocessing
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from itertools import repeat
+from pathlib import Path
+from typing import Optional
+
+from app.db import ride_stats
+from app.db import sqlite as sqlite_db
+from app.db.mongo import get_client
+from app.db.sketches import PERCENTILES
+from app.db.sqlite import (
+    connect_to_sqlite, iter_ride_stats_sqlite, ride_stats_users_sqlite, stale_ride_stats_users_sqlite)
+
+FLEET_CACHE_TTL = 60           # Seconds a result counts as fresh
+FLEET_WORKERS = min(8, os.cpu_count() or 1)
+PARALLEL_MIN_USERS = 5_000     # Below this, process start-up costs more than it saves
+TOP_PICKUPS = 10
+
+# Workers are spawned, not forked: the app process runs Mongo and replication threads
+MP_CONTEXT = "spawn"
+
+# Only what fleet KPIs read from each summary
+FLEET_FIELDS = ("total", "completed", "pickups", "hours", "wait.count", "wait.sum", "wait.hist",
+                "version", ride_stats.NEEDS_REBUILD)
+
+
+# == Partials ==
+def empty_partial() -> dict:
+    return {"users": 0, "stale": 0, "total": 0, "completed": 0, "wait_sum": 0,
+            "pickups": Counter(), "hours": Counter(), "wait_hist": Counter()}
+
+def fold_summary(partial: dict, summary: dict) -> dict:
+    """Add one user's summary to a partial, in place."""
+    partial["users"] += 1
+    partial["stale"] += not ride_stats.is_trusted(summary)   # Counted anyway, as last stored
+    partial["total"] += summary.get("total", 0)
+    partial["completed"] += summary.get("completed", 0)
+    # Keys stay as stored (encoded pickups, "7" for 07:00) until the final merge
+    partial["pickups"].update(summary.get("pickups") or {})
+    partial["hours"].update(summary.get("hours") or {})
+    wait = summary.get("wait") or {}
+    partial["wait_sum"] += wait.get("sum", 0)
+    partial["wait_hist"].update(wait.get("hist") or {})
+    return partial
+
+def merge_partials(partials) -> dict:
+    merged = empty_partial()
+    for partial in partials:
+        for key in ("users", "stale", "total", "completed", "wait_sum"):
+            merged[key] += partial[key]
+        for key in ("pickups", "hours", "wait_hist"):
+            merged[key].update(partial[key])
+    return merged
+
+def histogram_percentiles(histogram: dict[int, int], quantiles: tuple[float, ...] = PERCENTILES) -> dict:
+    """Nearest-rank percentiles of a wait histogram, in minutes (the overflow bucket reads as its floor)."""
+    count = sum(histogram.values())
+    result, cumulative = {f"p{round(q * 100):g}": None for q in quantiles}, 0
+    if not count:
+        return result
+    ranks = iter(sorted((max(1, math.ceil(q * count)), f"p{round(q * 100):g}") for q in quantiles))
+    rank, name = next(ranks)
+    for bucket in sorted(histogram):
+        cumulative += histogram[bucket]
+        while rank is not None and cumulative >= rank:
+            result[name] = bucket * ride_stats.WAIT_BUCKET_WIDTH
+            rank, name = next(ranks, (None, None))
+    return result
+
+def to_kpis(partial: dict, top_n: int = TOP_PICKUPS) -> dict:
+    wait_hist = {int(bucket): count for bucket, count in partial["wait_hist"].items()}
+    wait_count = sum(wait_hist.values())
+    busiest = sorted(((ride_stats.decode_key(key), count) for key, count in partial["pickups"].items() if count > 0),
+                     key=lambda item: (-item[1], item[0]))[:top_n]
+    return {
+        "users": partial["users"],
+        "stale_users": partial["stale"],
+        "total_rides": partial["total"],
+        "completed_rides": partial["completed"],
+        "wait_times": {
+            "count": wait_count,
+            "average": partial["wait_sum"] / wait_count if wait_count else None,
+            **histogram_percentiles(wait_hist)
+        },
+        "busiest_pickups": busiest,
+        "hourly_demand": [partial["hours"].get(str(hour), 0) for hour in range(24)]
+    }
+
+
+# == Workers ==
+def _read_summaries(source: tuple, first: Optional[str], before: Optional[str]):
+    """
+    Summaries in a key range. `source` is ("sqlite", db_path) or ("mongo", uri, db, collection);
+    workers open their own read-only connection rather than the app's pooled one.
+    """
+    if source[0] == "sqlite":
+        conn = sqlite3.connect(f"{Path(source[1]).as_uri()}?mode=ro", uri=True)
+        try:
+            yield from iter_ride_stats_sqlite(conn, first, before, FLEET_FIELDS)
+        finally:
+            conn.close()
+        return
+
+    _, mongo_uri, db_name, collection_name = source
+    key_range = {}
+    if first is not None:
+        key_range["$gte"] = first
+    if before is not None:
+        key_range["$lt"] = before
+    projection = {field: True for field in FLEET_FIELDS} | {"_id": False}
+    collection = get_client(mongo_uri)[db_name][collection_name]
+    yield from collection.find({"_id": key_range} if key_range else {}, projection, batch_size=1000)
+
+def partial_for_range(source: tuple, first: Optional[str], before: Optional[str]) -> dict:
+    """The partial of users first <= user_id < before. Runs in a worker process."""
+    partial = empty_partial()
+    for summary in _read_summaries(source, first, before):
+        fold_summary(partial, summary)
+    return partial
+
+def key_ranges(users: list[str], parts: int) -> list[tuple]:
+    """Split sorted user keys into `parts` contiguous (first, before) ranges covering every key."""
+    parts = max(1, min(parts, len(users)))
+    bounds = [users[index * len(users) // parts] for index in range(1, parts)]
+    return list(zip([None] + bounds, bounds + [None]))
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+def _process_pool(workers: int) -> ProcessPoolExecutor:
+    # Kept alive between refreshes, so only the first one pays for starting workers
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context(MP_CONTEXT))
+        return _pool
+
+
+# == Engine ==
+class FleetAnalytics:
+    """Cached fleet KPIs for one ride store (see RideDataManager)."""
+
+    def __init__(self, manager, ttl: float = FLEET_CACHE_TTL, workers: int = FLEET_WORKERS):
+        self.manager = manager
+        self.ttl = ttl
+        self.workers = workers
+        if manager.store.value == "sqlite":
+            self.source = ("sqlite", str(sqlite_db.DB_PATH))
+        else:
+            self.source = ("mongo", manager.mongo_uri, manager.db.name, manager.stats_collection.name)
+        self._result: Optional[dict] = None
+        self._computed_at = 0.0   # time.monotonic() of _result
+        self._refreshing = False
+        self._lock = threading.Lock()
+
+    def _user_keys(self) -> list[str]:
+        if self.source[0] == "sqlite":
+            return ride_stats_users_sqlite(connect_to_sqlite())
+        return [doc["_id"] for doc in self.manager.stats_collection.find({}, {"_id": True}).sort("_id", 1)]
+
+    def _stale_users(self) -> list[str]:
+        if self.source[0] == "sqlite":
+            return stale_ride_stats_users_sqlite(connect_to_sqlite(), ride_stats.SUMMARY_VERSION, ride_stats.NEEDS_REBUILD)
+        stale = {"$or": [{ride_stats.NEEDS_REBUILD: True}, {"version": {"$ne": ride_stats.SUMMARY_VERSION}}]}
+        return [doc["_id"] for doc in self.manager.stats_collection.find(stale, {"_id": True})]
+
+    def _fold(self, users: list[str]) -> tuple[dict, list[tuple]]:
+        if self.workers > 1 and len(users) >= PARALLEL_MIN_USERS:
+            ranges = key_ranges(users, self.workers)
+            firsts, befores = zip(*ranges)
+            partials = _process_pool(self.workers).map(partial_for_range, repeat(self.source), firsts, befores)
+        else:
+            ranges = [(None, None)]
+            partials = [partial_for_range(self.source, None, None)]
+        return merge_partials(partials), ranges
+
+    def compute(self) -> dict:
+        """Fleet KPIs straight from the summaries, in parallel when the fleet is large."""
+        start = time.perf_counter()
+        merged, ranges = self._fold(self._user_keys())
+        if merged["stale"]:
+            # Flagged or older-version summaries lack fields the KPIs read (v3 added hours): rebuild, fold again
+            stale = self._stale_users()
+            for user_id in stale:
+                self.manager.rebuild_ride_stats(user_id)
+            print(f"🔧 Rebuilt {len(stale)} stale ride summaries before computing fleet KPIs")
+            merged, ranges = self._fold(self._user_keys())
+
+        kpis = to_kpis(merged)
+        kpis["computed_at"] = datetime.now()
+        kpis["compute_seconds"] = time.perf_counter() - start
+        kpis["partitions"] = len(ranges)
+        print(f"🚦 Fleet KPIs for {kpis['users']} users / {kpis['total_rides']} rides "
+              f"in {kpis['compute_seconds']:.2f}s ({len(ranges)} partition(s))")
+        return kpis
+
+    def refresh(self) -> dict:
+        """Recompute now. Returns the same shape as kpis(): the last result, marked not fresh, if this fails."""
+        try:
+            result = self.compute()
+        except Exception as e:
+            print(f"❌ Error computing fleet KPIs: {e}")
+            with self._lock:
+                self._refreshing = False
+                result, age = self._result, time.monotonic() - self._computed_at
+            if result is None:
+                return {"error": "Could not compute fleet KPIs", "message": str(e)}
+            return {**result, "age_seconds": age, "fresh": False}
+
+        with self._lock:
+            self._result, self._computed_at, self._refreshing = result, time.monotonic(), False
+        return {**result, "age_seconds": 0.0, "fresh": True}
+
+    def kpis(self, max_age: float = None) -> dict:
+        """
+        The cached KPIs, with `age_seconds` and `fresh`. Older than `max_age` (default: ttl),
+        they are still returned while a background refresh runs; only a cold cache blocks.
+        """
+        max_age = self.ttl if max_age is None else max_age
+        with self._lock:
+            result, age = self._result, time.monotonic() - self._computed_at
+            stale = result is not None and age > max_age
+            if stale and not self._refreshing:
+                self._refreshing = True
+                threading.Thread(target=self.refresh, name="fleet-refresh", daemon=True).start()
+
+        if result is None:
+            return self.refresh()
+        return {**result, "age_seconds": age, "fresh": not stale}
+
+
+_engines: dict[str, FleetAnalytics] = {}
+_engines_lock = threading.Lock()
+
+def get_fleet_analytics(store=None) -> FleetAnalytics:
+    """The process-wide engine for a ride store (default: RIDE_STORE), so its cache is shared."""
+    from app.db.ride_data_manager import RideDataManager, RideStore
+
+    store = store or RideStore(os.getenv("RIDE_STORE", RideStore.MONGO.value))
+    with _engines_lock:
+        if store.value not in _engines:
+            _engines[store.value] = FleetAnalytics(RideDataManager(store))
+        return _engines[store.value]
+
+
+# == Benchmark ==
+def _synthetic_summaries(users: int, rides_per_user: int = 12, seed: int = 11):
+    """(user_id, summary) pairs built like real ones, from rides_per_user random rides each."""
+    import random
+    from datetime import timedelta
+    from app.db.ride_schema import RideStatus
+
+    rng = random.Random(seed)
+    stops = [f"Stop {index}" for index in range(60)]
+    start = datetime(2025, 1, 1)
+    for user in range(users):
+        rides = []
+        for _ in range(rides_per_user):
+            completed = rng.random() < 0.8
+            rides.append({
+                "timestamp": start + timedelta(minutes=rng.randrange(365 * 24 * 60)),
+                "pickup": rng.choice(stops),
+                "status": RideStatus.COMPLETED if completed else RideStatus.REQUESTED,
+                **({"wait_time": float(rng.randint(1, 40)), "duration": float(rng.randint(5, 60)),
+                    "fare": round(rng.uniform(40, 400), 2)} if completed else {})
+            })
+        yield f"user{user:07d}", ride_stats.summary_from_rides(rides)
+
+def benchmark(total_rides: int = 200_000, rides_per_user: int = 12):
+    import tempfile
+    from app.db.ride_data_manager import RideDataManager, RideStore
+    from app.db.sqlite import write_transaction, save_ride_stats_sqlite
+
+    # A throwaway database; workers are handed its path
+    sqlite_db.DB_PATH = Path(tempfile.mkdtemp()) / "fleet_benchmark.db"
+    manager = RideDataManager(RideStore.SQLITE)
+    users = total_rides // rides_per_user
+
+    start = time.perf_counter()
+    with write_transaction(connect_to_sqlite()) as conn:
+        for user_id, summary in _synthetic_summaries(users, rides_per_user):
+            save_ride_stats_sqlite(conn, user_id, summary)
+    print(f"Wrote {users:,} summaries ({users * rides_per_user:,} rides) in {time.perf_counter() - start:.1f}s")
+
+    serial = FleetAnalytics(manager, workers=1).compute()
+    parallel_engine = FleetAnalytics(manager)
+    parallel_engine.compute()   # Starts the worker processes
+    parallel = parallel_engine.refresh()
+    assert parallel["total_rides"] == serial["total_rides"] == users * rides_per_user
+    assert parallel["busiest_pickups"] == serial["busiest_pickups"]
+    print(f"Serial {serial['compute_seconds']:.2f}s | {parallel['partitions']} workers "
+          f"{parallel['compute_seconds']:.2f}s | p90 wait {parallel['wait_times']['p90']:.1f} min")
+
+    start = time.perf_counter()
+    parallel_engine.kpis()
+    print(f"Cached read: {(time.perf_counter() - start) * 1000:.3f} ms")
+
+
+def main(argv: list[str] = None):
+    parser = argparse.ArgumentParser(description="Compute fleet-wide ride KPIs.")
+    parser.add_argument("--store", choices=["mongo", "sqlite"], default=None)
+    parser.add_argument("--benchmark", type=int, metavar="RIDES", help="Benchmark on synthetic data instead")
+    args = parser.parse_args(argv)
+
+    if args.benchmark:
+        benchmark(args.benchmark)
+        return
+
+    from app.db.ride_data_manager import RideStore
+    kpis = get_fleet_analytics(RideStore(args.store) if args.store else None).kpis()
+    for key, value in kpis.items():
+        print(f"{key}: {value}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+"""
+Index declarations for the accounts and rides stores, ensured idempotently at startup.
+
+`verify_mongo_query_plans()` and `verify_sqlite_query_plans()` explain the hot queries
+and raise IndexRegressionError if any of them has regressed to a full scan. Startup runs
+them through `check_query_plans()` once per process, which prints a regression, or
+raises it when STRICT_INDEX_CHECKS=1 (CI, development).
+
+Run indexes.py to ensure and verify the SQLite indexes:
+py -m app.db.indexes
+"""
+import sqlite3
+import threading
+from dataclasses import dataclass
+from typing import Callable
+
+from pymongo import ASCENDING, DESCENDING
+from pymongo.collection import Collection
+from pymongo.errors import PyMongoError
+
+from app.config import Config
+from app.db.sqlite import connect_to_sqlite, TABLE_NAME, RIDES_TABLE, DBKey
+from app.db.ride_schema import RideStatus, status_query
+
+
+class IndexRegressionError(RuntimeError):
+    """Raised when a hot query no longer uses an index."""
+
+
+@dataclass(frozen=True)
+class IndexSpec:
+    name: str
+    keys: tuple[tuple[str, int], ...]
+    unique: bool = False
+
+
+ACCOUNT_INDEXES = (
+    IndexSpec("username_unique", ((DBKey.USERNAME.value, ASCENDING),), unique=True),
+    IndexSpec("updated_at", (("updated_at", ASCENDING),)),
+)
+
+# user_id leads, so the same index also serves find({"user_id"}) and distinct("user_id")
+RIDE_INDEXES = (
+    IndexSpec("user_status_timestamp", (
+        ("user_id", ASCENDING), ("status", ASCENDING), ("timestamp", DESCENDING))),
+    # The rollup job's "booked or updated since the watermark" scan (see app.db.ride_rollups)
+    IndexSpec("booking_time", (("booking_time", ASCENDING),)),
+    IndexSpec("updated_at", (("updated_at", ASCENDING),)),
+)
+
+# rides_hourly / rides_daily; the SQLite tables get the same key as their PRIMARY KEY
+ROLLUP_INDEXES = (
+    IndexSpec("user_start_pickup", (("user_id", ASCENDING), ("start", ASCENDING), ("pickup", ASCENDING)),
+              unique=True),
+)
+
+# Mirrored for any SQLite tables of the same shape. Accounts are covered by the
+# username PRIMARY KEY, so only rides need explicit indexes.
+SQLITE_INDEXES = {
+    RIDES_TABLE: RIDE_INDEXES,
+}
+
+_ensured: set[tuple] = set()
+_ensure_lock = threading.Lock()
+_plans_checked: set[tuple] = set()   # (verify, targets) already explained this process
+
+
+# == MongoDB ==
+def ensure_mongo_indexes(collection: Collection, specs: tuple[IndexSpec, ...]) -> list[str]:
+    """Create `specs` on `collection` once per process. create_index is a no-op if it already exists."""
+    key = (collection.database.name, collection.name)
+    with _ensure_lock:
+        if key in _ensured:
+            return []
+
+        created = []
+        for spec in specs:
+            created.append(collection.create_index(list(spec.keys), name=spec.name, unique=spec.unique))
+        _ensured.add(key)
+
+    print(f"🗂️ Indexes ready on {key[0]}.{key[1]}: {', '.join(created)}")
+    return created
+
+def ensure_indexes_in_background(collection: Collection, specs: tuple[IndexSpec, ...],
+                                 verify: Callable[[Collection], None] = None):
+    """
+    Ensure indexes off the calling thread so an unreachable server never blocks the UI,
+    then run `verify(collection)` (a verify_* check) through check_query_plans().
+    """
+    if (collection.database.name, collection.name) in _ensured:
+        return
+
+    def worker():
+        try:
+            ensure_mongo_indexes(collection, specs)
+            if verify is not None:
+                check_query_plans(verify, collection)
+        except PyMongoError as e:
+            print(f"⚠️ Could not ensure indexes on {collection.name}: {e}")
+
+    threading.Thread(target=worker, daemon=True).start()
+
+def ensure_account_indexes(collection: Collection) -> list[str]:
+    return ensure_mongo_indexes(collection, ACCOUNT_INDEXES)
+
+def ensure_ride_indexes(collection: Collection) -> list[str]:
+    return ensure_mongo_indexes(collection, RIDE_INDEXES)
+
+def _plan_stages(plan: dict) -> list[str]:
+    stages = []
+    stack = [plan]
+    while stack:
+        node = stack.pop()
+        if not isinstance(node, dict):
+            continue
+        if "stage" in node:
+            stages.append(node["stage"])
+        for child_key in ("inputStage", "queryPlan"):
+            if child_key in node:
+                stack.append(node[child_key])
+        stack.extend(node.get("inputStages", []))
+    return stages
+
+def assert_mongo_uses_index(collection: Collection, query: dict, label: str = None):
+    explained = collection.find(query).explain()
+    stages = _plan_stages(explained.get("queryPlanner", {}).get("winningPlan", {}))
+    if "COLLSCAN" in stages:
+        raise IndexRegressionError(
+            f"{label or query} on {collection.name} does a full collection scan (plan: {stages})")
+
+def assert_mongo_distinct_uses_index(collection: Collection, field: str):
+    explained = collection.database.command("explain", {"distinct": collection.name, "key": field})
+    stages = _plan_stages(explained.get("queryPlanner", {}).get("winningPlan", {}))
+    if "COLLSCAN" in stages:
+        raise IndexRegressionError(
+            f"distinct({field!r}) on {collection.name} does a full collection scan (plan: {stages})")
+
+def verify_mongo_query_plans(accounts: Collection = None, rides: Collection = None):
+    """Explain the hot Mongo queries; raise IndexRegressionError on any COLLSCAN."""
+    if accounts is not None:
+        assert_mongo_uses_index(accounts, {DBKey.USERNAME.value: "__explain__"}, "find_user")
+    if rides is not None:
+        assert_mongo_uses_index(rides, {"user_id": "__explain__"}, "get_user_rides")
+        assert_mongo_uses_index(
+            rides, {"user_id": "__explain__", "status": status_query(RideStatus.COMPLETED)}, "completed rides")
+        assert_mongo_distinct_uses_index(rides, "user_id")
+
+def _plan_target(value):
+    if isinstance(value, Collection):
+        return value.full_name
+    if isinstance(value, sqlite3.Connection):
+        return value.execute("PRAGMA database_list").fetchone()[2]   # The main database file
+    return value
+
+def check_query_plans(verify: Callable, *args, **kwargs) -> bool:
+    """
+    Run a verify_* check once per process and target. Returns False after printing a
+    regression; with Config.STRICT_INDEX_CHECKS the IndexRegressionError is raised instead.
+    """
+    key = (getattr(verify, "__qualname__", verify),
+           tuple(_plan_target(arg) for arg in args),
+           tuple(sorted((name, _plan_target(arg)) for name, arg in kwargs.items())))
+    with _ensure_lock:
+        if key in _plans_checked:
+            return True
+        _plans_checked.add(key)
+
+    try:
+        verify(*args, **kwargs)
+        return True
+    except IndexRegressionError as e:
+        if Config.STRICT_INDEX_CHECKS:
+            raise
+        print(f"❌ INDEX REGRESSION: {e}")
+        return False
+    except Exception:
+        with _ensure_lock:
+            _plans_checked.discard(key)   # Couldn't explain (e.g. server unreachable); retry next time
+        raise
+
+
+# == SQLite ==
+def _sqlite_table_exists(conn: sqlite3.Connection, table: str) -> bool:
+    row = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone()
+    return row is not None
+
+def ensure_sqlite_indexes(conn: sqlite3.Connection = None) -> list[str]:
+    """Create the mirrored indexes on every declared SQLite table that exists."""
+    conn = conn or connect_to_sqlite()
+    created = []
+    with conn:
+        for table, specs in SQLITE_INDEXES.items():
+            if not _sqlite_table_exists(conn, table):
+                continue
+            for spec in specs:
+                columns = ", ".join(
+                    f"{field} {'DESC' if order == DESCENDING else 'ASC'}" for field, order in spec.keys)
+                unique = "UNIQUE " if spec.unique else ""
+                index_name = f"idx_{table}_{spec.name}"
+                conn.execute(f"CREATE {unique}INDEX IF NOT EXISTS {index_name} ON {table} ({columns})")
+                created.append(index_name)
+    return created
+
+def assert_sqlite_uses_index(conn: sqlite3.Connection, sql: str, params: tuple = (), label: str = None):
+    plan = [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()]
+    for detail in plan:
+        # "SCAN t" without an index is a full table scan; "SEARCH ... USING INDEX" is fine
+        if detail.startswith("SCAN") and "INDEX" not in detail:
+            raise IndexRegressionError(f"{label or sql} does a full table scan (plan: {plan})")
+
+def verify_sqlite_query_plans(conn: sqlite3.Connection = None):
+    conn = conn or connect_to_sqlite()
+    assert_sqlite_uses_index(
+        conn, f"SELECT * FROM {TABLE_NAME} WHERE {DBKey.USERNAME.value} = ?", ("__explain__",), "find_user")
+    if _sqlite_table_exists(conn, RIDES_TABLE):
+        assert_sqlite_uses_index(
+            conn, f"SELECT * FROM {RIDES_TABLE} WHERE user_id = ?", ("__explain__",), "get_user_rides")
+        assert_sqlite_uses_index(
+            conn, f"SELECT * FROM {RIDES_TABLE} WHERE user_id = ? AND status = ?",
+            ("__explain__", int(RideStatus.COMPLETED)), "completed rides")
+        for column in ("booking_time", "updated_at"):
+            assert_sqlite_uses_index(
+                conn, f"SELECT user_id, timestamp FROM {RIDES_TABLE} WHERE {column} >= ?", (0,), "rollup changes")
+
+
+def provision_sqlite_indexes(conn: sqlite3.Connection = None) -> list[str]:
+    """ensure_sqlite_indexes(), then the SQLite plan check (once per process, see check_query_plans)."""
+    conn = conn or connect_to_sqlite()
+    created = ensure_sqlite_indexes(conn)
+    check_query_plans(verify_sqlite_query_plans, conn)
+    return created
+
+
+def test():
+    conn = connect_to_sqlite()
+    print(f"SQLite indexes: {ensure_sqlite_indexes(conn) or 'none needed'}")
+    verify_sqlite_query_plans(conn)
+    print("✅ SQLite hot queries use indexes.")
+
+if __name__ == "__main__":
+    test()
@@ -0,0 +1,191 @@
+"""
+Bulk copy of the `accounts` store between MongoDB and SQLite.
+
+Rows are streamed in username order, written in batches (executemany / bulk_write)
+and upserted on username, so a run can be interrupted and resumed from its checkpoint.
+
+Usage:
+py -m app.db.migrate --from mongo --to sqlite
+py -m app.db.migrate --from sqlite --to mongo --batch-size 1000 --restart
+"""
+import argparse
+import json
+import time
+from pathlib import Path
+from typing import Iterator, Optional
+
+from pymongo import ASCENDING, UpdateOne
+
+from app.db.mongo import get_collection
+from app.db.sqlite import connect_to_sqlite, DBKey, TABLE_NAME, REPLICA_TABLE, DB_DIR
+
+MONGO = "mongo"
+SQLITE = "sqlite"
+BACKENDS = (MONGO, SQLITE)
+
+DEFAULT_BATCH_SIZE = 500
+USERNAME = DBKey.USERNAME.value
+UPDATED_AT = "updated_at"   # Stamped by the server on every Mongo write; the replica syncs by it
+COLUMNS = [key.value for key in DBKey]
+
+
+# == Checkpoints ==
+def checkpoint_path(source: str, target: str) -> Path:
+    return DB_DIR / f"migrate_{source}_to_{target}.json"
+
+def load_checkpoint(source: str, target: str) -> Optional[str]:
+    path = checkpoint_path(source, target)
+    if not path.exists():
+        return None
+    try:
+        return json.loads(path.read_text(encoding="utf-8")).get("last_username")
+    except (OSError, ValueError) as e:
+        print(f"⚠️ Ignoring unreadable checkpoint {path.name}: {e}")
+        return None
+
+def save_checkpoint(source: str, target: str, last_username: str, copied: int):
+    DB_DIR.mkdir(exist_ok=True)
+    checkpoint_path(source, target).write_text(
+        json.dumps({"last_username": last_username, "copied": copied}), encoding="utf-8")
+
+def clear_checkpoint(source: str, target: str):
+    checkpoint_path(source, target).unlink(missing_ok=True)
+
+
+# == Row conversion ==
+def to_sqlite_row(doc: dict) -> tuple:
+    """Map an account document onto the fixed SQLite column order."""
+    row = []
+    for column in COLUMNS:
+        value = doc.get(column)
+        if column == DBKey.OP.value:
+            value = int(bool(value))
+        elif value is None:
+            value = ""
+        row.append(value)
+    return tuple(row)
+
+def to_mongo_doc(row: dict) -> dict:
+    doc = {column: row[column] for column in COLUMNS if column in row}
+    doc[DBKey.OP.value] = bool(doc.get(DBKey.OP.value, False))
+    return doc
+
+
+# == Sources ==
+def read_mongo_batches(batch_size: int, after: Optional[str] = None) -> Iterator[list[dict]]:
+    query = {USERNAME: {"$gt": after}} if after is not None else {}
+    cursor = (get_collection()
+              .find(query, {"_id": False})
+              .sort(USERNAME, ASCENDING)
+              .batch_size(batch_size))
+
+    batch = []
+    for doc in cursor:
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def read_sqlite_batches(batch_size: int, after: Optional[str] = None) -> Iterator[list[dict]]:
+    conn = connect_to_sqlite()
+    if after is not None:
+        cursor = conn.execute(
+            f"SELECT * FROM {TABLE_NAME} WHERE {USERNAME} > ? ORDER BY {USERNAME}", (after,))
+    else:
+        cursor = conn.execute(f"SELECT * FROM {TABLE_NAME} ORDER BY {USERNAME}")
+
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        yield [dict(row) for row in rows]
+
+
+# == Sinks ==
+def sqlite_upsert(table: str) -> str:
+    return f"""
+    INSERT INTO {table} ({", ".join(COLUMNS)})
+    VALUES ({", ".join("?" for _ in COLUMNS)})
+    ON CONFLICT({USERNAME}) DO UPDATE SET
+    {", ".join(f"{column} = excluded.{column}" for column in COLUMNS if column != USERNAME)}
+"""
+
+SQLITE_UPSERT = {table: sqlite_upsert(table) for table in (TABLE_NAME, REPLICA_TABLE)}
+
+def write_sqlite_batch(batch: list[dict], table: str = TABLE_NAME) -> int:
+    conn = connect_to_sqlite()
+    with conn:  # One transaction per batch
+        conn.executemany(SQLITE_UPSERT[table], [to_sqlite_row(doc) for doc in batch])
+    return len(batch)
+
+def write_mongo_batch(batch: list[dict]) -> int:
+    operations = []
+    for row in batch:
+        doc = to_mongo_doc(row)
+        operations.append(UpdateOne(
+            {USERNAME: doc[USERNAME]}, {"$set": doc, "$currentDate": {UPDATED_AT: True}}, upsert=True))
+    result = get_collection().bulk_write(operations, ordered=False)
+    return result.upserted_count + result.matched_count
+
+READERS = {MONGO: read_mongo_batches, SQLITE: read_sqlite_batches}
+WRITERS = {MONGO: write_mongo_batch, SQLITE: write_sqlite_batch}
+
+
+# == Engine ==
+def migrate(source: str, target: str, batch_size: int = DEFAULT_BATCH_SIZE,
+            resume: bool = True) -> dict:
+    """
+    Copy every account from `source` to `target`, upserting on username.
+
+    Returns:
+        dict: rows copied, batches written, elapsed seconds and rows/sec
+    """
+    if source not in BACKENDS or target not in BACKENDS:
+        raise ValueError(f"Backends must be one of {BACKENDS}")
+    if source == target:
+        raise ValueError("Source and target must be different backends")
+    if source == MONGO or target == MONGO:
+        if get_collection() is None:
+            raise ConnectionError("MongoDB is not reachable")
+
+    after = load_checkpoint(source, target) if resume else None
+    if after is not None:
+        print(f"⏩ Resuming {source} → {target} after username '{after}'")
+    else:
+        clear_checkpoint(source, target)
+
+    copied = 0
+    batches = 0
+    start = time.perf_counter()
+
+    for batch in READERS[source](batch_size, after):
+        WRITERS[target](batch)
+        copied += len(batch)
+        batches += 1
+        save_checkpoint(source, target, batch[-1][USERNAME], copied)
+
+        elapsed = time.perf_counter() - start
+        print(f"📦 Batch {batches}: {copied} rows ({copied / elapsed:,.0f} rows/sec)")
+
+    elapsed = time.perf_counter() - start
+    clear_checkpoint(source, target)  # Finished: the next run starts from scratch
+
+    rate = copied / elapsed if elapsed > 0 else 0.0
+    print(f"✅ Migrated {copied} account(s) {source} → {target} in {elapsed:.2f}s ({rate:,.0f} rows/sec)")
+    return {"copied": copied, "batches": batches, "elapsed": elapsed, "rows_per_sec": rate}
+
+
+def main(argv: list[str] = None):
+    parser = argparse.ArgumentParser(description="Copy the accounts store between MongoDB and SQLite.")
+    parser.add_argument("--from", dest="source", choices=BACKENDS, required=True)
+    parser.add_argument("--to", dest="target", choices=BACKENDS, required=True)
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--restart", action="store_true", help="Ignore any saved checkpoint")
+    args = parser.parse_args(argv)
+
+    migrate(args.source, args.target, batch_size=args.batch_size, resume=not args.restart)
+
+if __name__ == "__main__":
+    main()
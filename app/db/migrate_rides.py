@@ -0,0 +1,141 @@
+"""
+Rewrite stored rides in schema v2 (see app.db.ride_schema).
+
+MongoDB documents are converted in `_id` order, in batches of bulk updates, with a
+checkpoint after every batch so an interrupted run resumes where it stopped. Each
+update only applies if the ride is still v1 and unchanged since it was read, so the
+app can keep writing during the rollout; rides it touched are picked up next run.
+Readers accept v1 and v2 documents alike, so the migration can run at any time.
+
+The SQLite rides table is upgraded in a single transaction the first time it is
+opened, so `--store sqlite` only has to open it.
+
+Usage:
+py -m app.db.migrate_rides --store mongo
+py -m app.db.migrate_rides --store mongo --batch-size 1000 --restart
+py -m app.db.migrate_rides --store sqlite
+"""
+import argparse
+import time
+from pathlib import Path
+from typing import Optional
+
+from bson import json_util
+from pymongo import ASCENDING, UpdateOne
+
+from app.db.ride_data_manager import RideDataManager, RideStore
+from app.db.ride_schema import SCHEMA_VERSION, VERSION_FIELD, decode_ride, encode_ride_mongo
+from app.db.sqlite import connect_to_sqlite, RIDES_TABLE, DB_DIR
+
+DEFAULT_BATCH_SIZE = 500
+CHECKPOINT_PATH = DB_DIR / f"migrate_rides_v{SCHEMA_VERSION}.json"
+
+
+# == Checkpoints ==
+def load_checkpoint(path: Path = CHECKPOINT_PATH):
+    if not path.exists():
+        return None
+    try:
+        # json_util keeps ObjectIds as ObjectIds
+        return json_util.loads(path.read_text(encoding="utf-8")).get("last_id")
+    except (OSError, ValueError) as e:
+        print(f"⚠️ Ignoring unreadable checkpoint {path.name}: {e}")
+        return None
+
+def save_checkpoint(last_id, migrated: int, path: Path = CHECKPOINT_PATH):
+    DB_DIR.mkdir(exist_ok=True)
+    path.write_text(json_util.dumps({"last_id": last_id, "migrated": migrated}), encoding="utf-8")
+
+def clear_checkpoint(path: Path = CHECKPOINT_PATH):
+    path.unlink(missing_ok=True)
+
+
+# == MongoDB ==
+def to_v2_update(doc: dict) -> Optional[UpdateOne]:
+    """The guarded update converting one v1 document, or None if it can't be typed."""
+    fields = decode_ride(doc)
+    fields.pop("_id", None)
+    try:
+        encoded = encode_ride_mongo(fields)
+    except ValueError as e:
+        print(f"⚠️ Skipping ride {doc['_id']}: {e}")
+        return None
+    # Unchanged since read: the app stamps updated_at on every write
+    guard = {"_id": doc["_id"], VERSION_FIELD: {"$ne": SCHEMA_VERSION}, "updated_at": doc.get("updated_at")}
+    return UpdateOne(guard, {"$set": encoded})
+
+def migrate_mongo(batch_size: int = DEFAULT_BATCH_SIZE, resume: bool = True) -> dict:
+    """
+    Convert every v1 ride document to v2.
+
+    Returns:
+        dict: rides migrated, skipped (untypable), retry (changed mid-run), remaining v1 rides
+    """
+    rides = RideDataManager(RideStore.MONGO).rides_collection
+
+    after = load_checkpoint() if resume else None
+    query = {VERSION_FIELD: {"$ne": SCHEMA_VERSION}}
+    if after is not None:
+        query["_id"] = {"$gt": after}
+        print(f"⏩ Resuming ride migration after _id {after}")
+    else:
+        clear_checkpoint()
+
+    migrated = skipped = retry = batches = 0
+    start = time.perf_counter()
+    cursor = rides.find(query).sort("_id", ASCENDING).batch_size(batch_size)
+
+    def flush(batch: list[dict]):
+        nonlocal migrated, skipped, retry, batches
+        operations = [update for update in map(to_v2_update, batch) if update is not None]
+        skipped += len(batch) - len(operations)
+        if operations:
+            result = rides.bulk_write(operations, ordered=False)
+            migrated += result.modified_count
+            retry += len(operations) - result.matched_count
+        batches += 1
+        save_checkpoint(batch[-1]["_id"], migrated)
+
+        elapsed = time.perf_counter() - start
+        print(f"📦 Batch {batches}: {migrated} rides migrated ({migrated / elapsed:,.0f} rides/sec)")
+
+    batch = []
+    for doc in cursor:
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            flush(batch)
+            batch = []
+    if batch:
+        flush(batch)
+
+    clear_checkpoint()  # Finished: the next run rescans whatever is still v1
+    remaining = rides.count_documents({VERSION_FIELD: {"$ne": SCHEMA_VERSION}})
+    elapsed = time.perf_counter() - start
+    print(f"✅ Migrated {migrated} ride(s) to v{SCHEMA_VERSION} in {elapsed:.2f}s "
+          f"({skipped} skipped, {retry} changed mid-run, {remaining} still v1)")
+    return {"migrated": migrated, "skipped": skipped, "retry": retry, "remaining": remaining}
+
+
+# == SQLite ==
+def migrate_sqlite() -> dict:
+    conn = connect_to_sqlite()   # Upgrades a v1 rides table on first open
+    types = {row["name"]: row["type"] for row in conn.execute(f"PRAGMA table_info({RIDES_TABLE})")}
+    rows = conn.execute(f"SELECT COUNT(*) FROM {RIDES_TABLE}").fetchone()[0]
+    print(f"✅ SQLite {RIDES_TABLE}: {rows} ride(s), timestamp column {types.get('timestamp')}")
+    return {"rows": rows, "timestamp_type": types.get("timestamp")}
+
+
+def main(argv: list[str] = None):
+    parser = argparse.ArgumentParser(description=f"Rewrite stored rides in schema v{SCHEMA_VERSION}.")
+    parser.add_argument("--store", choices=[store.value for store in RideStore], required=True)
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--restart", action="store_true", help="Ignore any saved checkpoint")
+    args = parser.parse_args(argv)
+
+    if RideStore(args.store) == RideStore.SQLITE:
+        migrate_sqlite()
+    else:
+        migrate_mongo(batch_size=args.batch_size, resume=not args.restart)
+
+if __name__ == "__main__":
+    main()
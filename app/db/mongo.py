@@ -1,3 +1,6 @@
+import threading
+import time
+from typing import Callable
 from pymongo import MongoClient
 from cryptography.fernet import Fernet
 from app.config import Config
@@ -5,18 +8,215 @@ from app.config import Config
 
 collection = None
 
+# One MongoClient per URI and option set for the whole process. MongoClient is
+# thread-safe and owns its own connection pool, so sharing it avoids a fresh TLS
+# handshake and server selection every time a screen or service is constructed.
+_clients: dict[tuple, MongoClient] = {}
+_clients_lock = threading.Lock()
+
+def get_client(uri: str, **options) -> MongoClient:
+    """
+    Return the shared MongoClient for `uri` and `options`, creating it on first use.
+
+    Callers passing different `options` (e.g. a short serverSelectionTimeoutMS)
+    get their own client, so their settings are never silently dropped.
+    """
+    key = (uri, tuple(sorted(options.items())))
+    client = _clients.get(key)
+    if client is not None:
+        return client
+
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            pool_options = {
+                "maxPoolSize": Config.MONGO_MAX_POOL_SIZE,
+                "minPoolSize": Config.MONGO_MIN_POOL_SIZE,
+                "maxIdleTimeMS": Config.MONGO_MAX_IDLE_TIME_MS,
+                **options
+            }
+            client = MongoClient(uri, **pool_options)
+            _clients[key] = client
+        return client
+
+def close_all_clients():
+    with _clients_lock:
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
+
+# Decrypted once per process; the key file and Fernet decrypt are not repeated per connect
+_decrypted_uri = None
+
+PING_TIMEOUT_MS = 2000
+
 def load_key():
     # print(f"Function `load_key()` was called in {where_am_i(2)}")
+    global _decrypted_uri
+    if _decrypted_uri is not None:
+        return _decrypted_uri
+
     print("🔓 Loading encryption key and decrypting MongoDB URI...")
 
     key = Config.KEY_PATH.read_bytes()
     fernet = Fernet(key)
 
     encrypted = Config.ENC_PATH.read_bytes()
-    decrypted_uri = fernet.decrypt(encrypted).decode()
+    _decrypted_uri = fernet.decrypt(encrypted).decode()
 
     print("✅ Decrypted MongoDB URI successfully.")
-    return decrypted_uri
+    return _decrypted_uri
+
+def _ping_collection():
+    """Blocking ping of the accounts cluster. Raises on failure."""
+    client = get_client(load_key(), serverSelectionTimeoutMS=PING_TIMEOUT_MS)
+    client.admin.command("ping")
+    return client[Config.DB_NAME][Config.COLLECTION_NAME]
+
+
+class MongoSupervisor:
+    """
+    Warms the MongoDB connection in the background and keeps probing its health.
+
+    Failed probes back off exponentially, so an unreachable cluster costs one
+    background ping per backoff step instead of a blocking timeout per caller.
+    """
+
+    CONNECTING = "connecting"
+    CONNECTED = "connected"
+    UNREACHABLE = "unreachable"
+
+    def __init__(self, interval: float = 30.0, base_backoff: float = 1.0, max_backoff: float = 60.0):
+        self.interval = interval
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.state = self.CONNECTING
+        self.failures = 0
+        self.last_error = None
+        self.last_ok = None
+        self.next_probe_at = None
+        self._thread = None
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._probed = threading.Condition(self._lock)
+        self._probe_count = 0
+        self._on_connected = []
+
+    @property
+    def started(self) -> bool:
+        return self._thread is not None
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="mongo-supervisor", daemon=True)
+        self._thread.start()
+
+    def _backoff(self) -> float:
+        return min(self.base_backoff * (2 ** (self.failures - 1)), self.max_backoff)
+
+    def _probe(self) -> bool:
+        global collection
+        try:
+            healthy_collection = _ping_collection()
+        except Exception as e:
+            with self._lock:
+                self.state = self.UNREACHABLE
+                self.failures += 1
+                self.last_error = str(e)
+                self._probe_count += 1
+                self._probed.notify_all()
+            print(f"❌ MongoDB health probe failed ({self.failures}x): {e}")
+            return False
+
+        with self._lock:
+            if self.state != self.CONNECTED:
+                print("✅ Connected to MongoDB.")
+            collection = healthy_collection
+            self.state = self.CONNECTED
+            self.failures = 0
+            self.last_error = None
+            self.last_ok = time.monotonic()
+            self._probe_count += 1
+            self._probed.notify_all()
+            callbacks, self._on_connected = self._on_connected, []
+
+        for callback in callbacks:
+            self._run_callback(callback, healthy_collection)
+        return True
+
+    @staticmethod
+    def _run_callback(callback: Callable, healthy_collection):
+        try:
+            callback(healthy_collection)
+        except Exception as e:
+            print(f"⚠️ MongoDB on-connect callback failed: {e}")
+
+    def when_connected(self, callback: Callable):
+        """
+        Call `callback(collection)` once the cluster is reachable, without blocking.
+
+        Runs right away if already connected, otherwise on the next successful probe.
+        """
+        with self._lock:
+            connected = self.state == self.CONNECTED
+            if not connected:
+                self._on_connected.append(callback)
+        if connected:
+            self._run_callback(callback, collection)
+        else:
+            self.start()
+
+    def _run(self):
+        while True:
+            delay = self.interval if self._probe() else self._backoff()
+            self.next_probe_at = time.monotonic() + delay
+            self._wake.wait(delay)
+            self._wake.clear()
+
+    def probe_now(self):
+        """Ask for an immediate probe without waiting for it."""
+        self.start()
+        self._wake.set()
+
+    def wait_for_probe(self, timeout: float = None, fresh: bool = False) -> bool:
+        """
+        Block until a probe has finished (a new one if `fresh`), then report health.
+        """
+        with self._lock:
+            target = self._probe_count + 1 if fresh else max(self._probe_count, 1)
+        if fresh:
+            self.probe_now()
+        else:
+            self.start()
+        with self._lock:
+            self._probed.wait_for(lambda: self._probe_count >= target, timeout)
+            return self.state == self.CONNECTED
+
+    def is_healthy(self) -> bool:
+        return self.state == self.CONNECTED
+
+    def known_unreachable(self) -> bool:
+        return self.started and self.state == self.UNREACHABLE
+
+    def status(self) -> dict:
+        """Non-blocking snapshot of the connection health."""
+        now = time.monotonic()
+        return {
+            "state": self.state,
+            "failures": self.failures,
+            "last_error": self.last_error,
+            "seconds_since_ok": now - self.last_ok if self.last_ok else None,
+            "next_probe_in": max(self.next_probe_at - now, 0.0) if self.next_probe_at else None
+        }
+
+
+mongo_supervisor = MongoSupervisor()
+
+def start_mongo_supervisor():
+    """Decrypt the URI and warm the connection in the background (e.g. during the splash)."""
+    mongo_supervisor.start()
 
 def connect_to_mongo():
     # print(f"Function `connect_to_mongo()` was called in {where_am_i(2)}")
@@ -24,13 +224,14 @@ def connect_to_mongo():
     if collection is not None:
         return collection
 
+    if mongo_supervisor.started:
+        # The supervisor owns connecting; never block on its probe here. Callers that
+        # need to wait for the first result use mongo_supervisor.wait_for_probe().
+        return collection
+
     try:
-        uri = load_key()
-        client = MongoClient(uri, serverSelectionTimeoutMS=2000)
-        client.admin.command("ping")
-        db = client[Config.DB_NAME]
+        collection = _ping_collection()
         print("✅ Connected to MongoDB.")
-        collection = db[Config.COLLECTION_NAME]
         return collection
     except Exception as e:
         print("❌ MongoDB connection failed:", e)
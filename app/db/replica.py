@@ -0,0 +1,223 @@
+"""
+Incremental replication of the MongoDB `accounts` collection into the local SQLite DB.
+
+A background thread pulls every account whose `updated_at` is at or past the last
+watermark and upserts it into SQLite, so the local store is a warm read replica
+that logins can use when Atlas is slow or unreachable.
+
+The replica has its own table (REPLICA_TABLE), so it never mixes with the accounts
+of SQLite mode. `updated_at` always comes from the server's clock (`$currentDate`
+/ `$$NOW`, or `server_now()` for inserts), as does the first watermark, so client
+clock skew cannot hide a write. Accounts deleted in Atlas leave no `updated_at` to find;
+the replica is pruned against the live usernames after a full sync, every
+RECONCILE_INTERVAL seconds, and whenever it holds more accounts than Atlas.
+
+Run replica.py to do one sync pass:
+py -m app.db.replica
+"""
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from pymongo import ASCENDING
+from pymongo.errors import PyMongoError
+
+from app.db.mongo import get_collection
+from app.db.sqlite import (
+    connect_to_sqlite, count_replica_users_sqlite, prune_replica_sqlite, REPLICA_TABLE)
+from app.db.migrate import read_mongo_batches, write_sqlite_batch, USERNAME, UPDATED_AT
+STATE_TABLE = "replica_state"
+WATERMARK_KEY = "accounts_replica_watermark"   # Renamed with the table, so old installs do one full sync
+
+DEFAULT_INTERVAL = 30.0       # Seconds between background sync passes
+DEFAULT_MAX_LAG = 120.0       # Replica is considered fresh for this long after a sync
+RECONCILE_INTERVAL = 300.0    # Seconds between prunes of accounts deleted in Atlas
+BATCH_SIZE = 500
+
+# Re-read this much before the watermark: a stamp is taken before its write commits,
+# so a write can become visible just after a pass has read past its updated_at
+WATERMARK_OVERLAP = timedelta(seconds=5)
+
+
+def server_now(collection) -> datetime:
+    """The MongoDB server's clock, which stamps every updated_at."""
+    return _as_utc(collection.database.command("hello")["localTime"])
+
+def _as_utc(value: datetime) -> datetime:
+    # pymongo returns naive datetimes that are already in UTC
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+# == Watermark storage ==
+def _ensure_state_table(conn):
+    conn.execute(f"CREATE TABLE IF NOT EXISTS {STATE_TABLE} (name TEXT PRIMARY KEY, value TEXT NOT NULL)")
+
+def load_watermark() -> Optional[datetime]:
+    conn = connect_to_sqlite()
+    _ensure_state_table(conn)
+    row = conn.execute(f"SELECT value FROM {STATE_TABLE} WHERE name = ?", (WATERMARK_KEY,)).fetchone()
+    return datetime.fromisoformat(row["value"]) if row else None
+
+def save_watermark(watermark: datetime):
+    conn = connect_to_sqlite()
+    _ensure_state_table(conn)
+    with conn:
+        conn.execute(
+            f"INSERT INTO {STATE_TABLE} (name, value) VALUES (?, ?) "
+            f"ON CONFLICT(name) DO UPDATE SET value = excluded.value",
+            (WATERMARK_KEY, watermark.isoformat()))
+
+
+class AccountReplicator:
+    """Keeps the SQLite accounts table replicated from MongoDB in the background."""
+
+    def __init__(self, interval: float = DEFAULT_INTERVAL, max_lag: float = DEFAULT_MAX_LAG):
+        self.interval = interval
+        self.max_lag = max_lag
+        self.last_sync: Optional[float] = None   # time.monotonic() of the last good pass
+        self.last_error: Optional[str] = None
+        self.rows_synced = 0
+        self.rows_pruned = 0
+        self._last_prune: Optional[float] = None   # time.monotonic() of the last prune
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._sync_lock = threading.Lock()
+
+    # == Sync passes ==
+    def sync_once(self) -> int:
+        """Pull changed accounts into SQLite. Returns the number of rows applied."""
+        with self._sync_lock:
+            try:
+                collection = get_collection()
+                if collection is None:
+                    raise ConnectionError("MongoDB is not reachable")
+
+                watermark = load_watermark()
+                if watermark is None:
+                    applied, new_watermark, pruned = self._full_sync(collection)
+                else:
+                    applied, new_watermark = self._incremental_sync(collection, watermark)
+                    pruned = self._prune_deleted(collection) if self._prune_due(collection) else 0
+
+                if new_watermark is not None:
+                    save_watermark(new_watermark)
+
+                self.rows_synced += applied
+                self.rows_pruned += pruned
+                self.last_sync = time.monotonic()
+                self.last_error = None
+                if applied:
+                    print(f"🔁 Replicated {applied} account(s) from MongoDB to SQLite.")
+                if pruned:
+                    print(f"🧹 Removed {pruned} account(s) deleted in MongoDB from the local replica.")
+                return applied
+            except (PyMongoError, ConnectionError) as e:
+                self.last_error = str(e)
+                print(f"⚠️ Account replication failed: {e}")
+                return 0
+
+    def _full_sync(self, collection) -> tuple[int, datetime, int]:
+        # Snapshot first, then everything changed since the snapshot started is re-pulled
+        started_at = server_now(collection)
+        applied = 0
+        usernames = []
+        for batch in read_mongo_batches(BATCH_SIZE):
+            applied += write_sqlite_batch(batch, REPLICA_TABLE)
+            usernames.extend(doc[USERNAME] for doc in batch)
+        return applied, started_at, self._prune(usernames)
+
+    def _incremental_sync(self, collection, watermark: datetime) -> tuple[int, Optional[datetime]]:
+        # $gte (and the overlap) re-apply rows already seen; upserts make that harmless
+        cursor = (collection
+                  .find({UPDATED_AT: {"$gte": watermark - WATERMARK_OVERLAP}}, {"_id": False})
+                  .sort(UPDATED_AT, ASCENDING)
+                  .batch_size(BATCH_SIZE))
+
+        applied = 0
+        newest = None
+        batch = []
+        for doc in cursor:
+            batch.append(doc)
+            newest = _as_utc(doc[UPDATED_AT])
+            if len(batch) >= BATCH_SIZE:
+                applied += write_sqlite_batch(batch, REPLICA_TABLE)
+                batch = []
+        if batch:
+            applied += write_sqlite_batch(batch, REPLICA_TABLE)
+        return applied, newest
+
+    # == Deletes ==
+    def _prune_due(self, collection) -> bool:
+        if self._last_prune is None or time.monotonic() - self._last_prune >= RECONCILE_INTERVAL:
+            return True
+        # More accounts here than in Atlas: something was deleted there (metadata count, no scan)
+        return count_replica_users_sqlite(connect_to_sqlite()) > collection.estimated_document_count()
+
+    def _prune_deleted(self, collection) -> int:
+        # Covered by the unique username index: no documents are fetched
+        live = [doc[USERNAME] for doc in collection.find({}, {USERNAME: True, "_id": False}).batch_size(5000)]
+        return self._prune(live)
+
+    def _prune(self, live_usernames: list[str]) -> int:
+        self._last_prune = time.monotonic()
+        return prune_replica_sqlite(connect_to_sqlite(), live_usernames)
+
+    # == Background thread ==
+    def start(self):
+        if self._thread and self._thread.is_alive() and not self._stop.is_set():
+            return
+        # A fresh stop event per thread, so a thread still winding down stays stopped
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, args=(self._stop,), name="account-replicator", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def request_sync(self):
+        """Wake the background thread for an early pass."""
+        self._wake.set()
+
+    def _run(self, stop: threading.Event):
+        while not stop.is_set():
+            self.sync_once()
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    # == Status ==
+    def has_synced(self) -> bool:
+        return self.last_sync is not None or load_watermark() is not None
+
+    def is_fresh(self) -> bool:
+        return self.last_sync is not None and time.monotonic() - self.last_sync <= self.max_lag
+
+    def status(self) -> dict:
+        return {
+            "running": bool(self._thread and self._thread.is_alive()),
+            "fresh": self.is_fresh(),
+            "seconds_since_sync": time.monotonic() - self.last_sync if self.last_sync else None,
+            "rows_synced": self.rows_synced,
+            "rows_pruned": self.rows_pruned,
+            "last_error": self.last_error
+        }
+
+
+replicator = AccountReplicator()
+
+def start_replication():
+    replicator.start()
+
+def stop_replication():
+    replicator.stop()
+
+
+def test():
+    applied = replicator.sync_once()
+    print(f"Applied {applied} row(s). Status: {replicator.status()}")
+
+if __name__ == "__main__":
+    test()
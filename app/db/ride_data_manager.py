@@ -1,48 +1,165 @@
-
-from pymongo import MongoClient
+import copy
 from datetime import datetime, timedelta
 import os
 import sqlite3
+from enum import Enum
 from dotenv import load_dotenv
-from typing import List, Dict, Optional
-from app.db.sqlite import connect_to_sqlite, TABLE_NAME, DBKey
+from typing import List, Dict, Iterator, Optional
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError
+from app.db.mongo import get_client
+from app.db.sqlite import (
+    connect_to_sqlite, write_transaction, SQL_FIND_USER, TABLE_NAME, REPLICA_TABLE, DBKey, insert_ride_sqlite,
+    find_ride_sqlite, iter_rides_sqlite, iter_ride_columns_sqlite, update_ride_sqlite, update_rides_sqlite, find_rides_by_id_sqlite,
+    distinct_ride_users_sqlite, load_ride_stats_sqlite, iter_ride_stats_sqlite)
+from app.db.indexes import (
+    ensure_indexes_in_background, provision_sqlite_indexes, verify_mongo_query_plans, RIDE_INDEXES)
+from app.db import ride_stats
+from app.db.ride_frame import RideFrame, FRAME_FIELDS
+from app.db.ride_snapshot import RideSnapshot, snapshot_cache
+from app.db.ride_rollups import RideRollups
+from app.db.ride_schema import (
+    RideStatus, TIMESTAMP_FORMAT, normalize_ride, decode_ride, encode_ride_mongo, encode_ride_sqlite,
+    to_epoch_millis, status_query, timestamp_query)
 
 load_dotenv()
 
+
+class RideStore(Enum):
+    MONGO = "mongo"
+    SQLITE = "sqlite"
+
+
 class RideDataManager:
     """Manages real ride data from actual app usage"""
     
-    def __init__(self):
+    def __init__(self, store: RideStore = None):
+        self.store = store or RideStore(os.getenv("RIDE_STORE", RideStore.MONGO.value))
         self.mongo_uri = os.getenv("MONGO_URI", "mongodb://localhost:27017")
-        self.client = MongoClient(self.mongo_uri)
+        self.client = get_client(self.mongo_uri)  # Shared, pooled client
         self.db = self.client["chaewon_db"]
         self.rides_collection = self.db["rides"]
+        self.stats_collection = self.db["ride_stats"]  # Keyed by user_id
         
-        # SQLite connection for user data
-        self.sqlite_conn = connect_to_sqlite()
+        if self.store == RideStore.SQLITE:
+            provision_sqlite_indexes(connect_to_sqlite())
+        else:
+            ensure_indexes_in_background(self.rides_collection, RIDE_INDEXES,
+                                         verify=lambda rides: verify_mongo_query_plans(rides=rides))
+        self.rollups = RideRollups(self)  # rides_hourly / rides_daily
     
     def get_user_rides(self, user_id: str) -> List[Dict]:
         """Fetch REAL rides for a specific user from actual app usage"""
+        rides = list(self.iter_user_rides(user_id))
+        print(f"📊 Found {len(rides)} real rides for user '{user_id}'")
+        return rides
+    
+    def iter_user_rides(self, user_id: str, fields: tuple[str, ...] = None, since: datetime = None,
+                        until: datetime = None, status: RideStatus | str = None,
+                        batch_size: int = 500) -> Iterator[Dict]:
+        """
+        Stream a user's rides (decoded, like get_user_rides) a batch at a time.
+        
+        Only `fields` are fetched (every field when None; ask for "_id" explicitly), and
+        since <= timestamp < until and status are filtered by the database.
+        """
         try:
-            rides = list(self.rides_collection.find({"user_id": user_id}))
-            print(f"📊 Found {len(rides)} real rides for user '{user_id}'")
-            return rides
+            for ride in self._find_rides(user_id, fields, since, until, status, batch_size):
+                yield decode_ride(ride)  # v1 and v2 rows alike
         except Exception as e:
             print(f"Error fetching rides: {e}")
-            return []
+    
+    def _find_rides(self, user_id: str, fields: tuple[str, ...] = None, since: datetime = None,
+                    until: datetime = None, status: RideStatus | str = None, batch_size: int = 500):
+        """Lazy iterable of the stored (undecoded) rides; projection and filters pushed down."""
+        snapshot_cache.count_ride_query()
+        if self.store == RideStore.SQLITE:
+            return iter_rides_sqlite(
+                connect_to_sqlite(), user_id, fields, batch_size=batch_size,
+                **self._sqlite_filters(since, until, status))
+        
+        query = {"user_id": user_id}
+        if status is not None:
+            query["status"] = status_query(status)
+        if since is not None or until is not None:
+            query["$or"] = timestamp_query(since, until)
+        projection = None
+        if fields is not None:
+            projection = {field: True for field in fields} | ({} if "_id" in fields else {"_id": False})
+        return self.rides_collection.find(query, projection, batch_size=batch_size)
+    
+    @staticmethod
+    def _sqlite_filters(since: datetime = None, until: datetime = None, status: RideStatus | str = None) -> Dict:
+        """iter_user_rides' filters in their stored SQLite form (epoch millis, status code)."""
+        return {
+            "since": to_epoch_millis(since) if since is not None else None,
+            "until": to_epoch_millis(until) if until is not None else None,
+            "status": int(RideStatus.parse(status)) if status is not None else None
+        }
+    
+    def get_ride_frame(self, user_id: str, fields: tuple[str, ...] = FRAME_FIELDS, **filters) -> RideFrame:
+        """
+        Fetch a user's rides once, as the columnar frame the charts read. Only `fields`
+        (a subset of FRAME_FIELDS, e.g. a chart's FIELDS) are fetched; the rest read as
+        not recorded. `filters` are iter_user_rides' since / until / status.
+        """
+        try:
+            return self._load_ride_frame(user_id, fields, **filters)
+        except Exception as e:
+            print(f"Error fetching rides: {e}")
+            return RideFrame.from_records([])
+    
+    def _load_ride_frame(self, user_id: str, fields: tuple[str, ...] = FRAME_FIELDS, **filters) -> RideFrame:
+        if self.store == RideStore.SQLITE:
+            # Plain tuples straight into the columns, skipping the per-ride dicts
+            snapshot_cache.count_ride_query()
+            rows = iter_ride_columns_sqlite(
+                connect_to_sqlite(), user_id, fields, **self._sqlite_filters(**filters))
+            frame = RideFrame.from_rows(rows, fields)
+        else:
+            frame = RideFrame.from_records(self._find_rides(user_id, fields, **filters), fields)
+        print(f"📊 Loaded {len(frame)} real rides for user '{user_id}'")
+        return frame
+    
+    def get_ride_rollup(self, user_id: str, since: datetime = None, until: datetime = None,
+                        resolution: str = "day", by_pickup: bool = False) -> Dict:
+        """
+        Ride counts and sums per day / hour for since <= timestamp < until, read from
+        the coarsest rollup that fits the range (see app.db.ride_rollups), so a year
+        of daily counts is a few hundred rows however many rides it holds.
+        """
+        try:
+            return self.rollups.query(user_id, since, until, resolution, by_pickup)
+        except Exception as e:
+            print(f"Error loading ride rollups: {e}")
+            return {"error": "Could not load ride rollups", "message": str(e), "buckets": []}
+    
+    def snapshot(self, user_id: str) -> RideSnapshot:
+        """
+        The user's rides as of now, for one user action: pass it to every read in the
+        action so the summary is read once and the rides at most once. Reused across
+        actions until the user's data_version changes.
+        """
+        summary = self.get_stats_summary(user_id)
+        data_version = summary.get(ride_stats.DATA_VERSION, 0)
+        return snapshot_cache.get_or_create(
+            (self.store.value, user_id, data_version),
+            lambda: RideSnapshot(user_id, data_version, summary,
+                                 lambda fields: self._load_ride_frame(user_id, fields)))
     
     def save_ride_booking(self, user_id: str, pickup: str, dropoff: str, 
                          wait_time: int = None, duration: int = None, 
                          fare: float = None, **kwargs) -> bool:
         """Save a new ride booking from actual app usage"""
         try:
+            now = datetime.now()
             ride_data = {
                 "user_id": user_id,
-                "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                "timestamp": now,
                 "pickup": pickup,
                 "dropoff": dropoff,
-                "status": "requested",  # Can be: requested, confirmed, in_progress, completed, cancelled
-                "booking_time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                "status": RideStatus.REQUESTED,  # See RideStatus for the lifecycle
+                "booking_time": now,
                 **kwargs  # Additional data like driver_id, vehicle_type, etc.
             }
             
@@ -53,30 +170,53 @@ class RideDataManager:
                 ride_data["duration"] = duration  
             if fare is not None:
                 ride_data["fare"] = fare
+            ride_data = normalize_ride(ride_data)  # ValueError on a non-numeric fare, bad status, ...
                 
-            result = self.rides_collection.insert_one(ride_data)
+            if self.store == RideStore.SQLITE:
+                with write_transaction(connect_to_sqlite()) as conn:
+                    inserted_id = insert_ride_sqlite(conn, encode_ride_sqlite(ride_data))
+                    ride_stats.apply_ride_delta_sqlite(conn, user_id, None, ride_data)
+            else:
+                inserted_id = self.rides_collection.insert_one(encode_ride_mongo(ride_data)).inserted_id
+                self._apply_stats_mongo(user_id, None, ride_data)
+            snapshot_cache.invalidate(self.store.value, user_id)
             print(f"✅ Saved new ride booking for '{user_id}': {pickup} → {dropoff}")
-            return bool(result.inserted_id)
+            return bool(inserted_id)
             
         except Exception as e:
             print(f"❌ Error saving ride booking: {e}")
             return False
     
-    def update_ride_status(self, ride_id: str, status: str, **updates) -> bool:
+    def update_ride_status(self, ride_id: str, status: RideStatus | str, **updates) -> bool:
         """Update ride status and other fields (for when ride is completed)"""
         try:
-            update_data = {
+            update_data = normalize_ride({
                 "status": status,
-                "updated_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                "updated_at": datetime.now(),
                 **updates
-            }
+            })
             
-            result = self.rides_collection.update_one(
-                {"_id": ride_id}, 
-                {"$set": update_data}
-            )
-            print(f"✅ Updated ride {ride_id} status to '{status}'")
-            return result.modified_count > 0
+            if self.store == RideStore.SQLITE:
+                with write_transaction(connect_to_sqlite()) as conn:
+                    before = decode_ride(find_ride_sqlite(conn, ride_id))
+                    modified = update_ride_sqlite(conn, ride_id, encode_ride_sqlite(update_data))
+                    if before is not None:
+                        ride_stats.apply_ride_delta_sqlite(
+                            conn, before["user_id"], before, {**before, **update_data})
+            else:
+                # The pre-image tells the stats exactly what this ride used to contribute
+                before = decode_ride(self.rides_collection.find_one_and_update(
+                    {"_id": ride_id}, 
+                    {"$set": encode_ride_mongo(update_data, partial=True)},
+                    return_document=ReturnDocument.BEFORE
+                ))
+                modified = before is not None
+                if before is not None:
+                    self._apply_stats_mongo(before["user_id"], before, {**before, **update_data})
+            if before is not None:
+                snapshot_cache.invalidate(self.store.value, before["user_id"])
+            print(f"✅ Updated ride {ride_id} status to '{update_data['status'].label}'")
+            return modified
             
         except Exception as e:
             print(f"❌ Error updating ride: {e}")
@@ -86,11 +226,10 @@ class RideDataManager:
                      fare: float, driver_rating: int = None, **kwargs) -> bool:
         """Mark ride as completed with final details"""
         completion_data = {
-            "status": "completed",
             "wait_time": wait_time,
             "duration": duration, 
             "fare": fare,
-            "completed_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            "completed_at": datetime.now()
         }
         
         if driver_rating:
@@ -98,88 +237,282 @@ class RideDataManager:
             
         completion_data.update(kwargs)  # Additional completion data
         
-        return self.update_ride_status(ride_id, "completed", **completion_data)
+        return self.update_ride_status(ride_id, RideStatus.COMPLETED, **completion_data)
+    
+    # == Bulk lifecycle ==
+    def bulk_update_status(self, ride_ids: List, status: RideStatus | str, **updates) -> List[Dict]:
+        """
+        update_ride_status for many rides at once (dispatch, end-of-shift reconciliation):
+        one bulk write and one summary write per user instead of a round trip per ride.
+        
+        Returns:
+            list[dict]: one per ride, in order: {"ride_id", "modified"}, plus "error" if it wasn't
+        """
+        return self._bulk_update([(ride_id, {"status": status, **updates}) for ride_id in ride_ids])
+    
+    def bulk_complete(self, records: List[Dict]) -> List[Dict]:
+        """
+        complete_ride for many rides. Each record holds complete_ride's arguments:
+        {"ride_id", "wait_time", "duration", "fare", "driver_rating" (optional), ...}.
+        Returns bulk_update_status's per-ride results.
+        """
+        now = datetime.now()
+        updates = []
+        for record in records:
+            fields = dict(record)
+            ride_id = fields.pop("ride_id", None)
+            missing = [field for field in ("wait_time", "duration", "fare") if field not in fields]
+            if ride_id is None or missing:
+                updates.append((ride_id, ValueError(f"Missing {', '.join(missing or ['ride_id'])}")))
+                continue
+            if not fields.get("driver_rating"):
+                fields.pop("driver_rating", None)  # As complete_ride: no rating, no field
+            updates.append((ride_id, {"status": RideStatus.COMPLETED, "completed_at": now, **fields}))
+        return self._bulk_update(updates, now)
     
-    def get_ride_statistics(self, user_id: str) -> Dict:
+    def _bulk_update(self, updates: List[tuple], now: datetime = None) -> List[Dict]:
+        """Apply (ride_id, fields) pairs; `fields` may instead be the ValueError to report for that ride."""
+        now = now or datetime.now()
+        # Mongo keeps milliseconds; a stamp that round-trips exactly shows which guarded updates applied
+        now = now.replace(microsecond=now.microsecond // 1000 * 1000)
+        
+        results, valid = [None] * len(updates), []
+        for index, (ride_id, fields) in enumerate(updates):
+            if isinstance(fields, ValueError):  # Already rejected (see bulk_complete)
+                results[index] = {"ride_id": ride_id, "modified": False, "error": str(fields)}
+                continue
+            try:
+                valid.append((index, ride_id, normalize_ride({**fields, "updated_at": now})))
+            except ValueError as e:
+                results[index] = {"ride_id": ride_id, "modified": False, "error": str(e)}
+        
+        try:
+            if self.store == RideStore.SQLITE:
+                applied = self._bulk_update_sqlite(valid)
+            else:
+                applied = self._bulk_update_mongo(valid, now)
+        except Exception as e:
+            print(f"❌ Error in bulk ride update: {e}")
+            applied = {index: {"ride_id": ride_id, "modified": False, "error": str(e)} for index, ride_id, _ in valid}
+        
+        for index, result in applied.items():
+            results[index] = result
+        modified = sum(result["modified"] for result in results)
+        print(f"✅ Bulk-updated {modified}/{len(results)} ride(s)")
+        return results
+    
+    @staticmethod
+    def _sqlite_ride_id(ride_id) -> Optional[int]:
+        # update_ride_status takes ids as strings too ("42"); SQLite row ids are integers
+        try:
+            return int(ride_id)
+        except (TypeError, ValueError):
+            return None
+    
+    def _bulk_update_sqlite(self, valid: List[tuple]) -> Dict[int, Dict]:
+        results, deltas = {}, {}
+        row_ids = [self._sqlite_ride_id(ride_id) for _, ride_id, _ in valid]
+        with write_transaction(connect_to_sqlite()) as conn:
+            current = {row_id: decode_ride(ride) for row_id, ride in
+                       find_rides_by_id_sqlite(conn, [row_id for row_id in row_ids if row_id is not None]).items()}
+            found = []
+            for (index, ride_id, update), row_id in zip(valid, row_ids):
+                before = current.get(row_id)
+                if before is None:
+                    results[index] = {"ride_id": ride_id, "modified": False, "error": "Ride not found"}
+                    continue
+                # A ride listed twice takes both updates in order, like two update_ride_status calls
+                current[row_id] = after = {**before, **update}
+                deltas.setdefault(before["user_id"], []).append(ride_stats.ride_delta(before, after))
+                found.append((row_id, encode_ride_sqlite(update)))
+                results[index] = {"ride_id": ride_id, "modified": True}
+            
+            update_rides_sqlite(conn, found)
+            for user_id, user_deltas in deltas.items():
+                ride_stats.apply_delta_sqlite(conn, user_id, ride_stats.merge_deltas(user_deltas))
+        for user_id in deltas:
+            snapshot_cache.invalidate(self.store.value, user_id)
+        return results
+    
+    def _bulk_update_mongo(self, valid: List[tuple], now: datetime) -> Dict[int, Dict]:
+        first = {}  # ride_id -> index of its first update; any repeat takes the single-ride path
+        for index, ride_id, _ in valid:
+            first.setdefault(ride_id, index)
+        ride_ids = list(first)
+        projection = {field: True for field in ("user_id", "updated_at", *ride_stats.RIDE_FIELDS)}
+        stored = {doc["_id"]: doc for doc in self.rides_collection.find({"_id": {"$in": ride_ids}}, projection)}
+        
+        # Guarded on updated_at, so a ride changed since it was read is never applied on a stale pre-image
+        operations = [
+            UpdateOne({"_id": ride_id, "updated_at": stored[ride_id].get("updated_at")},
+                      {"$set": encode_ride_mongo(update, partial=True)})
+            for index, ride_id, update in valid if first[ride_id] == index and ride_id in stored]
+        if operations:
+            try:
+                self.rides_collection.bulk_write(operations, ordered=False)
+            except BulkWriteError as e:
+                print(f"⚠️ {len(e.details.get('writeErrors', []))} bulk ride update(s) failed; retrying one by one")
+        applied = {doc["_id"] for doc in self.rides_collection.find(
+            {"_id": {"$in": ride_ids}, "updated_at": now}, {"_id": True})}
+        
+        results, deltas, retries = {}, {}, []
+        for index, ride_id, update in valid:
+            if ride_id not in stored:
+                results[index] = {"ride_id": ride_id, "modified": False, "error": "Ride not found"}
+            elif first[ride_id] == index and ride_id in applied:
+                before = decode_ride(stored[ride_id])
+                deltas.setdefault(before["user_id"], []).append(ride_stats.ride_delta(before, {**before, **update}))
+                results[index] = {"ride_id": ride_id, "modified": True}
+            else:
+                retries.append((index, ride_id, update))
+        
+        for user_id, user_deltas in deltas.items():
+            self._apply_delta_mongo(user_id, ride_stats.merge_deltas(user_deltas))
+            snapshot_cache.invalidate(self.store.value, user_id)
+        for index, ride_id, update in retries:
+            modified = self.update_ride_status(ride_id, **update)
+            results[index] = {"ride_id": ride_id, "modified": modified,
+                              **({} if modified else {"error": "Could not update ride"})}
+        return results
+    
+    def get_ride_statistics(self, user_id: str, snapshot: RideSnapshot = None) -> Dict:
         """Get comprehensive ride statistics from REAL data only"""
-        rides = self.get_user_rides(user_id)
+        try:
+            snapshot = snapshot or self.snapshot(user_id)
+        except Exception as e:
+            print(f"Error loading ride statistics: {e}")
+            return {"error": "Could not load ride statistics", "message": str(e)}
+        
+        # A copy, so callers can't change what the rest of the action reads
+        return copy.deepcopy(snapshot.derived(
+            "statistics", lambda snap: self._build_statistics(ride_stats.to_statistics_summary(snap.summary))))
+    
+    # == Materialized statistics ==
+    def _apply_stats_mongo(self, user_id: str, before: Optional[Dict], after: Dict):
+        self._apply_delta_mongo(user_id, ride_stats.ride_delta(before, after))
+    
+    def _apply_delta_mongo(self, user_id: str, delta: Dict):
+        try:
+            ride_stats.apply_delta_mongo(self.stats_collection, user_id, delta)
+        except Exception as e:
+            # The ride itself is saved; flag the summary so the next read rebuilds it
+            print(f"⚠️ Could not update ride stats for '{user_id}': {e}")
+            self.stats_collection.update_one(
+                {"_id": user_id}, {"$set": {ride_stats.NEEDS_REBUILD: True}}, upsert=True)
+    
+    def get_stats_summary(self, user_id: str) -> Dict:
+        """The user's materialized ride summary, rebuilt from history first if it isn't trusted."""
+        snapshot_cache.count_summary_read()
+        if self.store == RideStore.SQLITE:
+            summary = load_ride_stats_sqlite(connect_to_sqlite(), user_id)
+        else:
+            summary = ride_stats.load_summary_mongo(self.stats_collection, user_id)
         
-        if not rides:
+        if not ride_stats.is_trusted(summary):
+            summary = self._rebuild_user_stats(user_id)
+        return summary
+    
+    def _rebuild_user_stats(self, user_id: str) -> Dict:
+        if self.store == RideStore.SQLITE:
+            with write_transaction(connect_to_sqlite()) as conn:
+                return ride_stats.rebuild_user_sqlite(conn, user_id)
+        return ride_stats.rebuild_user_mongo(self.rides_collection, self.stats_collection, user_id)
+    
+    def get_fleet_percentiles(self) -> Dict:
+        """Fleet-wide p50/p90/p99 of wait time, duration and fare, merged from every user's sketches."""
+        try:
+            if self.store == RideStore.SQLITE:
+                summaries = iter_ride_stats_sqlite(connect_to_sqlite())
+            else:
+                summaries = self.stats_collection.find(
+                    {}, {"sketches": True, "sketch_buffer": True, "_id": False})
+            return ride_stats.fleet_percentiles(summaries)
+        except Exception as e:
+            print(f"Error loading fleet percentiles: {e}")
+            return {}
+    
+    def rebuild_ride_stats(self, user_id: str = None) -> int:
+        """Backfill ride summaries from ride history, for one user or everyone. Returns users rebuilt."""
+        users = [user_id] if user_id else self.get_all_users_with_rides()
+        for user in users:
+            self._rebuild_user_stats(user)
+        return len(users)
+    
+    @staticmethod
+    def _parse_date(timestamp):
+        try:
+            return datetime.strptime(timestamp, TIMESTAMP_FORMAT).date()
+        except (TypeError, ValueError):
+            return None
+    
+    def _build_statistics(self, summary: Dict) -> Dict:
+        """Shape an aggregated summary into the public statistics document"""
+        total = summary["total"]
+        completed = summary["completed"]
+        
+        if not total:
             return {
                 "error": "No real ride data found",
                 "message": "User hasn't booked any rides yet. Statistics will appear after actual app usage."
             }
         
-        # Only process completed rides for accurate statistics
-        completed_rides = [r for r in rides if r.get('status') == 'completed']
-        
-        if not completed_rides:
+        if not completed:
             return {
                 "error": "No completed rides found", 
-                "message": f"Found {len(rides)} ride(s) but none are completed yet.",
-                "pending_rides": len(rides)
+                "message": f"Found {total} ride(s) but none are completed yet.",
+                "pending_rides": total
             }
         
-        # Calculate statistics from real data
-        wait_times = [r.get('wait_time', 0) for r in completed_rides if r.get('wait_time')]
-        durations = [r.get('duration', 0) for r in completed_rides if r.get('duration')]
-        fares = [r.get('fare', 0) for r in completed_rides if r.get('fare')]
-        
-        # Count pickup locations from real rides
-        pickup_counts = {}
-        for ride in completed_rides:
-            pickup = ride.get('pickup', 'Unknown')
-            pickup_counts[pickup] = pickup_counts.get(pickup, 0) + 1
-        
-        # Calculate date range from real timestamps
-        timestamps = []
-        for ride in completed_rides:
-            try:
-                ts = datetime.strptime(ride['timestamp'], "%Y-%m-%d %H:%M:%S")
-                timestamps.append(ts)
-            except (KeyError, ValueError):
-                continue
+        wait, duration, fare = summary["wait"], summary["duration"], summary["fare"]
+        pickup_counts = dict(summary["pickups"])
         
         return {
-            "total_rides": len(rides),
-            "completed_rides": len(completed_rides),
+            "total_rides": total,
+            "completed_rides": completed,
             "date_range": {
-                "start": min(timestamps).date() if timestamps else None,
-                "end": max(timestamps).date() if timestamps else None
+                "start": self._parse_date(summary["first"]),
+                "end": self._parse_date(summary["last"])
             },
             "wait_times": {
-                "average": sum(wait_times) / len(wait_times) if wait_times else 0,
-                "median": sorted(wait_times)[len(wait_times)//2] if wait_times else 0,
-                "min": min(wait_times) if wait_times else 0,
-                "max": max(wait_times) if wait_times else 0,
-                "data": wait_times,
-                "count": len(wait_times)
+                "average": wait["avg"] or 0,
+                "median": wait["median"] or 0,
+                "p90": wait["p90"] or 0,
+                "p99": wait["p99"] or 0,
+                "min": wait["min"] or 0,
+                "max": wait["max"] or 0,
+                "count": wait["count"],
+                "histogram": wait["histogram"]
             },
             "durations": {
-                "average": sum(durations) / len(durations) if durations else 0,
-                "data": durations,
-                "count": len(durations)
+                "average": duration["avg"] or 0,
+                "median": duration["p50"] or 0,
+                "p90": duration["p90"] or 0,
+                "p99": duration["p99"] or 0,
+                "count": duration["count"]
             },
             "fares": {
-                "average": sum(fares) / len(fares) if fares else 0,
-                "total": sum(fares),
-                "data": fares,
-                "count": len(fares)
+                "average": fare["avg"] or 0,
+                "median": fare["p50"] or 0,
+                "p90": fare["p90"] or 0,
+                "p99": fare["p99"] or 0,
+                "total": fare["sum"] or 0,
+                "count": fare["count"]
             },
             "locations": {
                 "total_served": len(pickup_counts),
                 "pickup_counts": pickup_counts,
-                "most_popular": max(pickup_counts.items(), key=lambda x: x[1]) if pickup_counts else None
+                "most_popular": summary["pickups"][0] if summary["pickups"] else None
             },
+            "fare_trend": summary["fit"],
             "data_source": "real_usage"
         }
     
     def get_user_info(self, user_id: str) -> Dict:
         """Get user information from SQLite"""
         try:
-            cursor = self.sqlite_conn.cursor()
-            cursor.execute(f"SELECT * FROM {TABLE_NAME} WHERE {DBKey.USERNAME.value} = ?", (user_id,))
-            user = cursor.fetchone()
+            # Pooled per-thread connection; safe to call from any thread. Mongo-mode accounts live in the replica
+            table = TABLE_NAME if self.store == RideStore.SQLITE else REPLICA_TABLE
+            user = connect_to_sqlite().execute(SQL_FIND_USER[table], (user_id,)).fetchone()
             
             if user:
                 return {
@@ -197,23 +530,29 @@ class RideDataManager:
     def get_all_users_with_rides(self) -> List[str]:
         """Get list of all users who have ride data"""
         try:
+            if self.store == RideStore.SQLITE:
+                return distinct_ride_users_sqlite(connect_to_sqlite())
             users = self.rides_collection.distinct("user_id")
             return users
         except Exception as e:
             print(f"Error getting users with rides: {e}")
             return []
     
-    def check_real_data_availability(self, user_id: str) -> Dict:
+    def check_real_data_availability(self, user_id: str, snapshot: RideSnapshot = None) -> Dict:
         """Check if user has real ride data available for visualization"""
-        rides = self.get_user_rides(user_id)
-        completed_rides = [r for r in rides if r.get('status') == 'completed']
+        try:
+            summary = (snapshot or self.snapshot(user_id)).summary
+            total, completed = summary["total"], summary["completed"]
+        except Exception as e:
+            print(f"Error loading ride summary: {e}")
+            total = completed = 0
         
         return {
-            "has_data": len(completed_rides) > 0,
-            "total_rides": len(rides),
-            "completed_rides": len(completed_rides),
-            "can_generate_charts": len(completed_rides) >= 3,  # Minimum for meaningful charts
-            "message": self._get_data_availability_message(len(rides), len(completed_rides))
+            "has_data": completed > 0,
+            "total_rides": total,
+            "completed_rides": completed,
+            "can_generate_charts": completed >= 3,  # Minimum for meaningful charts
+            "message": self._get_data_availability_message(total, completed)
         }
     
     def _get_data_availability_message(self, total: int, completed: int) -> str:
@@ -238,3 +577,50 @@ class RideDataManager:
         print("⚠️ Warning: ensure_data_exists() is deprecated. App now uses real data only.")
         availability = self.check_real_data_availability(user_id)
         return availability["has_data"]
+
+
+def benchmark(updates: int = 10_000):
+    """Single-ride vs bulk updates of `updates` rides, on a throwaway SQLite database."""
+    import contextlib
+    import io
+    import tempfile
+    import time
+    from pathlib import Path
+    from app.db import sqlite as sqlite_db
+    
+    sqlite_db.DB_PATH = Path(tempfile.mkdtemp()) / "bulk_benchmark.db"
+    manager = RideDataManager(RideStore.SQLITE)
+    timings = {}
+    with contextlib.redirect_stdout(io.StringIO()):  # The single-ride path prints per ride
+        for user in range(updates // 100):
+            for _ in range(200):
+                manager.save_ride_booking(f"user{user}", "Mall", "Home")
+        ride_ids = list(range(1, updates * 2 + 1))
+        one_by_one, in_bulk = ride_ids[:updates], ride_ids[updates:]
+        
+        start = time.perf_counter()
+        for ride_id in one_by_one:
+            manager.update_ride_status(ride_id, RideStatus.CONFIRMED)
+        timings["update_ride_status"] = time.perf_counter() - start
+        
+        start = time.perf_counter()
+        results = manager.bulk_update_status(in_bulk, RideStatus.CONFIRMED)
+        timings["bulk_update_status"] = time.perf_counter() - start
+        
+        start = time.perf_counter()
+        completed = manager.bulk_complete(
+            [{"ride_id": ride_id, "wait_time": 5, "duration": 20, "fare": 150.0} for ride_id in in_bulk])
+        timings["bulk_complete"] = time.perf_counter() - start
+    
+    assert all(result["modified"] for result in results + completed)
+    # The last user's 200 rides have the highest ids, so they are all in the bulk half
+    last_user = f"user{updates // 100 - 1}"
+    assert manager.get_ride_statistics(last_user)["completed_rides"] == 200
+    for name, seconds in timings.items():
+        print(f"{name:>20}: {updates:,} rides in {seconds:6.2f}s ({updates / seconds:,.0f} rides/s)")
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Benchmark bulk ride lifecycle updates on SQLite.")
+    parser.add_argument("--benchmark", type=int, metavar="UPDATES", default=10_000)
+    benchmark(parser.parse_args().benchmark)
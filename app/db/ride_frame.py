@@ -0,0 +1,235 @@
+"""
+Columnar view of a user's rides, built once per fetch and shared by every chart.
+
+Timestamps are `datetime64[s]`, numeric fields are float arrays (NaN = not recorded),
+and pickup / dropoff / status are small integer codes into label arrays, so each
+statistic is a single vectorized NumPy call instead of a pass over ride dicts.
+
+Run ride_frame.py to benchmark it against the per-dict loops it replaces:
+py -m app.db.ride_frame
+"""
+from dataclasses import dataclass
+from typing import Iterable, Optional
+
+import numpy as np
+
+from app.db.ride_schema import RideStatus
+
+RIDE_STATUSES = tuple(status.label for status in RideStatus)   # Indexed by RideStatus code
+OTHER_STATUS = len(RIDE_STATUSES)   # Code for anything not in RIDE_STATUSES
+COMPLETED_CODE = int(RideStatus.COMPLETED)
+UNKNOWN_LOCATION = "Unknown"
+
+# Only these fields are read, so stores can project everything else away
+FRAME_FIELDS = ("timestamp", "status", "pickup", "dropoff", "wait_time", "duration", "fare")
+
+# Both stored forms: v2 codes (and RideStatus members) and v1 labels
+_STATUS_CODES = {int(status): int(status) for status in RideStatus} | {
+    status.label: int(status) for status in RideStatus}
+
+
+def _encode(values: list) -> tuple[np.ndarray, np.ndarray]:
+    """Categorical codes + labels in first-seen order; missing values become UNKNOWN_LOCATION."""
+    index = {}
+    codes = np.fromiter(
+        (index.setdefault(UNKNOWN_LOCATION if value is None else value, len(index)) for value in values),
+        dtype=np.int32, count=len(values))
+    return codes, np.array(list(index), dtype=object)
+
+def _timestamps(values: list) -> np.ndarray:
+    """datetime64[s] from v2 epoch millis (SQLite), datetimes (Mongo) or v1 strings."""
+    first = next((value for value in values if value is not None), None)
+    if isinstance(first, int):
+        nat = np.datetime64("NaT").astype(np.int64)
+        millis = np.array([nat if value is None else value for value in values], dtype=np.int64)
+        return millis.astype("datetime64[ms]").astype("datetime64[s]")
+    return np.array(["NaT" if value is None else value for value in values], dtype="datetime64[s]")
+
+def _floats(values: list) -> np.ndarray:
+    return np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+
+
+@dataclass(frozen=True)
+class RideFrame:
+    timestamps: np.ndarray      # datetime64[s], NaT if missing
+    wait_time: np.ndarray       # float64 minutes, NaN if missing
+    duration: np.ndarray        # float64 minutes, NaN if missing
+    fare: np.ndarray            # float64, NaN if missing
+    pickup_codes: np.ndarray    # int32 index into pickup_labels
+    pickup_labels: np.ndarray
+    dropoff_codes: np.ndarray   # int32 index into dropoff_labels
+    dropoff_labels: np.ndarray
+    status_codes: np.ndarray    # int8 index into RIDE_STATUSES, OTHER_STATUS otherwise
+
+    # == Construction ==
+    @classmethod
+    def from_columns(cls, columns: dict[str, list]) -> "RideFrame":
+        """
+        Build from one list per FRAME_FIELDS entry (e.g. straight from a projected query).
+        Fields left out (not fetched) read as not recorded for every ride.
+        """
+        count = max(map(len, columns.values()), default=0)
+        column = lambda field: columns[field] if field in columns else [None] * count
+        pickup_codes, pickup_labels = _encode(column("pickup"))
+        dropoff_codes, dropoff_labels = _encode(column("dropoff"))
+        return cls(
+            # One vectorized conversion instead of strptime per row
+            timestamps=_timestamps(column("timestamp")),
+            wait_time=_floats(column("wait_time")),
+            duration=_floats(column("duration")),
+            fare=_floats(column("fare")),
+            pickup_codes=pickup_codes,
+            pickup_labels=pickup_labels,
+            dropoff_codes=dropoff_codes,
+            dropoff_labels=dropoff_labels,
+            status_codes=np.array(
+                [_STATUS_CODES.get(value, OTHER_STATUS) for value in column("status")], dtype=np.int8)
+        )
+
+    @classmethod
+    def from_records(cls, rides: Iterable[dict], fields: tuple[str, ...] = FRAME_FIELDS) -> "RideFrame":
+        columns = {field: [] for field in fields}
+        for ride in rides:
+            for field, values in columns.items():
+                values.append(ride.get(field))
+        return cls.from_columns(columns)
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[tuple], fields: tuple[str, ...] = FRAME_FIELDS) -> "RideFrame":
+        """Build from tuples in `fields` order (e.g. an SQLite cursor)."""
+        transposed = list(zip(*rows)) or [()] * len(fields)
+        return cls.from_columns({field: list(values) for field, values in zip(fields, transposed)})
+
+    def __len__(self) -> int:
+        return len(self.status_codes)
+
+    # == Selections ==
+    @property
+    def completed(self) -> np.ndarray:
+        return self.status_codes == COMPLETED_CODE
+
+    def recorded(self, column: str, mask: Optional[np.ndarray] = None) -> np.ndarray:
+        """Values of a numeric column where it was recorded, optionally within `mask`."""
+        values = getattr(self, column)
+        keep = ~np.isnan(values)
+        if mask is not None:
+            keep &= mask
+        return values[keep]
+
+    def filter(self, mask: np.ndarray) -> "RideFrame":
+        """A frame of only the rows in `mask`; the label arrays are shared."""
+        return RideFrame(
+            timestamps=self.timestamps[mask],
+            wait_time=self.wait_time[mask],
+            duration=self.duration[mask],
+            fare=self.fare[mask],
+            pickup_codes=self.pickup_codes[mask],
+            pickup_labels=self.pickup_labels,
+            dropoff_codes=self.dropoff_codes[mask],
+            dropoff_labels=self.dropoff_labels,
+            status_codes=self.status_codes[mask]
+        )
+
+    # == Aggregates ==
+    def daily_counts(self) -> tuple[np.ndarray, np.ndarray]:
+        """(days as datetime64[D], rides per day), sorted by day."""
+        days = self.timestamps[~np.isnat(self.timestamps)].astype("datetime64[D]")
+        return np.unique(days, return_counts=True)
+
+    def pickup_counts(self, top_n: int = None) -> list[tuple[str, int]]:
+        """(location, rides) most popular first; ties keep first-seen order, as dict counting did."""
+        counts = np.bincount(self.pickup_codes, minlength=len(self.pickup_labels))
+        order = np.argsort(-counts, kind="stable")
+        order = order[counts[order] > 0][:top_n]
+        return [(str(self.pickup_labels[code]), int(counts[code])) for code in order]
+
+    def wait_histogram(self, bins: int = 15) -> tuple[np.ndarray, np.ndarray]:
+        """(counts, bin edges) of the recorded wait times."""
+        return np.histogram(self.recorded("wait_time"), bins=bins)
+
+    def duration_fare_pairs(self) -> tuple[np.ndarray, np.ndarray]:
+        """Durations and fares of the rides that recorded both."""
+        both = ~np.isnan(self.duration) & ~np.isnan(self.fare)
+        return self.duration[both], self.fare[both]
+
+
+# == Benchmark ==
+def _synthetic_rides(count: int, seed: int = 7) -> list[dict]:
+    rng = np.random.default_rng(seed)
+    starts = np.datetime64("2025-01-01T00:00:00") + rng.integers(0, 365 * 86400, count).astype("timedelta64[s]")
+    stamps = np.datetime_as_string(starts, unit="s")
+    locations = [f"Stop {index}" for index in range(40)]
+    rides = []
+    for index in range(count):
+        ride = {
+            "timestamp": stamps[index].replace("T", " "),
+            "pickup": locations[index % 40],
+            "dropoff": locations[(index * 7) % 40],
+            "status": "completed" if index % 5 else "requested",
+        }
+        if index % 5:
+            ride.update(wait_time=int(index % 30) + 1, duration=int(index % 50) + 5, fare=float(index % 300) + 40)
+        rides.append(ride)
+    return rides
+
+def _dict_loops(rides: list[dict]):
+    # What the chart components did before RideFrame: strptime and dict counting per chart
+    from datetime import datetime
+    date_counts = {}
+    for ride in rides:
+        date = datetime.strptime(ride["timestamp"], "%Y-%m-%d %H:%M:%S").date()
+        date_counts[date] = date_counts.get(date, 0) + 1
+    wait_times = [ride.get("wait_time", 0) for ride in rides if "wait_time" in ride]
+    histogram = np.histogram(wait_times, bins=15)
+    pickup_counts = {}
+    for ride in rides:
+        pickup = ride.get("pickup", UNKNOWN_LOCATION)
+        pickup_counts[pickup] = pickup_counts.get(pickup, 0) + 1
+    top = sorted(pickup_counts.items(), key=lambda item: item[1], reverse=True)[:10]
+    durations = [ride.get("duration", 0) for ride in rides if "duration" in ride]
+    fares = [ride.get("fare", 0) for ride in rides if "fare" in ride]
+    return sorted(date_counts), histogram, top, np.polyfit(durations, fares, 1)
+
+def _frame_ops(frame: RideFrame):
+    days, counts = frame.daily_counts()
+    histogram = frame.wait_histogram(15)
+    top = frame.pickup_counts(10)
+    durations, fares = frame.duration_fare_pairs()
+    return days, histogram, top, np.polyfit(durations, fares, 1)
+
+def benchmark(sizes: tuple[int, ...] = (10_000, 1_000_000)):
+    import time
+
+    for size in sizes:
+        rides = _synthetic_rides(size)
+
+        start = time.perf_counter()
+        _dict_loops(rides)
+        loops = time.perf_counter() - start
+
+        start = time.perf_counter()
+        frame = RideFrame.from_records(rides)
+        build = time.perf_counter() - start
+        start = time.perf_counter()
+        _frame_ops(frame)
+        vectorized = time.perf_counter() - start
+
+        print(f"{size:>9,} rides: dict loops {loops * 1000:8.1f} ms | "
+              f"RideFrame build {build * 1000:8.1f} ms + charts {vectorized * 1000:6.1f} ms "
+              f"({loops / (build + vectorized):.1f}x)")
+
+def test():
+    rides = _synthetic_rides(2_000)
+    frame = RideFrame.from_records(rides)
+    old_days, old_histogram, old_top, old_fit = _dict_loops(rides)
+    days, histogram, top, fit = _frame_ops(frame)
+
+    assert [str(day) for day in days] == [str(day) for day in old_days]
+    assert np.array_equal(histogram[0], old_histogram[0])
+    assert top == old_top
+    assert np.allclose(fit, old_fit)
+    print("✅ RideFrame matches the dict loops.")
+    benchmark()
+
+if __name__ == "__main__":
+    test()
@@ -0,0 +1,374 @@
+"""
+Pre-aggregated ride rollups, so long-range charts read buckets instead of rides.
+
+`rides_hourly` and `rides_daily` hold one row per user, pickup and hour / day with
+the counts and sums of `ride_stats.ride_counters` (rides, completed, and the count
+and sum of wait time, duration and fare). An incremental job keeps them current:
+every ride booked or updated since its watermark marks that user's span of days
+dirty, and the span is recomputed from the rides and swapped in. Recomputing rather
+than adding makes a rerun harmless, so the watermark is held back by ROLLUP_LAG to
+cover writes from clients whose clocks run a little behind.
+
+`start_rollup_job()` runs the job in the background every ROLLUP_INTERVAL seconds
+(the app starts it after the splash). `RideRollups.query()` (RideDataManager.get_ride_rollup) answers from the coarsest
+rollup whose buckets line up with the requested range and resolution, and only
+buckets the rides themselves when the range starts or ends inside an hour.
+
+Run the job (incremental; --full recomputes every bucket):
+py -m app.db.ride_rollups
+py -m app.db.ride_rollups --store sqlite --full
+Benchmark on synthetic rides (written to a throwaway SQLite database):
+py -m app.db.ride_rollups --benchmark 1000000
+"""
+import argparse
+import threading
+import time
+from datetime import date, datetime, timedelta
+from typing import Iterable, Optional
+
+from pymongo import DeleteMany, InsertOne
+
+from app.db import ride_stats
+from app.db.indexes import ensure_indexes_in_background, ROLLUP_INDEXES
+from app.db.ride_frame import UNKNOWN_LOCATION
+from app.db.ride_schema import decode_ride, parse_timestamp, to_epoch_millis, from_epoch_millis, timestamp_query
+from app.db.sqlite import (
+    connect_to_sqlite, write_transaction, RIDES_HOURLY_TABLE, RIDES_DAILY_TABLE, ROLLUP_STATE_TABLE,
+    ROLLUP_COUNTERS, dirty_ride_spans_sqlite, replace_rollup_rows_sqlite, iter_rollup_rows_sqlite,
+    load_rollup_watermark_sqlite, save_rollup_watermark_sqlite)
+
+HOUR = timedelta(hours=1)
+DAY = timedelta(days=1)
+
+# Resolution -> (table / collection, bucket width), coarsest first
+RESOLUTIONS = {
+    "day": (RIDES_DAILY_TABLE, DAY),
+    "hour": (RIDES_HOURLY_TABLE, HOUR),
+}
+
+WATERMARK_NAME = "rides"   # The job's; each user caught up before a read keeps "rides:<user_id>"
+ROLLUP_LAG = timedelta(minutes=5)
+ROLLUP_INTERVAL = 15 * 60   # Seconds between background passes
+
+# One swap at a time per store, across every RideDataManager in the process
+_store_locks: dict[str, threading.Lock] = {}
+
+# Only what the rollups count, so stores can project everything else away
+ROLLUP_FIELDS = ("timestamp", "status", "pickup", "wait_time", "duration", "fare")
+
+# ride_stats.ride_counters() path -> rollup counter
+_COUNTER_PATHS = {
+    "total": "rides",
+    "completed": "completed",
+    "wait.count": "wait_count",
+    "wait.sum": "wait_sum",
+    "duration.count": "duration_count",
+    "duration.sum": "duration_sum",
+    "fare.count": "fare_count",
+    "fare.sum": "fare_sum",
+}
+
+
+# == Buckets ==
+def bucket_start(moment: datetime, width: timedelta) -> datetime:
+    """The start of the hour / day `moment` falls in (datetime.min is midnight, so both line up)."""
+    return moment - (moment - datetime.min) % width
+
+def rollup_rows(rides: Iterable[dict], width: timedelta) -> dict[tuple[datetime, str], dict]:
+    """Counters per (bucket start, pickup) of decoded rides; rides without a timestamp aren't bucketed."""
+    rows = {}
+    for ride in rides:
+        moment = ride.get("timestamp")
+        if not isinstance(moment, datetime):
+            continue
+        key = (bucket_start(moment, width), ride.get("pickup") or UNKNOWN_LOCATION)
+        row = rows.get(key)
+        if row is None:
+            row = rows[key] = dict.fromkeys(ROLLUP_COUNTERS, 0)
+        for path, change in ride_stats.ride_counters(ride).items():
+            counter = _COUNTER_PATHS.get(path)
+            if counter:
+                row[counter] += change
+    return rows
+
+def coarsen(rows: dict, width: timedelta, by_pickup: bool = True) -> dict[tuple[datetime, str], dict]:
+    """Add finer rows up into `width` buckets, and across pickups unless `by_pickup` (pickup reads None)."""
+    coarse = {}
+    for (start, pickup), counters in rows.items():
+        key = (bucket_start(start, width), pickup if by_pickup else None)
+        row = coarse.setdefault(key, dict.fromkeys(ROLLUP_COUNTERS, 0))
+        for counter, value in counters.items():
+            row[counter] += value
+    return coarse
+
+def pick_resolution(since: datetime = None, until: datetime = None, resolution: str = "day") -> Optional[str]:
+    """The coarsest rollup no coarser than `resolution` whose buckets line up with since / until, if any."""
+    finest = RESOLUTIONS[resolution][1]
+    for name, (_, width) in RESOLUTIONS.items():
+        if width <= finest and all(bound is None or bucket_start(bound, width) == bound for bound in (since, until)):
+            return name
+    return None
+
+def daily_ride_counts(rollup: dict) -> tuple[list[date], list[int]]:
+    """(days, rides per day) of a day-resolution rollup without pickups, as the frequency charts plot them."""
+    buckets = rollup.get("buckets", [])
+    return [bucket["start"].date() for bucket in buckets], [int(bucket["rides"]) for bucket in buckets]
+
+
+# == Store ==
+def _millis(moment: Optional[datetime]) -> Optional[int]:
+    return to_epoch_millis(moment) if moment is not None else None
+
+
+class RideRollups:
+    """The rollup job and rollup reads for one ride store (see RideDataManager)."""
+
+    def __init__(self, manager):
+        self.manager = manager
+        self.sqlite = manager.store.value == "sqlite"
+        if not self.sqlite:
+            self.collections = {name: manager.db[table] for name, (table, _) in RESOLUTIONS.items()}
+            self.state_collection = manager.db[ROLLUP_STATE_TABLE]
+            for collection in self.collections.values():
+                ensure_indexes_in_background(collection, ROLLUP_INDEXES)
+        self._lock = _store_locks.setdefault(manager.store.value, threading.Lock())
+
+    # == Watermarks ==
+    def load_watermark(self, name: str = WATERMARK_NAME) -> Optional[datetime]:
+        if self.sqlite:
+            millis = load_rollup_watermark_sqlite(connect_to_sqlite(), name)
+            return from_epoch_millis(millis) if millis is not None else None
+        doc = self.state_collection.find_one({"_id": name})
+        return doc["watermark"] if doc else None
+
+    def save_watermark(self, watermark: Optional[datetime], name: str = WATERMARK_NAME):
+        """None forgets the watermark, so the next pass starts over."""
+        if self.sqlite:
+            save_rollup_watermark_sqlite(connect_to_sqlite(), name, _millis(watermark))
+        elif watermark is None:
+            self.state_collection.delete_one({"_id": name})
+        else:
+            self.state_collection.update_one({"_id": name}, {"$set": {"watermark": watermark}}, upsert=True)
+
+    # == Job ==
+    def _dirty_spans(self, since: Optional[datetime], user_id: str = None) -> dict[str, tuple[datetime, datetime]]:
+        """user_id -> (first, last) timestamp of their rides booked or updated since `since` (all when None)."""
+        if self.sqlite:
+            spans = dirty_ride_spans_sqlite(connect_to_sqlite(), _millis(since), user_id)
+            return {user: (from_epoch_millis(first), from_epoch_millis(last)) for user, first, last in spans}
+
+        match = {"timestamp": {"$ne": None}}
+        if since is not None:
+            match["$or"] = timestamp_query(since, field="booking_time") + timestamp_query(since, field="updated_at")
+        if user_id is not None:
+            match["user_id"] = user_id
+        # BSON doesn't order across types, so v1 (string) and v2 (datetime) timestamps are grouped apart
+        pipeline = [{"$match": match}, {"$group": {
+            "_id": {"user": "$user_id", "type": {"$type": "$timestamp"}},
+            "first": {"$min": "$timestamp"}, "last": {"$max": "$timestamp"}}}]
+
+        spans = {}
+        for group in self.manager.rides_collection.aggregate(pipeline):
+            try:
+                first, last = parse_timestamp(group["first"]), parse_timestamp(group["last"])
+            except ValueError:
+                continue   # Unreadable v1 text isn't bucketed anyway
+            user = group["_id"]["user"]
+            if user in spans:
+                first, last = min(first, spans[user][0]), max(last, spans[user][1])
+            spans[user] = (first, last)
+        return spans
+
+    def _rollup_user(self, user_id: str, first: datetime, last: datetime) -> int:
+        """Recompute every bucket of the days from `first` to `last` for one user. Returns hourly rows written."""
+        since, until = bucket_start(first, DAY), bucket_start(last, DAY) + DAY
+        rides = self.manager._find_rides(user_id, ROLLUP_FIELDS, since, until)
+        hourly = rollup_rows(map(decode_ride, rides), HOUR)
+        rows = {"hour": hourly, "day": coarsen(hourly, DAY)}
+
+        if self.sqlite:
+            with write_transaction(connect_to_sqlite()) as conn:
+                for name, (table, _) in RESOLUTIONS.items():
+                    replace_rollup_rows_sqlite(conn, table, user_id, _millis(since), _millis(until), (
+                        (_millis(start), pickup, *(counters[counter] for counter in ROLLUP_COUNTERS))
+                        for (start, pickup), counters in sorted(rows[name].items())))
+        else:
+            # Not atomic: a read racing the swap may briefly see the span empty
+            for name, collection in self.collections.items():
+                operations = [DeleteMany({"user_id": user_id, "start": {"$gte": since, "$lt": until}})]
+                operations += [InsertOne({"user_id": user_id, "start": start, "pickup": pickup, **counters})
+                               for (start, pickup), counters in sorted(rows[name].items())]
+                collection.bulk_write(operations, ordered=True)
+        return len(hourly)
+
+    def run(self, full: bool = False) -> dict:
+        """One pass over every user's rides changed since the watermark (`full`: every ride)."""
+        with self._lock:
+            start = time.perf_counter()
+            started_at = datetime.now()
+            watermark = None if full else self.load_watermark()
+            spans = self._dirty_spans(watermark)
+            rows = sum(self._rollup_user(user, first, last) for user, (first, last) in spans.items())
+            self.save_watermark(started_at - ROLLUP_LAG)
+
+        result = {"users": len(spans), "hourly_rows": rows, "seconds": time.perf_counter() - start,
+                  "since": watermark}
+        print(f"🧮 Rolled up {result['users']} user(s), {rows} hourly row(s) in {result['seconds']:.2f}s")
+        return result
+
+    def catch_up(self, user_id: str) -> int:
+        """Bring one user's buckets up to date before a read. Returns the users recomputed (0 or 1)."""
+        name = f"{WATERMARK_NAME}:{user_id}"
+        with self._lock:   # One swap at a time: two racing Mongo swaps would insert the same rows twice
+            started_at = datetime.now()
+            watermarks = [mark for mark in (self.load_watermark(), self.load_watermark(name)) if mark is not None]
+            spans = self._dirty_spans(max(watermarks) if watermarks else None, user_id)
+            if not spans:
+                return 0   # Nothing changed: a read stays a read, no watermark write
+            for user, (first, last) in spans.items():
+                self._rollup_user(user, first, last)
+            self.save_watermark(started_at - ROLLUP_LAG, name)
+        return len(spans)
+
+    # == Reads ==
+    def _read_rows(self, name: str, user_id: str, since: datetime = None, until: datetime = None,
+                   by_pickup: bool = True) -> dict[tuple[datetime, str], dict]:
+        """Stored rows; without `by_pickup` the store sums each bucket's pickups (pickup reads None)."""
+        table = RESOLUTIONS[name][0]
+        if self.sqlite:
+            found = iter_rollup_rows_sqlite(
+                connect_to_sqlite(), table, user_id, _millis(since), _millis(until), by_pickup)
+            return {(from_epoch_millis(start), pickup): dict(zip(ROLLUP_COUNTERS, counters))
+                    for start, pickup, *counters in found}
+
+        match = {"user_id": user_id}
+        bounds = {key: value for key, value in (("$gte", since), ("$lt", until)) if value is not None}
+        if bounds:
+            match["start"] = bounds
+        if by_pickup:
+            docs = self.collections[name].find(match, {"_id": False, "user_id": False}).sort("start", 1)
+            return {(doc.pop("start"), doc.pop("pickup")): doc for doc in docs}
+        docs = self.collections[name].aggregate([
+            {"$match": match},
+            {"$group": {"_id": "$start", **{counter: {"$sum": f"${counter}"} for counter in ROLLUP_COUNTERS}}},
+            {"$sort": {"_id": 1}}])
+        return {(doc.pop("_id"), None): doc for doc in docs}
+
+    def query(self, user_id: str, since: datetime = None, until: datetime = None,
+              resolution: str = "day", by_pickup: bool = False) -> dict:
+        """
+        A user's ride counters per `resolution` bucket for since <= timestamp < until.
+
+        Returns:
+            dict: resolution, source (the table read, or "rides") and buckets, oldest
+            first: {"start", ["pickup",] *ROLLUP_COUNTERS}
+        """
+        if resolution not in RESOLUTIONS:
+            raise ValueError(f"Unknown rollup resolution: {resolution!r}")
+        self.catch_up(user_id)
+
+        name = pick_resolution(since, until, resolution)
+        if name is None:
+            # A bound inside an hour: only the rides themselves can answer
+            rides = self.manager._find_rides(user_id, ROLLUP_FIELDS, since, until)
+            rows, source = rollup_rows(map(decode_ride, rides), HOUR), "rides"
+        else:
+            rows, source = self._read_rows(name, user_id, since, until, by_pickup), RESOLUTIONS[name][0]
+
+        buckets = []
+        for (start, pickup), counters in sorted(
+                coarsen(rows, RESOLUTIONS[resolution][1], by_pickup).items(), key=lambda item: item[0][0]):
+            buckets.append({"start": start, **({"pickup": pickup} if by_pickup else {}), **counters})
+        return {"resolution": resolution, "source": source, "buckets": buckets}
+
+
+# == Background job ==
+_job_thread: Optional[threading.Thread] = None
+_job_lock = threading.Lock()
+
+def start_rollup_job(interval: float = ROLLUP_INTERVAL, store: str = None):
+    """Run the incremental job on a daemon thread every `interval` seconds (once per process)."""
+    global _job_thread
+    with _job_lock:
+        if _job_thread is not None:
+            return
+        _job_thread = threading.Thread(target=_run_job, args=(interval, store), name="ride-rollups", daemon=True)
+    _job_thread.start()
+
+def _run_job(interval: float, store: Optional[str]):
+    from app.db.ride_data_manager import RideDataManager, RideStore   # Heavy; kept off the startup path
+    rollups = None
+    while True:
+        try:
+            rollups = rollups or RideDataManager(RideStore(store) if store else None).rollups
+            rollups.run()
+        except Exception as e:
+            print(f"⚠️ Ride rollup pass failed: {e}")
+        time.sleep(interval)
+
+
+# == Benchmark ==
+def benchmark(total_rides: int = 1_000_000, users: int = 1):
+    import random
+    import tempfile
+    from pathlib import Path
+    from app.db import sqlite as sqlite_db
+    from app.db.ride_data_manager import RideDataManager, RideStore
+    from app.db.ride_schema import RideStatus, encode_ride_sqlite
+    from app.db.sqlite import insert_ride_sqlite
+
+    sqlite_db.DB_PATH = Path(tempfile.mkdtemp()) / "rollup_benchmark.db"
+    manager = RideDataManager(RideStore.SQLITE)
+    rng = random.Random(5)
+    stops = [f"Stop {index}" for index in range(40)]
+    year = datetime(2025, 1, 1)
+
+    start = time.perf_counter()
+    with write_transaction(connect_to_sqlite()) as conn:
+        for index in range(total_rides):
+            moment = year + timedelta(seconds=rng.randrange(365 * 86400))
+            completed = index % 5 != 0
+            insert_ride_sqlite(conn, encode_ride_sqlite({
+                "user_id": f"user{index % users}", "timestamp": moment, "booking_time": moment,
+                "pickup": rng.choice(stops),
+                "status": RideStatus.COMPLETED if completed else RideStatus.REQUESTED,
+                **({"wait_time": rng.randint(1, 40), "duration": rng.randint(5, 60),
+                    "fare": rng.uniform(40, 400)} if completed else {})}))
+    print(f"Wrote {total_rides:,} rides in {time.perf_counter() - start:.1f}s")
+
+    manager.rollups.run(full=True)
+    user_id, since, until = "user0", year, year + timedelta(days=365)
+
+    start = time.perf_counter()
+    frame = manager.get_ride_frame(user_id, ("timestamp",), since=since, until=until)
+    raw_days, raw_counts = frame.daily_counts()
+    raw = time.perf_counter() - start
+
+    start = time.perf_counter()
+    rollup = manager.get_ride_rollup(user_id, since, until)
+    rolled = time.perf_counter() - start
+
+    days, counts = daily_ride_counts(rollup)
+    assert [str(day) for day in days] == [str(day) for day in raw_days]
+    assert counts == raw_counts.tolist()
+    print(f"Year of daily counts: {len(frame):,} rides {raw * 1000:.1f} ms | "
+          f"{len(rollup['buckets'])} {rollup['source']} rows {rolled * 1000:.1f} ms ({raw / rolled:.0f}x)")
+
+
+def main(argv: list[str] = None):
+    parser = argparse.ArgumentParser(description=f"Maintain {RIDES_HOURLY_TABLE} / {RIDES_DAILY_TABLE}.")
+    parser.add_argument("--store", choices=["mongo", "sqlite"], default=None)
+    parser.add_argument("--full", action="store_true", help="Recompute every bucket, ignoring the watermark")
+    parser.add_argument("--benchmark", type=int, metavar="RIDES", help="Benchmark on synthetic rides instead")
+    args = parser.parse_args(argv)
+
+    if args.benchmark:
+        benchmark(args.benchmark)
+        return
+
+    from app.db.ride_data_manager import RideDataManager, RideStore
+    manager = RideDataManager(RideStore(args.store) if args.store else None)
+    manager.rollups.run(full=args.full)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""
+Ride schema v2: typed timestamps, numeric metrics and a compact status code.
+
+Stored form
+- MongoDB: timestamps are BSON datetimes, status is a small int, metrics are
+  doubles, and every v2 document carries `schema_version: 2`.
+- SQLite: timestamps are INTEGER epoch milliseconds, status is an INTEGER.
+
+Timestamps are wall-clock times as recorded by the app (naive datetimes). SQLite
+millis count from 1970-01-01 in that same wall clock, so they round-trip exactly.
+
+Readers go through `decode_ride`, which accepts v1 (strftime strings, free-text
+status) and v2 rows alike, so both can coexist while `app.db.migrate_rides` runs.
+"""
+from datetime import datetime, timedelta
+from enum import IntEnum
+from typing import Optional, Union
+
+SCHEMA_VERSION = 2
+VERSION_FIELD = "schema_version"
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"   # v1 string timestamps
+TIMESTAMP_FIELDS = ("timestamp", "booking_time", "updated_at", "completed_at")
+NUMERIC_FIELDS = ("wait_time", "duration", "fare")
+INTEGER_FIELDS = ("driver_rating",)
+
+_EPOCH = datetime(1970, 1, 1)
+_MILLISECOND = timedelta(milliseconds=1)
+
+
+class RideStatus(IntEnum):
+    REQUESTED = 0
+    CONFIRMED = 1
+    IN_PROGRESS = 2
+    COMPLETED = 3
+    CANCELLED = 4
+
+    @property
+    def label(self) -> str:
+        return self.name.lower()
+
+    @classmethod
+    def parse(cls, value: Union["RideStatus", int, str]) -> "RideStatus":
+        """Accepts a code or a v1 label ("completed"); raises ValueError for anything else."""
+        if isinstance(value, str):
+            try:
+                return cls[value.strip().upper()]
+            except KeyError:
+                raise ValueError(f"Unknown ride status: {value!r}") from None
+        if isinstance(value, int) and not isinstance(value, bool):
+            return cls(value)
+        raise ValueError(f"Unknown ride status: {value!r}")
+
+
+# == Field conversions ==
+def to_epoch_millis(value: datetime) -> int:
+    return (value - _EPOCH) // _MILLISECOND
+
+def from_epoch_millis(millis: int) -> datetime:
+    return _EPOCH + millis * _MILLISECOND
+
+def parse_timestamp(value) -> Optional[datetime]:
+    """datetime (v2 Mongo), epoch millis (v2 SQLite) or strftime string (v1)."""
+    if value is None or isinstance(value, datetime):
+        return value
+    if isinstance(value, int) and not isinstance(value, bool):
+        return from_epoch_millis(value)
+    if isinstance(value, str):
+        return datetime.strptime(value, TIMESTAMP_FORMAT)
+    raise ValueError(f"Unsupported timestamp: {value!r}")
+
+def format_timestamp(value: Optional[datetime]) -> Optional[str]:
+    return value.strftime(TIMESTAMP_FORMAT) if value is not None else None
+
+def _number(field: str, value) -> Optional[float]:
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ValueError(f"{field} must be a number, got {value!r}")
+    return float(value)
+
+def _integer(field: str, value) -> Optional[int]:
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, int):
+        raise ValueError(f"{field} must be an integer, got {value!r}")
+    return value
+
+
+# == Writers (strict) ==
+def normalize_ride(fields: dict) -> dict:
+    """Full ride or partial update in its in-memory form. Raises ValueError on bad types."""
+    typed = dict(fields)
+    for field in TIMESTAMP_FIELDS:
+        if field in typed:
+            typed[field] = parse_timestamp(typed[field])
+    for field in NUMERIC_FIELDS:
+        if field in typed:
+            typed[field] = _number(field, typed[field])
+    for field in INTEGER_FIELDS:
+        if field in typed:
+            typed[field] = _integer(field, typed[field])
+    if "status" in typed:
+        typed["status"] = RideStatus.parse(typed["status"])
+    return typed
+
+def encode_ride_mongo(fields: dict, partial: bool = False) -> dict:
+    """
+    Full ride or partial update → v2 Mongo fields. Raises ValueError on bad types.
+
+    Only full rides are stamped v2: a partial update of a v1 document leaves its
+    other fields as they were, so it stays v1 until the migration rewrites it.
+    """
+    encoded = normalize_ride(fields)
+    if "status" in encoded:
+        encoded["status"] = int(encoded["status"])
+    if not partial:
+        encoded[VERSION_FIELD] = SCHEMA_VERSION
+    return encoded
+
+def encode_ride_sqlite(fields: dict) -> dict:
+    """Full ride or partial update → v2 SQLite column values. Raises ValueError on bad types."""
+    encoded = normalize_ride(fields)
+    for field in TIMESTAMP_FIELDS:
+        if encoded.get(field) is not None:
+            encoded[field] = to_epoch_millis(encoded[field])
+    if "status" in encoded:
+        encoded["status"] = int(encoded["status"])
+    return encoded
+
+
+# == Readers (lenient) ==
+def decode_ride(doc: Optional[dict]) -> Optional[dict]:
+    """
+    A stored ride (v1 or v2, either store) in its in-memory form: datetimes,
+    RideStatus and floats. A v1 status outside RideStatus is kept as its text.
+    """
+    if doc is None:
+        return None
+    ride = dict(doc)
+    ride.pop(VERSION_FIELD, None)
+    for field in TIMESTAMP_FIELDS:
+        if field in ride:
+            try:
+                ride[field] = parse_timestamp(ride[field])
+            except ValueError:
+                ride[field] = None   # Unreadable v1 text counts as not recorded
+    for field in NUMERIC_FIELDS:
+        value = ride.get(field)
+        if isinstance(value, int) and not isinstance(value, bool):
+            ride[field] = float(value)
+    if "status" in ride:
+        try:
+            ride["status"] = RideStatus.parse(ride["status"])
+        except ValueError:
+            pass
+    return ride
+
+def status_query(status: Union[RideStatus, int, str]) -> dict:
+    """Mongo filter matching a status in both v1 (label) and v2 (code) documents."""
+    status = RideStatus.parse(status)
+    return {"$in": [int(status), status.label]}
+
+def timestamp_query(since: Optional[datetime] = None, until: Optional[datetime] = None,
+                    field: str = "timestamp") -> list[dict]:
+    """
+    Mongo `$or` clauses for since <= field < until (any of TIMESTAMP_FIELDS) in both v2
+    (datetime) and v1 (string) documents. BSON compares within a type, and v1 strings sort by time.
+    """
+    clauses = []
+    for encode in (lambda value: value, format_timestamp):
+        bounds = {}
+        if since is not None:
+            bounds["$gte"] = encode(since)
+        if until is not None:
+            bounds["$lt"] = encode(until)
+        clauses.append({field: bounds})
+    return clauses
@@ -0,0 +1,160 @@
+"""
+Request-scoped ride snapshots, so one user action reads the user's rides at most once.
+
+A snapshot is one user's data at one `data_version` (bumped in the ride summary by
+every ride write and rebuild). Everything derived from it, including the ride frame
+and the statistics, is computed once and shared by every chart in the action. Snapshots
+are cached by (store, user_id, data_version): repeating an action with no new
+rides costs a summary read and no ride query at all.
+"""
+import threading
+from collections import OrderedDict
+from typing import Callable, Optional
+
+from app.db.ride_frame import RideFrame, FRAME_FIELDS
+
+
+class RideSnapshot:
+    def __init__(self, user_id: str, data_version: int, summary: dict,
+                 load_frame: Callable[[tuple[str, ...]], RideFrame]):
+        self.user_id = user_id
+        self.data_version = data_version
+        self.summary = summary
+        self._load_frame = load_frame
+        self._frame: Optional[RideFrame] = None
+        self._fields: tuple[str, ...] = ()
+        self._derived: dict = {}
+        self._lock = threading.RLock()
+
+    def frame(self, fields: tuple[str, ...] = FRAME_FIELDS) -> RideFrame:
+        """
+        The rides with at least `fields`. Fetched on first use; asking for a field
+        not loaded yet refetches once with the union of everything asked for so far.
+        """
+        with self._lock:
+            if self._frame is None or not set(fields) <= set(self._fields):
+                self._fields = tuple(dict.fromkeys(self._fields + tuple(fields)))
+                self._frame = self._load_frame(self._fields)
+            return self._frame
+
+    def derived(self, name: str, compute: Callable[["RideSnapshot"], object]):
+        """`compute(self)`, memoized under `name` for the life of the snapshot."""
+        with self._lock:
+            if name not in self._derived:
+                self._derived[name] = compute(self)
+            return self._derived[name]
+
+
+class SnapshotCache:
+    """
+    Thread-safe LRU of snapshots keyed by (store, user_id, data_version).
+
+    Also counts the ride queries and summary reads RideDataManager makes, which is
+    how an action is checked to have read its rides once.
+    """
+
+    def __init__(self, max_size: int = 32):
+        self.max_size = max_size
+        self._entries: OrderedDict[tuple, RideSnapshot] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.ride_queries = 0
+        self.summary_reads = 0
+        self._listeners: list[Callable[[str, str], None]] = []
+
+    def get_or_create(self, key: tuple, create: Callable[[], RideSnapshot]) -> RideSnapshot:
+        with self._lock:
+            snapshot = self._entries.get(key)
+            if snapshot is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return snapshot
+
+            self.misses += 1
+            # Older versions of this user's data can never be asked for again
+            for stale in [cached for cached in self._entries if cached[:2] == key[:2]]:
+                del self._entries[stale]
+            snapshot = self._entries[key] = create()
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            return snapshot
+
+    def invalidate(self, store: str, user_id: str):
+        """
+        A user's rides just changed in this process: drop their snapshots and tell every
+        listener (e.g. the chart cache), so nothing keeps serving the old version.
+        """
+        with self._lock:
+            for stale in [cached for cached in self._entries if cached[:2] == (store, user_id)]:
+                del self._entries[stale]
+            listeners = list(self._listeners)
+        for listener in listeners:
+            listener(store, user_id)
+
+    def add_invalidation_listener(self, listener: Callable[[str, str], None]):
+        """Call `listener(store, user_id)` whenever a user's rides are written in this process."""
+        with self._lock:
+            self._listeners.append(listener)
+
+    def count_ride_query(self):
+        with self._lock:
+            self.ride_queries += 1
+
+    def count_summary_read(self):
+        with self._lock:
+            self.summary_reads += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "ride_queries": self.ride_queries,
+                "summary_reads": self.summary_reads
+            }
+
+
+# Shared by every RideDataManager in the process
+snapshot_cache = SnapshotCache()
+
+
+def test():
+    cache = SnapshotCache(max_size=2)
+    loads = []
+
+    def load_frame(fields):
+        loads.append(fields)
+        cache.count_ride_query()
+        return RideFrame.from_records([{"timestamp": "2025-01-01 08:00:00", "pickup": "Mall"}], fields)
+
+    def open_snapshot(version):
+        return cache.get_or_create(
+            ("sqlite", "u", version), lambda: RideSnapshot("u", version, {}, load_frame))
+
+    # One action: four charts, one query for the union of their fields
+    snapshot = open_snapshot(1)
+    snapshot.frame(("timestamp", "pickup"))
+    for fields in (("timestamp",), ("pickup",), ("timestamp", "pickup")):
+        snapshot.frame(fields)
+    assert snapshot.derived("stats", lambda s: len(s.frame(("pickup",)))) == 1
+    assert cache.ride_queries == 1, cache.stats()
+
+    # Same version again: no query; new version: one query, and the old entry is dropped
+    open_snapshot(1).frame(("pickup",))
+    open_snapshot(2).frame(("pickup",))
+    assert cache.ride_queries == 2 and cache.stats()["size"] == 1, cache.stats()
+    print(f"✅ Snapshot cache: {cache.stats()}")
+
+if __name__ == "__main__":
+    test()
@@ -0,0 +1,445 @@
+"""
+Materialized per-user ride statistics.
+
+Every ride write folds its contribution into one `ride_stats` summary per user:
+counts, sums, extrema, a fixed-bucket wait-time histogram, pickup and hour-of-day counters,
+duration-vs-fare regression sums and t-digest sketches (app.db.sketches) for
+wait / duration / fare percentiles. Reading a user's statistics is then a single
+document lookup, however many rides they have.
+
+Functions here take rides in their decoded form (`app.db.ride_schema.decode_ride`).
+
+Summaries are only trusted once built from history. One that was started by an
+increment, or whose min/max may have gone stale, is flagged `needs_rebuild` and
+is rebuilt from that user's rides on the next read.
+
+Rebuild every summary from ride history (e.g. after importing rides):
+py -m app.db.ride_stats
+py -m app.db.ride_stats --store sqlite --user alice
+"""
+import argparse
+import time
+from datetime import datetime
+from typing import Iterable, Optional
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from app.db.sketches import TDigest, merge_digests
+from app.db.ride_schema import RideStatus, decode_ride, format_timestamp
+from app.db.sqlite import (
+    RIDES_TABLE, RIDE_STATS_TABLE, find_rides_sqlite, load_ride_stats_sqlite, save_ride_stats_sqlite)
+
+COMPLETED = RideStatus.COMPLETED
+NEEDS_REBUILD = "needs_rebuild"
+
+# Bumped by every ride write and rebuild, so (user_id, data_version) names one state
+# of a user's rides (see app.db.ride_snapshot)
+DATA_VERSION = "data_version"
+
+# Bumped whenever the summary layout changes; older summaries are rebuilt on read
+SUMMARY_VERSION = 3
+
+# Wait times are whole minutes, so 1-minute buckets keep the median exact.
+# Everything from WAIT_BUCKETS minutes up shares the last (overflow) bucket.
+WAIT_BUCKET_WIDTH = 1
+WAIT_BUCKETS = 120
+
+# Summary metric -> ride field, for the percentile sketches
+SKETCH_METRICS = {"wait": "wait_time", "duration": "duration", "fare": "fare"}
+
+# Mongo appends new values to `sketch_buffer` ($push commutes like $inc) and folds
+# them into `sketches` once a buffer reaches this length.
+SKETCH_BUFFER_LIMIT = 64
+
+# Ride fields a summary reads; enough of a ride's pre-image to compute its delta
+RIDE_FIELDS = ("timestamp", "status", "pickup", "wait_time", "duration", "fare")
+
+# Mongo field names may not contain "." or start with "$"
+_KEY_ESCAPES = (("%", "%25"), (".", "%2E"), ("$", "%24"))
+
+
+def encode_key(value: str) -> str:
+    for raw, escaped in _KEY_ESCAPES:
+        value = value.replace(raw, escaped)
+    return value
+
+def decode_key(value: str) -> str:
+    for raw, escaped in reversed(_KEY_ESCAPES):
+        value = value.replace(escaped, raw)
+    return value
+
+def _positive(value) -> bool:
+    # Same rule the statistics always used: only set, non-zero numbers count
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and value > 0
+
+def wait_bucket(wait_time: float) -> str:
+    return str(min(int(wait_time // WAIT_BUCKET_WIDTH), WAIT_BUCKETS))
+
+def histogram_median(histogram: dict) -> Optional[float]:
+    """The median wait, picked like sorted(waits)[len // 2] (exact unless it lands in the overflow bucket)."""
+    counts = sorted((int(bucket), count) for bucket, count in histogram.items())
+    index = sum(count for _, count in counts) // 2
+    for bucket, count in counts:
+        if index < count:
+            return bucket * WAIT_BUCKET_WIDTH
+        index -= count
+    return None
+
+
+# == Contributions ==
+def empty_summary() -> dict:
+    # Extrema (first/last, wait.min/max) stay absent until set: Mongo's $min treats
+    # null as smaller than any value, so a stored None would never be replaced.
+    return {
+        "total": 0,
+        "completed": 0,
+        "wait": {"count": 0, "sum": 0, "hist": {}},
+        "duration": {"count": 0, "sum": 0},
+        "fare": {"count": 0, "sum": 0},
+        "pickups": {},
+        "hours": {},
+        "fit": {"n": 0, "x": 0, "y": 0, "xx": 0, "xy": 0},
+        "sketches": {metric: TDigest().to_dict() for metric in SKETCH_METRICS},
+        "sketch_buffer": {metric: [] for metric in SKETCH_METRICS},
+        "sketch_version": 0,
+        "version": SUMMARY_VERSION,
+        DATA_VERSION: 0,
+        NEEDS_REBUILD: False
+    }
+
+def ride_counters(ride: Optional[dict]) -> dict:
+    """Additive contribution of one ride, as flat dotted paths into the summary."""
+    if not ride:
+        return {}
+
+    counters = {"total": 1}
+    if isinstance(ride.get("timestamp"), datetime):
+        counters[f"hours.{ride['timestamp'].hour}"] = 1   # Demand by hour of day, every request
+    if ride.get("status") != COMPLETED:
+        return counters
+
+    counters["completed"] = 1
+    counters[f"pickups.{encode_key(ride.get('pickup') or 'Unknown')}"] = 1
+
+    wait, duration, fare = ride.get("wait_time"), ride.get("duration"), ride.get("fare")
+    if _positive(wait):
+        counters["wait.count"] = 1
+        counters["wait.sum"] = wait
+        counters[f"wait.hist.{wait_bucket(wait)}"] = 1
+    if _positive(duration):
+        counters["duration.count"] = 1
+        counters["duration.sum"] = duration
+    if _positive(fare):
+        counters["fare.count"] = 1
+        counters["fare.sum"] = fare
+    if _positive(duration) and _positive(fare):
+        counters.update({
+            "fit.n": 1, "fit.x": duration, "fit.y": fare,
+            "fit.xx": duration * duration, "fit.xy": duration * fare
+        })
+    return counters
+
+def ride_extrema(ride: Optional[dict]) -> tuple[dict, dict]:
+    """(mins, maxs) one ride contributes, as flat dotted paths."""
+    if not ride or ride.get("status") != COMPLETED:
+        return {}, {}
+
+    mins, maxs = {}, {}
+    if ride.get("timestamp"):
+        # Stored as "YYYY-MM-DD HH:MM:SS", which sorts like the time itself
+        mins["first"] = maxs["last"] = format_timestamp(ride["timestamp"])
+    if _positive(ride.get("wait_time")):
+        mins["wait.min"] = maxs["wait.max"] = ride["wait_time"]
+    return mins, maxs
+
+def ride_sketch_values(ride: Optional[dict]) -> dict:
+    """Values one ride adds to the percentile sketches, by metric."""
+    if not ride or ride.get("status") != COMPLETED:
+        return {}
+    return {metric: ride[field] for metric, field in SKETCH_METRICS.items() if _positive(ride.get(field))}
+
+def ride_delta(before: Optional[dict], after: Optional[dict]) -> dict:
+    """
+    What changes in a summary when a ride goes from `before` to `after`.
+
+    Returns:
+        dict: inc (counter deltas), min / max (extrema to fold in), push (new sketch
+        values), and stale=True when an extremum or sketch value was withdrawn,
+        which neither min/max nor a sketch can undo
+    """
+    old, new = ride_counters(before), ride_counters(after)
+    inc = {}
+    for path in old.keys() | new.keys():
+        change = new.get(path, 0) - old.get(path, 0)
+        if change:
+            inc[path] = change
+
+    mins, maxs = ride_extrema(after)
+    withdrawn = ride_extrema(before)
+    old_values, new_values = ride_sketch_values(before), ride_sketch_values(after)
+    push = {metric: [value] for metric, value in new_values.items() if old_values.get(metric) != value}
+    stale = (any(withdrawn) and withdrawn != (mins, maxs)) or any(
+        new_values.get(metric) != value for metric, value in old_values.items())
+    return {"inc": inc, "min": mins, "max": maxs, "push": push, "stale": stale}
+
+def merge_deltas(deltas: Iterable[dict]) -> dict:
+    """Several ride_delta()s of one user as one, so a batch of ride writes costs one summary write."""
+    merged = {"inc": {}, "min": {}, "max": {}, "push": {}, "stale": False}
+    for delta in deltas:
+        for path, change in delta["inc"].items():
+            merged["inc"][path] = merged["inc"].get(path, 0) + change
+        for path, value in delta["min"].items():
+            merged["min"][path] = min(merged["min"].get(path, value), value)
+        for path, value in delta["max"].items():
+            merged["max"][path] = max(merged["max"].get(path, value), value)
+        for metric, values in delta["push"].items():
+            merged["push"].setdefault(metric, []).extend(values)
+        merged["stale"] = merged["stale"] or delta["stale"]
+    merged["inc"] = {path: change for path, change in merged["inc"].items() if change}
+    return merged
+
+
+# == Applying deltas ==
+def _walk(summary: dict, path: str) -> tuple[dict, str]:
+    *parents, leaf = path.split(".")
+    node = summary
+    for key in parents:
+        node = node.setdefault(key, {})
+    return node, leaf
+
+def apply_delta(summary: dict, delta: dict) -> dict:
+    """Fold a ride_delta() into a summary dict in place (SQLite and rebuilds)."""
+    for path, change in delta["inc"].items():
+        node, leaf = _walk(summary, path)
+        node[leaf] = (node.get(leaf) or 0) + change
+    for path, value in delta["min"].items():
+        node, leaf = _walk(summary, path)
+        node[leaf] = value if node.get(leaf) is None else min(node[leaf], value)
+    for path, value in delta["max"].items():
+        node, leaf = _walk(summary, path)
+        node[leaf] = value if node.get(leaf) is None else max(node[leaf], value)
+    if delta["push"]:
+        for metric, values in delta["push"].items():
+            sketches = summary.setdefault("sketches", {})
+            digest = TDigest.from_dict(sketches.get(metric))
+            digest.update(values)
+            sketches[metric] = digest.to_dict()
+    if delta["stale"]:
+        summary[NEEDS_REBUILD] = True
+    return summary
+
+def mongo_update(delta: dict) -> dict:
+    """
+    The same delta as one atomic update document.
+
+    $inc/$min/$max commute, so concurrent ride writes can apply their deltas in any
+    order. An upsert creates a partial summary, which is flagged for rebuild.
+    """
+    update = {
+        "$inc": {**delta["inc"], DATA_VERSION: 1},
+        "$min": delta["min"],
+        "$max": delta["max"],
+        "$push": {f"sketch_buffer.{metric}": {"$each": values} for metric, values in delta["push"].items()}
+    }
+    if delta["stale"]:
+        update["$set"] = {NEEDS_REBUILD: True}
+    else:
+        update["$setOnInsert"] = {NEEDS_REBUILD: True}
+    return {operator: fields for operator, fields in update.items() if fields}
+
+def summary_from_rides(rides: Iterable[dict]) -> dict:
+    summary = empty_summary()
+    digests = {metric: TDigest() for metric in SKETCH_METRICS}
+    for ride in rides:
+        delta = ride_delta(None, ride)
+        # Sketches stay live objects for the whole pass, serialized once at the end
+        for metric, values in delta.pop("push").items():
+            digests[metric].update(values)
+        apply_delta(summary, {**delta, "push": {}})
+    summary["sketches"] = {metric: digest.to_dict() for metric, digest in digests.items()}
+    return summary
+
+def is_trusted(summary: Optional[dict]) -> bool:
+    """False if the summary has to be rebuilt from ride history before it is read."""
+    return bool(summary) and not summary.get(NEEDS_REBUILD) and summary.get("version") == SUMMARY_VERSION
+
+def summary_digests(summary: dict, metrics: Iterable[str] = SKETCH_METRICS) -> dict[str, TDigest]:
+    """Each metric's sketch, including values still waiting in the Mongo buffer."""
+    digests = {}
+    buffers = summary.get("sketch_buffer") or {}
+    for metric in metrics:
+        digest = TDigest.from_dict((summary.get("sketches") or {}).get(metric))
+        digest.update(buffers.get(metric, []))
+        digests[metric] = digest
+    return digests
+
+
+# == Reading ==
+def _average(total, count):
+    return total / count if count else None
+
+def to_statistics_summary(summary: dict) -> dict:
+    """Reshape a stored summary into the fields RideDataManager reports."""
+    wait, duration, fare, fit = summary["wait"], summary["duration"], summary["fare"], summary["fit"]
+    percentiles = {metric: digest.percentiles() for metric, digest in summary_digests(summary).items()}
+
+    # Least-squares fare = slope * duration + intercept, from the running sums
+    slope = intercept = None
+    denominator = fit["n"] * fit["xx"] - fit["x"] ** 2
+    if fit["n"] >= 2 and denominator:
+        slope = (fit["n"] * fit["xy"] - fit["x"] * fit["y"]) / denominator
+        intercept = (fit["y"] - slope * fit["x"]) / fit["n"]
+
+    pickups = sorted(
+        ((decode_key(key), count) for key, count in summary["pickups"].items() if count > 0),
+        key=lambda item: (-item[1], item[0]))
+
+    return {
+        "total": summary["total"],
+        "completed": summary["completed"],
+        "first": summary.get("first"),
+        "last": summary.get("last"),
+        "wait": {
+            "avg": _average(wait["sum"], wait["count"]), "min": wait.get("min"), "max": wait.get("max"),
+            "count": wait["count"], "median": histogram_median(wait["hist"]),
+            "histogram": {int(bucket) * WAIT_BUCKET_WIDTH: count for bucket, count in wait["hist"].items()},
+            **percentiles["wait"]
+        },
+        "duration": {
+            "avg": _average(duration["sum"], duration["count"]), "count": duration["count"],
+            **percentiles["duration"]
+        },
+        "fare": {
+            "avg": _average(fare["sum"], fare["count"]), "sum": fare["sum"], "count": fare["count"],
+            **percentiles["fare"]
+        },
+        "pickups": pickups,
+        "hours": [summary.get("hours", {}).get(str(hour), 0) for hour in range(24)],
+        "fit": {"slope": slope, "intercept": intercept, "count": fit["n"]}
+    }
+
+
+# == Stores ==
+def apply_ride_delta_mongo(stats_collection, user_id: str, before: Optional[dict], after: Optional[dict]):
+    apply_delta_mongo(stats_collection, user_id, ride_delta(before, after))
+
+def apply_delta_mongo(stats_collection, user_id: str, delta: dict):
+    doc = stats_collection.find_one_and_update(
+        {"_id": user_id},
+        mongo_update(delta),
+        projection={"sketches": True, "sketch_buffer": True, "sketch_version": True},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    buffers = (doc or {}).get("sketch_buffer") or {}
+    if any(len(values) >= SKETCH_BUFFER_LIMIT for values in buffers.values()):
+        compact_sketches_mongo(stats_collection, user_id, doc)
+
+def compact_sketches_mongo(stats_collection, user_id: str, doc: dict) -> bool:
+    """
+    Fold the buffered values read in `doc` into the stored sketches.
+
+    Guarded by sketch_version, so two compactions never fold the same values twice;
+    values pushed after `doc` was read stay in the buffer.
+    """
+    digests = summary_digests(doc)
+    buffers = doc.get("sketch_buffer") or {}
+    changes = {"sketch_version": {"$add": [{"$ifNull": ["$sketch_version", 0]}, 1]}}
+    for metric, digest in digests.items():
+        consumed = len(buffers.get(metric, []))
+        changes[f"sketches.{metric}"] = {"$literal": digest.to_dict()}
+        changes[f"sketch_buffer.{metric}"] = {
+            "$slice": [{"$ifNull": [f"$sketch_buffer.{metric}", []]}, consumed, 2 ** 31 - 1]}
+
+    result = stats_collection.update_one(
+        {"_id": user_id, "sketch_version": doc.get("sketch_version")}, [{"$set": changes}])
+    return result.modified_count > 0
+
+def apply_ride_delta_sqlite(conn, user_id: str, before: Optional[dict], after: Optional[dict]):
+    """Must run inside the same write_transaction() as the ride write."""
+    apply_delta_sqlite(conn, user_id, ride_delta(before, after))
+
+def apply_delta_sqlite(conn, user_id: str, delta: dict):
+    """Must run inside the same write_transaction() as the ride writes."""
+    summary = load_ride_stats_sqlite(conn, user_id)
+    if summary is None:
+        summary = empty_summary()
+        summary[NEEDS_REBUILD] = True
+    summary[DATA_VERSION] = summary.get(DATA_VERSION, 0) + 1
+    save_ride_stats_sqlite(conn, user_id, apply_delta(summary, delta))
+
+def load_summary_mongo(stats_collection, user_id: str) -> Optional[dict]:
+    doc = stats_collection.find_one({"_id": user_id})
+    if doc is not None:
+        doc.pop("_id", None)
+        summary = empty_summary()
+        summary.update(doc)
+        return summary
+    return None
+
+def rebuild_user_mongo(rides_collection, stats_collection, user_id: str, attempts: int = 3) -> dict:
+    """
+    Recompute one user's summary from their rides.
+
+    It is written only if no ride write bumped data_version since the version was read, so a
+    racing $inc is never overwritten. After `attempts` lost races the stored summary is flagged
+    for rebuild instead, and returned as stored.
+    """
+    for _ in range(attempts):
+        current = stats_collection.find_one({"_id": user_id}, {DATA_VERSION: True})
+        version = (current or {}).get(DATA_VERSION)
+        rides = rides_collection.find({"user_id": user_id}, {"_id": False})
+        summary = summary_from_rides(decode_ride(ride) for ride in rides)
+        # Carry data_version forward, so no version is ever reused
+        summary[DATA_VERSION] = (version or 0) + 1
+        try:
+            if current is None:
+                stats_collection.insert_one({"_id": user_id, **summary})
+                return summary
+            # {data_version: None} also matches a summary that never had one
+            if stats_collection.replace_one({"_id": user_id, DATA_VERSION: version}, summary).matched_count:
+                return summary
+        except DuplicateKeyError:
+            pass   # A ride write created the summary since it was read
+    print(f"⚠️ Ride writes kept racing the stats rebuild for '{user_id}'; it will be rebuilt on the next read")
+    stats_collection.update_one({"_id": user_id}, {"$set": {NEEDS_REBUILD: True}}, upsert=True)
+    return load_summary_mongo(stats_collection, user_id)
+
+def rebuild_user_sqlite(conn, user_id: str) -> dict:
+    """Recompute one user's summary. Must run inside a write_transaction(), so no write can race it."""
+    previous = load_ride_stats_sqlite(conn, user_id) or {}
+    summary = summary_from_rides(decode_ride(ride) for ride in find_rides_sqlite(conn, user_id))
+    summary[DATA_VERSION] = previous.get(DATA_VERSION, 0) + 1
+    save_ride_stats_sqlite(conn, user_id, summary)
+    return summary
+
+def fleet_percentiles(summaries: Iterable[dict]) -> dict:
+    """Merge every user's sketches into fleet-wide p50/p90/p99 per metric."""
+    per_metric = {metric: [] for metric in SKETCH_METRICS}
+    for summary in summaries:
+        for metric, digest in summary_digests(summary).items():
+            per_metric[metric].append(digest)
+
+    fleet = {}
+    for metric, digests in per_metric.items():
+        merged = merge_digests(digests)
+        fleet[metric] = {"count": merged.count, **merged.percentiles()}
+    return fleet
+
+
+def main(argv: list[str] = None):
+    from app.db.ride_data_manager import RideDataManager, RideStore
+
+    parser = argparse.ArgumentParser(description=f"Rebuild {RIDE_STATS_TABLE} summaries from {RIDES_TABLE}.")
+    parser.add_argument("--store", choices=[store.value for store in RideStore], default=None)
+    parser.add_argument("--user", help="Only rebuild this user's summary")
+    args = parser.parse_args(argv)
+
+    manager = RideDataManager(RideStore(args.store) if args.store else None)
+    start = time.perf_counter()
+    rebuilt = manager.rebuild_ride_stats(args.user)
+    print(f"✅ Rebuilt {rebuilt} ride summary(ies) in {time.perf_counter() - start:.2f}s")
+
+if __name__ == "__main__":
+    main()
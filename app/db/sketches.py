@@ -0,0 +1,182 @@
+"""
+Mergeable quantile sketches (merging t-digest) for ride metrics.
+
+A digest keeps at most about `compression` centroids whatever the number of values,
+is exact at the extremes, and interpolates between neighbouring values, so p50 of an
+even count is the mean of the two middle values. Digests serialize to plain dicts
+(JSON / BSON) and merge, so per-user digests combine into fleet-wide percentiles.
+
+Run sketches.py to check accuracy against exact quantiles:
+py -m app.db.sketches
+"""
+import math
+from typing import Iterable, Optional
+
+DEFAULT_COMPRESSION = 100
+PERCENTILES = (0.5, 0.9, 0.99)
+
+
+class TDigest:
+    def __init__(self, compression: int = DEFAULT_COMPRESSION):
+        self.compression = compression
+        self.count = 0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+        self._centroids: list[list[float]] = []   # [mean, weight], sorted by mean
+        self._buffer: list[list[float]] = []
+
+    # == Updates ==
+    def add(self, value: float, weight: float = 1):
+        value = float(value)
+        self._buffer.append([value, weight])
+        self.count += weight
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        if len(self._buffer) >= 5 * self.compression:
+            self._compress()
+
+    def update(self, values: Iterable[float]):
+        for value in values:
+            self.add(value)
+
+    def merge(self, other: "TDigest") -> "TDigest":
+        """Fold `other` into this digest in place and return self."""
+        if not other.count:
+            return self
+        other._compress()
+        self._buffer.extend([mean, weight] for mean, weight in other._centroids)
+        self.count += other.count
+        self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = other.max if self.max is None else max(self.max, other.max)
+        self._compress()
+        return self
+
+    def _scale(self, q: float) -> float:
+        # k1 scale function: small centroids near the tails, large ones near the median
+        return self.compression / (2 * math.pi) * math.asin(2 * min(max(q, 0.0), 1.0) - 1)
+
+    def _compress(self):
+        if not self._buffer:
+            return
+        points = sorted(self._centroids + self._buffer)
+        self._buffer = []
+
+        merged = []
+        weight_before = 0
+        mean, weight = points[0]
+        k_left = self._scale(0)
+        for next_mean, next_weight in points[1:]:
+            if self._scale((weight_before + weight + next_weight) / self.count) - k_left <= 1:
+                weight += next_weight
+                mean += (next_mean - mean) * next_weight / weight
+            else:
+                merged.append([mean, weight])
+                weight_before += weight
+                k_left = self._scale(weight_before / self.count)
+                mean, weight = next_mean, next_weight
+        merged.append([mean, weight])
+        self._centroids = merged
+
+    # == Queries ==
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimated value at quantile `q` (0..1), or None if the digest is empty."""
+        self._compress()
+        if not self.count:
+            return None
+        centroids = self._centroids
+        if len(centroids) == 1:
+            return centroids[0][0]
+
+        index = q * self.count
+        first_mean, first_weight = centroids[0]
+        if index <= first_weight / 2:
+            return self.min + (first_mean - self.min) * index / (first_weight / 2)
+
+        last_mean, last_weight = centroids[-1]
+        if index >= self.count - last_weight / 2:
+            remaining = self.count - index
+            return self.max - (self.max - last_mean) * remaining / (last_weight / 2)
+
+        # Walk the centroid centres; interpolate between the two around `index`
+        centre = first_weight / 2
+        for (left_mean, left_weight), (right_mean, right_weight) in zip(centroids, centroids[1:]):
+            next_centre = centre + (left_weight + right_weight) / 2
+            if index <= next_centre:
+                fraction = (index - centre) / (next_centre - centre)
+                return left_mean + (right_mean - left_mean) * fraction
+            centre = next_centre
+        return self.max
+
+    def percentiles(self, quantiles: tuple[float, ...] = PERCENTILES) -> dict:
+        """e.g. {"p50": ..., "p90": ..., "p99": ...}"""
+        return {f"p{round(q * 100):g}": self.quantile(q) for q in quantiles}
+
+    # == Serialization ==
+    def to_dict(self) -> dict:
+        self._compress()
+        return {
+            "compression": self.compression,
+            "count": self.count,
+            "min": self.min,
+            "max": self.max,
+            "centroids": [list(centroid) for centroid in self._centroids]
+        }
+
+    @classmethod
+    def from_dict(cls, data: Optional[dict]) -> "TDigest":
+        if not data:
+            return cls()
+        digest = cls(data.get("compression", DEFAULT_COMPRESSION))
+        digest.count = data.get("count", 0)
+        digest.min = data.get("min")
+        digest.max = data.get("max")
+        digest._centroids = [list(centroid) for centroid in data.get("centroids", [])]
+        return digest
+
+
+def merge_digests(digests: Iterable[TDigest]) -> TDigest:
+    merged = TDigest()
+    for digest in digests:
+        merged.merge(digest)
+    return merged
+
+
+def _digest_of(values) -> TDigest:
+    digest = TDigest()
+    digest.update(values)
+    return digest
+
+def test():
+    import random
+    import time
+
+    def exact(values, q):
+        # Same interpolation rule as the digest: p50 of an even count is the middle mean
+        ordered = sorted(values)
+        index = q * len(ordered) - 0.5
+        lower = max(0, min(len(ordered) - 1, math.floor(index)))
+        upper = min(len(ordered) - 1, lower + 1)
+        return ordered[lower] + (ordered[upper] - ordered[lower]) * min(max(index - lower, 0), 1)
+
+    digest = TDigest()
+    digest.update([4, 1, 3, 2])
+    assert digest.quantile(0.5) == 2.5, digest.quantile(0.5)
+    print(f"Even-count median of [1, 2, 3, 4]: {digest.quantile(0.5)}")
+
+    random.seed(7)
+    shards = [[random.lognormvariate(2, 0.6) for _ in range(20_000)] for _ in range(5)]
+    values = [value for shard in shards for value in shard]
+
+    start = time.perf_counter()
+    # Round-trip every shard through its stored form, as the stats store does
+    merged = merge_digests(TDigest.from_dict(_digest_of(shard).to_dict()) for shard in shards)
+    elapsed = time.perf_counter() - start
+
+    print(f"{len(values):,} values → {len(merged.to_dict()['centroids'])} centroids in {elapsed:.2f}s")
+    for q in PERCENTILES:
+        estimate, truth = merged.quantile(q), exact(values, q)
+        print(f"p{q * 100:g}: sketch {estimate:.3f} vs exact {truth:.3f} ({abs(estimate - truth) / truth:.2%} off)")
+        assert abs(estimate - truth) / truth < 0.01
+
+if __name__ == "__main__":
+    test()
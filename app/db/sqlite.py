@@ -1,6 +1,13 @@
 import sqlite3
+import threading
+import weakref
+import json
+from contextlib import contextmanager
 from pathlib import Path
 from enum import Enum
+from typing import Iterable
+
+from app.db.ride_schema import RideStatus, TIMESTAMP_FIELDS
 
 class DBKey(Enum):
     USERNAME = "username"
@@ -14,45 +21,242 @@ class DBKey(Enum):
     
 
 TABLE_NAME = "accounts"
+REPLICA_TABLE = "accounts_replica"   # Mongo-mode read replica (see app.db.replica), never SQLite-mode accounts
+RIDES_TABLE = "rides"
+RIDE_STATS_TABLE = "ride_stats"
+RIDES_HOURLY_TABLE = "rides_hourly"
+RIDES_DAILY_TABLE = "rides_daily"
+ROLLUP_STATE_TABLE = "rollup_state"
 DB_NAME = "ATS_Data"
 DB_DIR = Path(__file__).parent / "data"
 DB_PATH = DB_DIR / f"{DB_NAME}.db"
 
-def connect_to_sqlite():
-    DB_DIR.mkdir(exist_ok=True)
-    conn = sqlite3.connect(DB_PATH)
+# Per-thread connection pool. sqlite3 connections may not be shared across
+# threads, so every thread gets (and keeps) its own connection to DB_PATH.
+# The pool only holds them weakly: a thread's connection is closed when the
+# thread exits and its thread-local goes away.
+_local = threading.local()
+_pool_lock = threading.Lock()
+_pool: "weakref.WeakSet[_PooledConnection]" = weakref.WeakSet()
+_pool_generation = 0
+_schema_ready = False
+
+# Size of sqlite3's per-connection prepared statement cache.
+STATEMENT_CACHE_SIZE = 128
+
+PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA busy_timeout = 5000",
+    "PRAGMA foreign_keys = ON",
+)
+
+def _accounts_schema(table: str) -> str:
+    return f"""
+    CREATE TABLE IF NOT EXISTS {table} (
+        {DBKey.USERNAME.value} TEXT PRIMARY KEY,
+        {DBKey.PASSWORD.value} TEXT NOT NULL,
+        {DBKey.OP.value} BOOL NOT NULL DEFAULT 0,
+        {DBKey.ADDRESS.value} TEXT NOT NULL DEFAULT "",
+        {DBKey.DATE_OF_BIRTH.value} TEXT NOT NULL DEFAULT "",
+        {DBKey.EMAIL.value} TEXT NOT NULL DEFAULT "",
+        {DBKey.FULL_NAME.value} TEXT NOT NULL DEFAULT "",
+        {DBKey.PHONE.value} TEXT NOT NULL DEFAULT ""
+    )
+"""
+
+SCHEMA = _accounts_schema(TABLE_NAME)
+REPLICA_SCHEMA = _accounts_schema(REPLICA_TABLE)
+
+# Ride fields with their own column; anything else (driver_id, vehicle_type, ...)
+# is kept as JSON in `extra`.
+RIDE_COLUMNS = (
+    "user_id", "timestamp", "pickup", "dropoff", "status", "booking_time",
+    "updated_at", "completed_at", "wait_time", "duration", "fare", "driver_rating"
+)
+
+# Schema v2 (see app.db.ride_schema): timestamps are INTEGER epoch millis and status
+# is a RideStatus code, so range filters and sorts compare plain integers.
+RIDES_SCHEMA = f"""
+    CREATE TABLE IF NOT EXISTS {RIDES_TABLE} (
+        _id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id TEXT NOT NULL,
+        timestamp INTEGER,
+        pickup TEXT,
+        dropoff TEXT,
+        status INTEGER NOT NULL DEFAULT 0,
+        booking_time INTEGER,
+        updated_at INTEGER,
+        completed_at INTEGER,
+        wait_time REAL,
+        duration REAL,
+        fare REAL,
+        driver_rating INTEGER,
+        extra TEXT NOT NULL DEFAULT '{{}}'
+    )
+"""
+
+def _v1_to_v2(column: str) -> str:
+    if column in TIMESTAMP_FIELDS:
+        # v1 strings are wall-clock "YYYY-MM-DD HH:MM:SS"; strftime('%s') reads them as UTC,
+        # which is exactly the wall-clock millis encoding v2 uses
+        return (f"CASE WHEN typeof({column}) = 'text' "
+                f"THEN CAST(strftime('%s', {column}) AS INTEGER) * 1000 ELSE {column} END")
+    if column == "status":
+        # Statuses outside RideStatus stay as text; readers pass them through
+        cases = " ".join(f"WHEN '{status.label}' THEN {status.value}" for status in RideStatus)
+        return f"CASE status {cases} ELSE status END"
+    return column
+
+RIDES_V1_UPGRADE = (
+    f"ALTER TABLE {RIDES_TABLE} RENAME TO {RIDES_TABLE}_v1",
+    RIDES_SCHEMA,
+    f"""INSERT INTO {RIDES_TABLE} (_id, {", ".join(RIDE_COLUMNS)}, extra)
+        SELECT _id, {", ".join(_v1_to_v2(column) for column in RIDE_COLUMNS)}, extra
+        FROM {RIDES_TABLE}_v1""",
+    f"DROP TABLE {RIDES_TABLE}_v1",   # Its indexes go with it; ensure_sqlite_indexes() recreates them
+)
+
+# One materialized summary per user, kept in step with its rides (see app.db.ride_stats)
+RIDE_STATS_SCHEMA = f"""
+    CREATE TABLE IF NOT EXISTS {RIDE_STATS_TABLE} (
+        user_id TEXT PRIMARY KEY,
+        summary TEXT NOT NULL
+    )
+"""
+
+# Ride rollups (see app.db.ride_rollups): counts and sums per user, pickup and hour / day,
+# `start` being the bucket's first moment in epoch millis. The primary key serves range reads.
+ROLLUP_COUNTERS = (
+    "rides", "completed", "wait_count", "wait_sum", "duration_count", "duration_sum", "fare_count", "fare_sum"
+)
+
+def _rollup_schema(table: str) -> str:
+    counters = ",\n        ".join(
+        f"{counter} {'REAL' if counter.endswith('_sum') else 'INTEGER'} NOT NULL DEFAULT 0"
+        for counter in ROLLUP_COUNTERS)
+    return f"""
+    CREATE TABLE IF NOT EXISTS {table} (
+        user_id TEXT NOT NULL,
+        start INTEGER NOT NULL,
+        pickup TEXT NOT NULL,
+        {counters},
+        PRIMARY KEY (user_id, start, pickup)
+    ) WITHOUT ROWID
+"""
+
+ROLLUP_SCHEMAS = (
+    _rollup_schema(RIDES_HOURLY_TABLE),
+    _rollup_schema(RIDES_DAILY_TABLE),
+    f"CREATE TABLE IF NOT EXISTS {ROLLUP_STATE_TABLE} (name TEXT PRIMARY KEY, watermark INTEGER NOT NULL)",
+)
+
+# Hot statements are kept as constants so the exact same SQL text is reused
+# and served from the connection's statement cache.
+SQL_FIND_USER = {
+    table: f"SELECT * FROM {table} WHERE {DBKey.USERNAME.value} = ?" for table in (TABLE_NAME, REPLICA_TABLE)
+}
+SQL_INSERT_USER = f"""
+    INSERT INTO {TABLE_NAME} ({DBKey.USERNAME.value}, {DBKey.PASSWORD.value}, {DBKey.OP.value}) VALUES (?, ?, ?)
+"""
+
+class _PooledConnection:
+    """One thread's connection. Closed by its owner, or when the owner exits and drops it."""
+
+    def __init__(self, conn: sqlite3.Connection, generation: int):
+        self.conn = conn
+        self.generation = generation
+        self.owner = threading.current_thread()
+        # Runs when the owner's thread-local is freed (thread exit), or at interpreter exit
+        self._finalizer = weakref.finalize(self, conn.close)
+
+    def close(self):
+        self._finalizer()   # Closes at most once
+
+def _open_connection() -> sqlite3.Connection:
+    # Each connection is only ever used by the thread that opened it; check_same_thread
+    # is relaxed because the finalizer closing it after its thread exits runs elsewhere.
+    conn = sqlite3.connect(DB_PATH, cached_statements=STATEMENT_CACHE_SIZE, check_same_thread=False)
     conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-    cursor.execute(f"""
-        CREATE TABLE IF NOT EXISTS {TABLE_NAME} (
-            {DBKey.USERNAME.value} TEXT PRIMARY KEY,
-            {DBKey.PASSWORD.value} TEXT NOT NULL,
-            {DBKey.OP.value} BOOL NOT NULL DEFAULT 0,
-            {DBKey.ADDRESS.value} TEXT NOT NULL DEFAULT "",
-            {DBKey.DATE_OF_BIRTH.value} TEXT NOT NULL DEFAULT "",
-            {DBKey.EMAIL.value} TEXT NOT NULL DEFAULT "",
-            {DBKey.FULL_NAME.value} TEXT NOT NULL DEFAULT "",
-            {DBKey.PHONE.value} TEXT NOT NULL DEFAULT ""
-        )
-    """)
-    conn.commit()
-    print(f"Connected to SQLite and {TABLE_NAME} table is ready.")
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
     return conn
 
-def find_user_sqlite(conn, username: str):
-    cursor = conn.cursor()
-    cursor.execute(f"SELECT * FROM {TABLE_NAME} WHERE {DBKey.USERNAME.value} = ?", (username,))
-    row = cursor.fetchone()
+def _ensure_schema(conn: sqlite3.Connection):
+    global _schema_ready
+    if _schema_ready:
+        return
+    with _pool_lock:
+        if _schema_ready:
+            return
+        conn.execute(SCHEMA)
+        conn.execute(REPLICA_SCHEMA)
+        conn.execute(RIDES_SCHEMA)
+        conn.execute(RIDE_STATS_SCHEMA)
+        for schema in ROLLUP_SCHEMAS:
+            conn.execute(schema)
+        conn.commit()
+        _upgrade_rides_table(conn)
+        _schema_ready = True
+        print(f"Connected to SQLite and {TABLE_NAME} table is ready.")
+
+def _upgrade_rides_table(conn: sqlite3.Connection):
+    """Rebuild a v1 rides table (TEXT timestamps / status) as v2 in one transaction."""
+    columns = {row["name"]: row["type"] for row in conn.execute(f"PRAGMA table_info({RIDES_TABLE})")}
+    if columns.get("timestamp") != "TEXT":
+        return
+    with write_transaction(conn):
+        for statement in RIDES_V1_UPGRADE:
+            conn.execute(statement)
+    print(f"⬆️ Upgraded the SQLite {RIDES_TABLE} table to ride schema v2.")
+
+def connect_to_sqlite() -> sqlite3.Connection:
+    """
+    Return this thread's pooled SQLite connection, opening it on first use.
+
+    The schema is created once per process, not once per call.
+    """
+    pooled = getattr(_local, "pooled", None)
+    if pooled is not None:
+        if pooled.generation == _pool_generation:
+            return pooled.conn
+        pooled.close()   # Retired by close_all_connections(); this thread owns it
+
+    DB_DIR.mkdir(exist_ok=True)
+    conn = _open_connection()
+    _ensure_schema(conn)
+
+    with _pool_lock:
+        pooled = _local.pooled = _PooledConnection(conn, _pool_generation)
+        _pool.add(pooled)
+    return conn
+
+def close_all_connections():
+    """
+    Retire every pooled connection (e.g. when switching away from SQLite).
+
+    Only the calling thread's connection is closed here. Another thread may be mid-query
+    on its own, so it closes that one itself on its next connect_to_sqlite() (or exits).
+    """
+    global _schema_ready, _pool_generation
+    with _pool_lock:
+        _pool_generation += 1  # Makes every thread reopen on next use
+        _schema_ready = False
+    pooled = getattr(_local, "pooled", None)
+    if pooled is not None:
+        pooled.close()
+        _local.pooled = None
+
+def find_user_sqlite(conn, username: str, table: str = TABLE_NAME):
+    row = conn.execute(SQL_FIND_USER[table], (username,)).fetchone()
     return dict(row) if row else None
 
 def insert_user_sqlite(conn, username: str, hashed_password: str, op: bool = False):
-    cursor = conn.cursor()
-    cursor.execute(f"""
-        INSERT INTO {TABLE_NAME} ({DBKey.USERNAME.value}, {DBKey.PASSWORD.value}, {DBKey.OP.value}) VALUES (?, ?, ?)
-    """, (username, hashed_password, int(op)))
+    conn.execute(SQL_INSERT_USER, (username, hashed_password, int(op)))
     conn.commit()
 
-def update_user_sqlite(conn, filter_query: dict, updated_fields: dict) -> bool:
+def update_user_sqlite(conn, filter_query: dict, updated_fields: dict, table: str = TABLE_NAME) -> bool:
     cursor = conn.cursor()
 
     # Generate WHERE clause
@@ -64,7 +268,7 @@ def update_user_sqlite(conn, filter_query: dict, updated_fields: dict) -> bool:
     set_values = list(updated_fields.values())
 
     query = f"""
-        UPDATE {TABLE_NAME}
+        UPDATE {table}
         SET {set_clause}
         WHERE {where_clause}
     """
@@ -96,6 +300,310 @@ def check_matching_document_sqlite(conn, filter_query: dict, value_checks: dict
 
     return True
 
+def update_user_if_changed_sqlite(conn, filter_query: dict, updated_fields: dict) -> dict:
+    """
+    Apply `updated_fields` only if at least one of them differs, in a single UPDATE.
+
+    Returns:
+        dict: {"matched": int, "modified": int}. A row that exists but already holds
+        every value reports matched=1, modified=0.
+    """
+    where_clause = " AND ".join([f"{key} = ?" for key in filter_query])
+    where_values = list(filter_query.values())
+
+    set_clause = ", ".join([f"{key} = ?" for key in updated_fields])
+    set_values = list(updated_fields.values())
+
+    # IS compares NULLs as equal, so an unchanged NULL column does not count as a change
+    unchanged_clause = " AND ".join([f"{key} IS ?" for key in updated_fields])
+
+    cursor = conn.execute(
+        f"UPDATE {TABLE_NAME} SET {set_clause} WHERE {where_clause} AND NOT ({unchanged_clause})",
+        set_values + where_values + set_values
+    )
+    conn.commit()
+
+    if cursor.rowcount > 0:
+        return {"matched": cursor.rowcount, "modified": cursor.rowcount}
+
+    # Nothing changed: a primary-key probe tells "no changes" apart from "no such user"
+    exists = conn.execute(f"SELECT 1 FROM {TABLE_NAME} WHERE {where_clause} LIMIT 1", where_values).fetchone()
+    return {"matched": 1 if exists else 0, "modified": 0}
+
+@contextmanager
+def write_transaction(conn):
+    """
+    Run a group of writes as one transaction, holding the write lock from the start.
+
+    BEGIN IMMEDIATE means a read-then-write (e.g. a ride and its stats row) cannot
+    interleave with another writer.
+    """
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.rollback()
+        raise
+    else:
+        conn.commit()
+
+def count_replica_users_sqlite(conn) -> int:
+    return conn.execute(f"SELECT COUNT(*) FROM {REPLICA_TABLE}").fetchone()[0]
+
+def prune_replica_sqlite(conn, live_usernames: Iterable[str]) -> int:
+    """Delete replica accounts whose username is not in `live_usernames`. Returns rows deleted."""
+    with write_transaction(conn):
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS live_usernames (username TEXT PRIMARY KEY)")
+        conn.execute("DELETE FROM live_usernames")
+        conn.executemany("INSERT OR IGNORE INTO live_usernames VALUES (?)", ((name,) for name in live_usernames))
+        deleted = conn.execute(
+            f"DELETE FROM {REPLICA_TABLE} WHERE {DBKey.USERNAME.value} NOT IN (SELECT username FROM live_usernames)"
+        ).rowcount
+        conn.execute("DELETE FROM live_usernames")
+    return deleted
+
+# == Rides ==
+# Ride writes don't commit: callers wrap them in write_transaction() so the ride
+# row and its ride_stats row are committed together.
+def _ride_row_to_dict(row) -> dict:
+    ride = {key: row[key] for key in row.keys() if key != "extra" and row[key] is not None}
+    ride.update(json.loads(row["extra"] or "{}"))
+    return ride
+
+def insert_ride_sqlite(conn, ride_data: dict) -> int:
+    columns = [key for key in RIDE_COLUMNS if key in ride_data]
+    extra = {key: value for key, value in ride_data.items() if key not in RIDE_COLUMNS}
+
+    cursor = conn.execute(
+        f"INSERT INTO {RIDES_TABLE} ({', '.join(columns + ['extra'])}) "
+        f"VALUES ({', '.join('?' for _ in range(len(columns) + 1))})",
+        [ride_data[key] for key in columns] + [json.dumps(extra, default=str)]
+    )
+    return cursor.lastrowid
+
+def find_ride_sqlite(conn, ride_id: int):
+    row = conn.execute(f"SELECT * FROM {RIDES_TABLE} WHERE _id = ?", (ride_id,)).fetchone()
+    return _ride_row_to_dict(row) if row else None
+
+def iter_ride_columns_sqlite(conn, user_id: str, columns: tuple[str, ...], since: int = None,
+                             until: int = None, status: int = None, batch_size: int = 500):
+    """
+    Lazily yield `columns` (RIDE_COLUMNS, "_id" or "extra") of a user's rides as plain tuples,
+    fetching `batch_size` rows at a time. `since` / `until` are epoch millis (until exclusive)
+    and `status` a RideStatus code, all filtered in SQL.
+    """
+    unknown = set(columns) - {"_id", "extra", *RIDE_COLUMNS}
+    if unknown:
+        raise ValueError(f"Not a {RIDES_TABLE} column: {', '.join(sorted(unknown))}")
+
+    where, values = ["user_id = ?"], [user_id]
+    for clause, value in (("timestamp >= ?", since), ("timestamp < ?", until), ("status = ?", status)):
+        if value is not None:
+            where.append(clause)
+            values.append(value)
+
+    cursor = conn.execute(
+        f"SELECT {', '.join(columns)} FROM {RIDES_TABLE} WHERE {' AND '.join(where)}", values)
+    while rows := cursor.fetchmany(batch_size):
+        yield from map(tuple, rows)
+
+def iter_rides_sqlite(conn, user_id: str, fields: tuple[str, ...] = None, **filters):
+    """
+    Lazily yield a user's rides as dicts, with only `fields` if given: columns are
+    selected in SQL and anything else is picked out of `extra`. `filters` are
+    iter_ride_columns_sqlite's since / until / status / batch_size.
+    """
+    if fields is None:
+        columns, extras = ("_id", *RIDE_COLUMNS), None
+    else:
+        columns = tuple(field for field in fields if field == "_id" or field in RIDE_COLUMNS)
+        extras = [field for field in fields if field not in columns]
+    with_extra = extras is None or bool(extras)
+
+    for row in iter_ride_columns_sqlite(conn, user_id, columns + ("extra",) * with_extra, **filters):
+        ride = {column: value for column, value in zip(columns, row) if value is not None}
+        if with_extra:
+            extra = json.loads(row[-1] or "{}")
+            ride.update(extra if extras is None else {key: extra[key] for key in extras if key in extra})
+        yield ride
+
+def find_rides_sqlite(conn, user_id: str) -> list[dict]:
+    return list(iter_rides_sqlite(conn, user_id))
+
+def _ride_update(updated_fields: dict) -> tuple[str, list]:
+    """(SET clause, values) of a partial ride update; fields without a column are patched into `extra`."""
+    columns = [key for key in updated_fields if key in RIDE_COLUMNS]
+    extra = {key: value for key, value in updated_fields.items() if key not in RIDE_COLUMNS}
+
+    set_clause = [f"{key} = ?" for key in columns]
+    values = [updated_fields[key] for key in columns]
+    if extra:
+        set_clause.append("extra = json_patch(extra, ?)")
+        values.append(json.dumps(extra, default=str))
+    return ", ".join(set_clause), values
+
+def update_ride_sqlite(conn, ride_id: int, updated_fields: dict) -> bool:
+    set_clause, values = _ride_update(updated_fields)
+    cursor = conn.execute(f"UPDATE {RIDES_TABLE} SET {set_clause} WHERE _id = ?", values + [ride_id])
+    return cursor.rowcount > 0
+
+def update_rides_sqlite(conn, updates: list[tuple[int, dict]]) -> int:
+    """
+    Apply (ride_id, updated_fields) pairs in order, with one executemany per run of the same
+    SET clause (a batch of status changes is a single statement). Returns the rows updated.
+    """
+    batches: list[tuple[str, list]] = []
+    for ride_id, updated_fields in updates:
+        set_clause, values = _ride_update(updated_fields)
+        # Only consecutive updates share a batch, so a ride listed twice gets its updates in order
+        if not batches or batches[-1][0] != set_clause:
+            batches.append((set_clause, []))
+        batches[-1][1].append(values + [ride_id])
+
+    updated = 0
+    for set_clause, rows in batches:
+        updated += conn.executemany(f"UPDATE {RIDES_TABLE} SET {set_clause} WHERE _id = ?", rows).rowcount
+    return updated
+
+def find_rides_by_id_sqlite(conn, ride_ids: list, batch_size: int = 500) -> dict:
+    """ride_id -> ride dict for every id that exists, `batch_size` ids per query."""
+    found = {}
+    for index in range(0, len(ride_ids), batch_size):
+        chunk = ride_ids[index:index + batch_size]
+        cursor = conn.execute(
+            f"SELECT * FROM {RIDES_TABLE} WHERE _id IN ({', '.join('?' for _ in chunk)})", chunk)
+        for row in cursor:
+            found[row["_id"]] = _ride_row_to_dict(row)
+    return found
+
+def distinct_ride_users_sqlite(conn) -> list[str]:
+    return [row[0] for row in conn.execute(f"SELECT DISTINCT user_id FROM {RIDES_TABLE}")]
+
+def load_ride_stats_sqlite(conn, user_id: str):
+    row = conn.execute(f"SELECT summary FROM {RIDE_STATS_TABLE} WHERE user_id = ?", (user_id,)).fetchone()
+    return json.loads(row["summary"]) if row else None
+
+def iter_ride_stats_sqlite(conn, first: str = None, before: str = None, fields: tuple[str, ...] = None):
+    """
+    Every summary, or only those of users first <= user_id < before (either bound optional).
+    With `fields` (dotted paths such as "wait.hist"), SQLite extracts just those and the
+    rest of each summary is never parsed in Python.
+    """
+    where, values = [], []
+    if first is not None:
+        where.append("user_id >= ?")
+        values.append(first)
+    if before is not None:
+        where.append("user_id < ?")
+        values.append(before)
+    clause = f" WHERE {' AND '.join(where)}" if where else ""
+
+    if fields is None:
+        for row in conn.execute(f"SELECT summary FROM {RIDE_STATS_TABLE}{clause}", values):
+            yield json.loads(row[0])
+        return
+
+    # One small JSON array per row, so Python parses a single short string per summary
+    extract = ", ".join("json_extract(summary, ?)" for _ in fields)
+    paths = [f"$.{field}" for field in fields]
+    cursor = conn.execute(f"SELECT json_array({extract}) FROM {RIDE_STATS_TABLE}{clause}", paths + values)
+    for (row,) in cursor:
+        summary = {}
+        for field, value in zip(fields, json.loads(row)):
+            *parents, leaf = field.split(".")
+            node = summary
+            for key in parents:
+                node = node.setdefault(key, {})
+            node[leaf] = value
+        yield summary
+
+def ride_stats_users_sqlite(conn) -> list[str]:
+    """Users with a summary, in key order (the PRIMARY KEY index already sorts them)."""
+    return [row[0] for row in conn.execute(f"SELECT user_id FROM {RIDE_STATS_TABLE} ORDER BY user_id")]
+
+def stale_ride_stats_users_sqlite(conn, version: int, flag: str) -> list[str]:
+    """Users whose summary is flagged with `flag` or was written by a summary version other than `version`."""
+    return [row[0] for row in conn.execute(
+        f"SELECT user_id FROM {RIDE_STATS_TABLE} "
+        f"WHERE json_extract(summary, ?) OR json_extract(summary, '$.version') IS NOT ?",
+        (f"$.{flag}", version))]
+
+def save_ride_stats_sqlite(conn, user_id: str, summary: dict):
+    conn.execute(
+        f"INSERT INTO {RIDE_STATS_TABLE} (user_id, summary) VALUES (?, ?) "
+        f"ON CONFLICT(user_id) DO UPDATE SET summary = excluded.summary",
+        (user_id, json.dumps(summary)))
+
+# == Rollups ==
+def dirty_ride_spans_sqlite(conn, since: int = None, user_id: str = None) -> list[tuple[str, int, int]]:
+    """
+    (user_id, first, last) ride timestamps, in epoch millis, of each user's rides booked
+    or updated at or after `since` (all rides when None), optionally for one user only.
+    """
+    if since is None:
+        where, values = ["timestamp IS NOT NULL"], []
+        if user_id is not None:
+            where.append("user_id = ?")
+            values.append(user_id)
+        changed, values = f"SELECT user_id, timestamp FROM {RIDES_TABLE} WHERE {' AND '.join(where)}", values
+    else:
+        # One indexed range per column; unary + keeps SQLite from trading them for the user_id index
+        user_clause = " AND +user_id = ?" if user_id is not None else ""
+        changed = " UNION ALL ".join(
+            f"SELECT user_id, timestamp FROM {RIDES_TABLE} WHERE {column} >= ?{user_clause}"
+            for column in ("booking_time", "updated_at"))
+        values = [since, user_id] * 2 if user_id is not None else [since] * 2
+
+    cursor = conn.execute(
+        f"SELECT user_id, MIN(timestamp), MAX(timestamp) FROM ({changed}) "
+        f"WHERE timestamp IS NOT NULL GROUP BY user_id", values)
+    return [tuple(row) for row in cursor]
+
+def replace_rollup_rows_sqlite(conn, table: str, user_id: str, since: int, until: int, rows):
+    """
+    Replace a user's rollup rows with since <= start < until by `rows`, tuples of
+    (start, pickup, *ROLLUP_COUNTERS). Must run inside a write_transaction().
+    """
+    conn.execute(f"DELETE FROM {table} WHERE user_id = ? AND start >= ? AND start < ?", (user_id, since, until))
+    conn.executemany(
+        f"INSERT INTO {table} (user_id, start, pickup, {', '.join(ROLLUP_COUNTERS)}) "
+        f"VALUES ({', '.join('?' for _ in range(len(ROLLUP_COUNTERS) + 3))})",
+        ((user_id, *row) for row in rows))
+
+def iter_rollup_rows_sqlite(conn, table: str, user_id: str, since: int = None, until: int = None,
+                            by_pickup: bool = True):
+    """
+    A user's rollup rows as (start, pickup, *ROLLUP_COUNTERS) tuples, oldest first.
+    Without `by_pickup`, each bucket's pickups are summed in SQL and pickup reads None.
+    """
+    where, values = ["user_id = ?"], [user_id]
+    for clause, value in (("start >= ?", since), ("start < ?", until)):
+        if value is not None:
+            where.append(clause)
+            values.append(value)
+
+    if by_pickup:
+        columns, group = f"pickup, {', '.join(ROLLUP_COUNTERS)}", ""
+    else:
+        columns, group = f"NULL, {', '.join(f'SUM({counter})' for counter in ROLLUP_COUNTERS)}", " GROUP BY start"
+    cursor = conn.execute(
+        f"SELECT start, {columns} FROM {table} WHERE {' AND '.join(where)}{group} ORDER BY start", values)
+    yield from map(tuple, cursor)
+
+def load_rollup_watermark_sqlite(conn, name: str):
+    row = conn.execute(f"SELECT watermark FROM {ROLLUP_STATE_TABLE} WHERE name = ?", (name,)).fetchone()
+    return row[0] if row else None
+
+def save_rollup_watermark_sqlite(conn, name: str, watermark: int = None):
+    """Store a rollup job's watermark (epoch millis); None forgets it, so the next run starts over."""
+    with conn:
+        if watermark is None:
+            conn.execute(f"DELETE FROM {ROLLUP_STATE_TABLE} WHERE name = ?", (name,))
+            return
+        conn.execute(
+            f"INSERT INTO {ROLLUP_STATE_TABLE} (name, watermark) VALUES (?, ?) "
+            f"ON CONFLICT(name) DO UPDATE SET watermark = excluded.watermark",
+            (name, watermark))
 
 
 """ Run sqlite.py to test database connection and table creation """
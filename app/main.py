@@ -12,6 +12,9 @@ from app.ui.components.containers import default_column
 from app.routing.route_handling import ROUTE_HANDLERS, handle_not_found, match_dynamic_route
 from app.routing.route_data import PageRoute
 from app.auth.user import is_authenticated
+from app.db.mongo import start_mongo_supervisor
+from app.routing.lazy_imports import preload_in_background
+from app.db.ride_rollups import start_rollup_job
 
 
 LOGIN_PAGE = PageRoute.LOGIN.value
@@ -139,14 +142,30 @@ async def run_splash_screen(page: ft.Page):
 
 
 async def main(page: ft.Page):
+    start_mongo_supervisor()  # Decrypt the URI and connect while the splash plays
     setup_audio()
     audio.on_ready(lambda: audio.play_random_bgm())
     apply_default_page_config(page)
     page.title = "ATraS (Accessible Transportation Scheduler)"
     await run_splash_screen(page)
+    preload_in_background()  # Analytics imports, so /dashboard/graphs opens warm
+    start_rollup_job()  # Keeps the chart rollups current, so reads rarely have to catch up
     
     # --- Continue with App Setup ---
 
+    async def run_async_route(handler, *args, **kwargs):
+        await handler(*args, **kwargs)
+        fade_in(page)
+
+    def run_route(handler, *args, **kwargs):
+        # Async handlers await their DB calls off the event loop, so they are
+        # scheduled as tasks and fade in once their content is rendered.
+        if asyncio.iscoroutinefunction(handler):
+            page.run_task(run_async_route, handler, *args, **kwargs)
+            return
+        handler(*args, **kwargs)
+        fade_in(page)
+
     def route_change(e: ft.RouteChangeEvent):
         page.controls.clear()
 
@@ -155,21 +174,22 @@ async def main(page: ft.Page):
             if route.auth_required and not is_authenticated(page):
                 page.go(LOGIN_PAGE)
                 return
-            route.handler(page, e)
+            run_route(route.handler, page, e)
         else:
             dynamic, params = match_dynamic_route(page.route)
             if dynamic:
                 if dynamic["auth_required"] and not is_authenticated(page):
                     page.go(LOGIN_PAGE)
                     return
-                dynamic["handler"](page, e, **params)
+                run_route(dynamic["handler"], page, e, **params)
             else:
                 handle_not_found(page, e)
-
-        fade_in(page)
+                fade_in(page)
 
 
     page.on_route_change = route_change
     page.go(page.route or LOGIN_PAGE)
 
-ft.app(target=main, assets_dir="app/assets")
+# Guarded: the chart and fleet worker pools spawn processes that re-import this script as __mp_main__
+if __name__ == "__main__":
+    ft.app(target=main, assets_dir="app/assets")
@@ -0,0 +1,128 @@
+"""
+Deferred imports for screens whose dependencies are slow to load.
+
+The analytics screen pulls in matplotlib, NumPy and the ride data stack, which is
+about 40-50% of the app's import time, and none of it is needed to show the splash or
+log in. Its route is registered with `lazy_handler`, so the module is imported on
+first navigation. `preload_in_background` imports it on a daemon thread once the
+splash is done, so that first navigation is usually already warm. Python's import
+lock makes a navigation that races the preload wait for it rather than import twice.
+
+Import-time report (`python -X importtime`, cold start vs eager imports):
+py -m app.routing.lazy_imports
+"""
+import argparse
+import importlib
+import re
+import subprocess
+import sys
+import threading
+import time
+from typing import Callable, Iterable
+
+# Imported only when their screen is first opened (or by preload_in_background)
+ANALYTICS_MODULES = ("app.ui.screens.viewgraphs",)
+
+# What the lazy screens pull in; the report checks they stay out of a cold start.
+# (NumPy is not listed: pygame imports it for surfarray when the audio manager loads.)
+HEAVY_MODULES = ("matplotlib", "matplotlib.pyplot", "PIL", "app.services.visualization_service",
+                 "app.db.ride_data_manager")
+
+_loaded: set[str] = set()   # Lazy modules already imported
+_preload_started = False
+_preload_lock = threading.Lock()
+
+
+def lazy_handler(module: str, name: str) -> Callable:
+    """A route handler that imports `module` on its first call, then calls `module.name`."""
+    def handler(*args, **kwargs):
+        start = time.perf_counter()
+        target = getattr(importlib.import_module(module), name)
+        if module not in _loaded:
+            _loaded.add(module)
+            print(f"📦 Loaded {module} on first use in {(time.perf_counter() - start) * 1000:.0f} ms")
+        return target(*args, **kwargs)
+
+    handler.__name__ = handler.__qualname__ = name
+    return handler
+
+def preload_in_background(modules: Iterable[str] = ANALYTICS_MODULES):
+    """Import `modules` on a daemon thread (once per process), off the event loop."""
+    global _preload_started
+    with _preload_lock:
+        if _preload_started:
+            return
+        _preload_started = True
+
+    def preload():
+        start = time.perf_counter()
+        for module in modules:
+            try:
+                importlib.import_module(module)
+                _loaded.add(module)
+            except Exception as e:
+                # The route will import it again and show the real error
+                print(f"⚠️ Could not preload {module}: {e}")
+        print(f"📦 Preloaded analytics in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    threading.Thread(target=preload, name="preload-analytics", daemon=True).start()
+
+
+# == Import-time report ==
+_IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+def measure_imports(statement: str) -> dict[str, int]:
+    """Cumulative microseconds per module, from `python -X importtime -c statement` in a fresh process."""
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", statement],
+                               capture_output=True, text=True)
+    if completed.returncode:
+        raise RuntimeError(completed.stderr.strip().splitlines()[-1])
+    cumulative = {}
+    for line in completed.stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if match:
+            cumulative[match.group(4)] = int(match.group(2))
+    return cumulative
+
+def top_level_total(cumulative: dict[str, int], modules: Iterable[str]) -> int:
+    # Each module's cumulative time covers only what the ones before it had not imported yet
+    return sum(cumulative.get(module, 0) for module in modules)
+
+def import_report(repeat: int = 5, entry: str = "app.routing.route_handling"):
+    """Cold-start import time of `entry` as it is now vs. with the lazy screens imported eagerly."""
+    cold_modules, eager_modules = (entry,), (entry, *ANALYTICS_MODULES)
+    cold, eager = f"import {', '.join(cold_modules)}", f"import {', '.join(eager_modules)}"
+    # Best of `repeat` fresh processes; the first also warms the OS file cache
+    cold_runs = [measure_imports(cold) for _ in range(repeat)]
+    eager_runs = [measure_imports(eager) for _ in range(repeat)]
+    best_cold = min(cold_runs, key=lambda run: top_level_total(run, cold_modules))
+    cold_us = top_level_total(best_cold, cold_modules)
+    eager_us = min(top_level_total(run, eager_modules) for run in eager_runs)
+
+    print(f"Cold start ({cold}): {cold_us / 1000:.0f} ms")
+    print(f"Eager analytics ({eager}): {eager_us / 1000:.0f} ms")
+    print(f"Deferred until /dashboard/graphs: {(eager_us - cold_us) / 1000:.0f} ms "
+          f"({(eager_us - cold_us) / eager_us:.0%} of startup imports)")
+
+    loaded = [module for module in HEAVY_MODULES if module in best_cold]
+    if loaded:
+        print(f"⚠️ Still imported at startup: {', '.join(loaded)}")
+    else:
+        print(f"✅ Not imported at startup: {', '.join(HEAVY_MODULES)}")
+
+    print("Slowest startup imports (cumulative):")
+    top = sorted(best_cold.items(), key=lambda item: -item[1])
+    shown = [(module, us) for module, us in top if module.count(".") == 0 or module.startswith("app.")][:12]
+    for module, us in shown:
+        print(f"  {us / 1000:8.1f} ms  {module}")
+
+
+def main(argv: list[str] = None):
+    parser = argparse.ArgumentParser(description="Report startup import time with and without lazy screens.")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--entry", default="app.routing.route_handling")
+    args = parser.parse_args(argv)
+    import_report(args.repeat, args.entry)
+
+if __name__ == "__main__":
+    main()
@@ -7,19 +7,27 @@ from app.ui.screens.retry_ui import check_mongo_connection
 from app.ui.screens.dashboard_ui import handle_dashboard
 from app.ui.screens.profile_ui import handle_profile
 from app.ui.screens.shared_ui import render_page
-from app.ui.screens.viewgraphs import handle_viewgraphs
 from app.ui.screens.booking import handle_booking
 from app.ui.screens.api_key_ui import handle_api_key_entry
 from app.ui.screens.operator_ui import handle_operator
 from app.ui.components.text import default_text, DefaultTextStyle
 from app.auth.user import is_authenticated
 from app.routing.route_data import RouteHandler, PageRoute
+from app.routing.lazy_imports import lazy_handler
+
+# matplotlib / NumPy / ride data stack: imported on first visit (or preloaded after the splash)
+handle_viewgraphs = lazy_handler("app.ui.screens.viewgraphs", "handle_viewgraphs")
 
 
 def handle_loading(page: ft.Page, _):
     def after_init():
         from app.db.db_manager import get_collection
+        from app.db.mongo import mongo_supervisor, PING_TIMEOUT_MS
         collection = get_collection()
+        if collection is None and mongo_supervisor.state == mongo_supervisor.CONNECTING:
+            # Still behind the splash's first probe: let the supervisor finish it
+            mongo_supervisor.wait_for_probe(timeout=PING_TIMEOUT_MS / 1000 + 1)
+            collection = get_collection()
 
         if collection is not None:
             print("Time to log in! - Chae.Debug")
@@ -0,0 +1,200 @@
+"""
+Content-addressed cache of rendered chart PNGs.
+
+A chart's PNG depends only on the chart type, one state of the user's rides (their
+`data_version`, see app.db.ride_snapshot), the theme, dpi and figure size, so a
+SHA-256 of exactly those names it. A cached PNG can never be stale: new rides mean
+a new data_version and so a new key.
+
+To make a repeat view a dictionary lookup, the cache also remembers each user's
+latest data_version for VERSION_TTL seconds instead of reading the summary per view.
+Ride writes in this process forget it at once (SnapshotCache.invalidate), and the
+TTL bounds how long a write from another device can go unseen.
+
+Entries live in a byte-bounded in-memory LRU and, when a directory is configured
+(CHART_CACHE_DIR), in an on-disk tier that survives restarts.
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+from app.config import Config
+from app.db.ride_snapshot import snapshot_cache
+
+VERSION_TTL = 30.0   # Seconds a remembered data_version is trusted without a summary read
+
+
+def _user_prefix(store: str, user_id: str) -> str:
+    # Disk entries start with it, so a user's files can be found without an index
+    return hashlib.sha256(f"{store}\0{user_id}".encode()).hexdigest()[:16]
+
+def chart_key(chart_type: str, store: str, user_id: str, data_version: int, theme: str, dpi: int,
+              size: tuple) -> str:
+    """The content address of one rendered chart."""
+    parts = (chart_type, store, user_id, data_version, theme, dpi, *size)
+    digest = hashlib.sha256("\0".join(map(str, parts)).encode()).hexdigest()
+    return f"{_user_prefix(store, user_id)}-{digest}"
+
+
+class ChartCache:
+    """Thread-safe LRU of chart PNGs, at most `max_bytes` in memory, optionally backed by `disk_dir`."""
+
+    def __init__(self, max_bytes: int = Config.CHART_CACHE_MB * 2 ** 20, disk_dir: Optional[Path] = None,
+                 max_disk_bytes: int = Config.CHART_CACHE_DISK_MB * 2 ** 20, version_ttl: float = VERSION_TTL):
+        self.max_bytes = max_bytes
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self.max_disk_bytes = max_disk_bytes
+        self.version_ttl = version_ttl
+        self._entries: OrderedDict[str, bytes] = OrderedDict()
+        self._bytes = 0
+        self._versions: dict[tuple[str, str], tuple[int, float]] = {}   # (store, user) -> (version, seen at)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if self.disk_dir:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+
+    # == Versions ==
+    def known_version(self, store: str, user_id: str) -> Optional[int]:
+        """The user's data_version as last seen, if that was under version_ttl seconds ago."""
+        with self._lock:
+            version, seen_at = self._versions.get((store, user_id), (None, 0.0))
+            return version if time.monotonic() - seen_at <= self.version_ttl else None
+
+    def remember_version(self, store: str, user_id: str, data_version: int):
+        with self._lock:
+            self._versions[(store, user_id)] = (data_version, time.monotonic())
+
+    def forget_version(self, store: str, user_id: str):
+        """Read the user's data_version again on their next view (their PNGs stay valid for it)."""
+        with self._lock:
+            self._versions.pop((store, user_id), None)
+
+    # == Entries ==
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            png = self._entries.get(key)
+            if png is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return png
+
+        png = self._read_disk(key)
+        with self._lock:
+            if png is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._store(key, png)
+            return png
+
+    def put(self, key: str, png: bytes):
+        with self._lock:
+            self._store(key, png)
+        self._write_disk(key, png)
+
+    def _store(self, key: str, png: bytes):
+        # Caller holds the lock
+        if key in self._entries:
+            self._bytes -= len(self._entries.pop(key))
+        self._entries[key] = png
+        self._bytes += len(png)
+        while self._bytes > self.max_bytes and len(self._entries) > 1:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= len(evicted)
+            self.evictions += 1
+
+    def invalidate_user(self, store: str, user_id: str):
+        """Forget the user's version and drop their PNGs; they were for older data_versions."""
+        prefix = _user_prefix(store, user_id)
+        with self._lock:
+            self._versions.pop((store, user_id), None)
+            for key in [key for key in self._entries if key.startswith(prefix)]:
+                self._bytes -= len(self._entries.pop(key))
+        if self.disk_dir:
+            for path in self.disk_dir.glob(f"{prefix}-*.png"):
+                path.unlink(missing_ok=True)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._versions.clear()
+            self._bytes = 0
+
+    # == Disk tier ==
+    def _read_disk(self, key: str) -> Optional[bytes]:
+        if not self.disk_dir:
+            return None
+        try:
+            return (self.disk_dir / f"{key}.png").read_bytes()
+        except OSError:
+            return None
+
+    def _write_disk(self, key: str, png: bytes):
+        if not self.disk_dir:
+            return
+        try:
+            # Written aside then renamed, so a reader never sees half a PNG
+            temporary = self.disk_dir / f"{key}.{threading.get_ident()}.tmp"
+            temporary.write_bytes(png)
+            os.replace(temporary, self.disk_dir / f"{key}.png")
+            self._prune_disk()
+        except OSError as e:
+            print(f"⚠️ Could not write chart cache entry: {e}")
+
+    def _prune_disk(self):
+        files = sorted(self.disk_dir.glob("*.png"), key=lambda path: path.stat().st_mtime)
+        total = sum(path.stat().st_size for path in files)
+        for path in files:
+            if total <= self.max_disk_bytes:
+                break
+            total -= path.stat().st_size
+            path.unlink(missing_ok=True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0
+            }
+
+
+# Shared by every RideVisualizationService in the process
+chart_cache = ChartCache(disk_dir=Config.CHART_CACHE_DIR)
+snapshot_cache.add_invalidation_listener(chart_cache.invalidate_user)
+
+
+def test():
+    import tempfile
+
+    cache = ChartCache(max_bytes=10, disk_dir=Path(tempfile.mkdtemp()))
+    key = chart_key("frequency", "sqlite", "alice", 3, "light", 150, (12, 6))
+    assert key == chart_key("frequency", "sqlite", "alice", 3, "light", 150, (12, 6))
+    assert key != chart_key("frequency", "sqlite", "alice", 4, "light", 150, (12, 6))
+
+    cache.put(key, b"png-bytes")
+    assert cache.get(key) == b"png-bytes"
+    cache.put(chart_key("coverage", "sqlite", "bob", 1, "light", 150, (12, 8)), b"other-png")
+    cache.clear()   # Memory only; the disk tier still has both
+    assert cache.get(key) == b"png-bytes" and cache.stats()["disk_hits"] == 1
+
+    cache.remember_version("sqlite", "alice", 3)
+    assert cache.known_version("sqlite", "alice") == 3
+    cache.invalidate_user("sqlite", "alice")
+    assert cache.known_version("sqlite", "alice") is None and cache.get(key) is None
+    print(f"✅ Chart cache: {cache.stats()}")
+
+if __name__ == "__main__":
+    test()
@@ -0,0 +1,223 @@
+"""
+Chart rendering off the UI thread.
+
+Matplotlib is drawn in a small pool of worker processes on the Agg backend, so a
+dashboard render neither blocks the Flet event loop nor holds the GIL the UI needs.
+Workers get only what a chart is drawn from (a RideFrame and/or the daily counts)
+and send back the chart's result dict plus its PNG bytes.
+
+`ChartRenderer.render()` is awaitable. Concurrent renders of the same chart share one
+job: the second caller awaits the first caller's result instead of drawing it again.
+
+Benchmark (event loop stalls while charts render, on a throwaway SQLite database):
+py -m app.services.chart_renderer --benchmark 2000
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Hashable, Optional
+
+RENDER_WORKERS = min(2, os.cpu_count() or 1)
+
+# Workers are spawned, not forked: the app process runs Mongo and replication threads
+MP_CONTEXT = "spawn"
+
+# Chart type -> component class in app.ui.components.visualization_components
+CHART_COMPONENTS = {
+    "frequency": "RideFrequencyChart",
+    "wait_time": "WaitTimeDistributionChart",
+    "coverage": "ServiceCoverageChart",
+    "dashboard": "ComprehensiveDashboard"
+}
+
+
+# == Worker side ==
+_components = {}   # One instance per chart type, per worker
+
+def _init_worker():
+    import matplotlib
+    matplotlib.use("Agg")
+    import app.ui.components.visualization_components   # Import cost paid at start-up, not on first chart
+
+def draw_chart(chart_type: str, rides, daily, user_id: str, dpi: int) -> tuple[dict, bytes]:
+    """Draw one chart and return (its result dict, PNG bytes); b"" if the chart reported an error."""
+    from app.ui.components import visualization_components
+
+    chart = _components.get(chart_type)
+    if chart is None:
+        chart = _components[chart_type] = getattr(visualization_components, CHART_COMPONENTS[chart_type])()
+    try:
+        result = chart.render(rides, user_id, daily)
+        return result, b"" if "error" in result else chart.get_chart_bytes(dpi)
+    finally:
+        chart.close_plot()
+
+
+# == Caller side ==
+class ChartRenderer:
+    """Awaitable chart renders on a process pool, with identical in-flight renders coalesced."""
+
+    def __init__(self, workers: int = RENDER_WORKERS):
+        self.workers = workers
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._jobs = ThreadPoolExecutor(max_workers=workers * 2, thread_name_prefix="chart-render")
+        self._in_flight: dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+        self.renders = 0
+        self.coalesced = 0
+
+    def _process_pool(self) -> ProcessPoolExecutor:
+        # Kept alive between renders, so only the first one pays for starting workers
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context(MP_CONTEXT),
+                                                 initializer=_init_worker)
+            return self._pool
+
+    def warm_up(self):
+        """Start the workers now (e.g. when the analytics screen opens), without waiting for them."""
+        pool = self._process_pool()
+        for _ in range(self.workers):
+            pool.submit(int)
+
+    def draw(self, chart_type: str, rides, daily, user_id: str, dpi: int = 150) -> tuple[dict, bytes]:
+        """Blocking: draw one chart in a worker process and return (result, PNG bytes)."""
+        with self._lock:
+            self.renders += 1
+        try:
+            return self._process_pool().submit(draw_chart, chart_type, rides, daily, user_id, dpi).result()
+        except BrokenProcessPool:
+            # A worker died (e.g. out of memory); start a fresh pool for the next render
+            with self._lock:
+                self._pool = None
+            print("⚠️ Chart worker crashed; restarting the render pool")
+            raise
+
+    def submit(self, key: Hashable, job: Callable[[], dict]) -> Future:
+        """Run `job` on a render thread, or join the one already running for `key`."""
+        with self._lock:
+            future = self._in_flight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future
+            future = self._in_flight[key] = self._jobs.submit(job)
+        future.add_done_callback(lambda _: self._forget(key, future))
+        return future
+
+    def _forget(self, key: Hashable, future: Future):
+        with self._lock:
+            if self._in_flight.get(key) is future:
+                del self._in_flight[key]
+
+    async def render(self, key: Hashable, job: Callable[[], dict]) -> dict:
+        """Await `job` (typically reading the rides, then `draw`), shared with concurrent callers of `key`."""
+        return await asyncio.wrap_future(self.submit(key, job))
+
+    def shutdown(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"renders": self.renders, "coalesced": self.coalesced, "in_flight": len(self._in_flight)}
+
+
+# Shared by every RideVisualizationService in the process
+chart_renderer = ChartRenderer()
+
+
+# == Benchmark ==
+async def _worst_stall(work, tick: float = 0.005) -> tuple[float, object]:
+    """Await `work` while a ticker measures the longest the event loop went without running it."""
+    worst, done = 0.0, False
+
+    async def ticker():
+        nonlocal worst
+        while not done:
+            before = time.perf_counter()
+            await asyncio.sleep(tick)
+            worst = max(worst, time.perf_counter() - before - tick)
+
+    ticker_task = asyncio.create_task(ticker())
+    try:
+        result = await work
+    finally:
+        done = True
+        await ticker_task
+    return worst, result
+
+def benchmark(rides: int = 2000, user_id: str = "render_benchmark"):
+    import contextlib
+    import io
+    import random
+    import tempfile
+    from datetime import datetime, timedelta
+    from pathlib import Path
+    from app.db import sqlite as sqlite_db
+    from app.db.ride_data_manager import RideDataManager, RideStore
+    from app.db.ride_schema import RideStatus
+    from app.services.chart_cache import chart_cache
+    from app.services.visualization_service import RideVisualizationService
+
+    sqlite_db.DB_PATH = Path(tempfile.mkdtemp()) / "render_benchmark.db"
+    os.environ["RIDE_STORE"] = RideStore.SQLITE.value
+    manager = RideDataManager(RideStore.SQLITE)
+    rng = random.Random(5)
+    start = datetime.now() - timedelta(days=120)
+    with contextlib.redirect_stdout(io.StringIO()):   # One line per booking otherwise
+        for _ in range(rides):
+            manager.save_ride_booking(
+                user_id, f"Stop {rng.randrange(25)}", f"Stop {rng.randrange(25)}",
+                wait_time=rng.randint(1, 30), duration=rng.randint(5, 60), fare=round(rng.uniform(40, 400), 2),
+                timestamp=start + timedelta(minutes=rng.randrange(120 * 24 * 60)), status=RideStatus.COMPLETED)
+    manager.rollups.run(full=True)
+
+    service = RideVisualizationService()
+    service.data_manager = manager
+    renderer = service_renderer()
+
+    async def run():
+        renderer.warm_up()
+        for chart_type in list(CHART_COMPONENTS) * 2:   # The first round also starts the workers
+            chart_cache.invalidate_user(manager.store.value, user_id)
+            begin = time.perf_counter()
+            stall, result = await _worst_stall(service.render_chart_png(chart_type, user_id))
+            print(f"{chart_type:>10}: {(time.perf_counter() - begin) * 1000:7.1f} ms, "
+                  f"{len(result.get('png', b'')):,} bytes, worst loop stall {stall * 1000:.1f} ms")
+
+        chart_cache.invalidate_user(manager.store.value, user_id)
+        results = await asyncio.gather(*(service.render_chart_png("dashboard", user_id) for _ in range(5)))
+        assert len({result["png"] for result in results}) == 1
+        print(f"5 concurrent dashboard requests: {renderer.stats()}")
+
+        # The same dashboard drawn in this process on a thread, as the old handlers did on theirs
+        data = service.prepare_chart("dashboard", user_id)
+        begin = time.perf_counter()
+        stall, _ = await _worst_stall(asyncio.to_thread(draw_chart, "dashboard", data["rides"], data["daily"], user_id, 150))
+        print(f" in-process dashboard: {(time.perf_counter() - begin) * 1000:7.1f} ms, "
+              f"worst loop stall {stall * 1000:.1f} ms")
+
+    asyncio.run(run())
+    renderer.shutdown()
+
+def service_renderer() -> ChartRenderer:
+    # The instance the service uses; run as a script, this module is also loaded as __main__
+    from app.services.chart_renderer import chart_renderer as renderer
+    return renderer
+
+
+def main(argv: list[str] = None):
+    parser = argparse.ArgumentParser(description="Render charts in worker processes.")
+    parser.add_argument("--benchmark", type=int, metavar="RIDES", default=2000)
+    args = parser.parse_args(argv)
+    benchmark(args.benchmark)
+
+if __name__ == "__main__":
+    main()
@@ -78,8 +78,10 @@ class RideBookingIntegration:
     def get_user_ride_summary(self, user_id: str) -> Dict:
         """Get a quick summary of user's ride data for dashboard display"""
         try:
-            availability = self.data_manager.check_real_data_availability(user_id)
-            stats = self.data_manager.get_ride_statistics(user_id)
+            # Both answered from one summary read, without touching the rides
+            snapshot = self.data_manager.snapshot(user_id)
+            availability = self.data_manager.check_real_data_availability(user_id, snapshot)
+            stats = self.data_manager.get_ride_statistics(user_id, snapshot)
             
             if "error" in stats:
                 return {
@@ -1,10 +1,16 @@
 """
 Integration example showing how the API key configuration works with FastAPI
-Run this to test the integration between the Flet app and the API backend
+Run this to test the integration between the Flet app and the API backend,
+and that slow database calls don't stall the Flet event loop
 """
+import asyncio
+import time
 import requests
 import json
+from typing import Callable
 from app.services.api_config import save_api_key, load_api_key, is_api_configured
+from app.db.sqlite import DBKey
+from app.utils import run_blocking
 
 def test_api_integration():
     print("🔧 Testing API Key Integration")
@@ -43,5 +49,36 @@ def test_api_integration():
     print("3. Test routes like /route with origin and destination")
     print("4. The FastAPI will automatically use the configured key")
 
+def test_db_loop_latency(db_delay: float = 0.5, tick: float = 0.01, lookup: Callable = None) -> float:
+    """Check a slow DB call run through run_blocking leaves the event loop ticking."""
+    def slow_find_user(username):
+        time.sleep(db_delay)
+        return {DBKey.USERNAME.value: username}
+    lookup = lookup or slow_find_user
+
+    async def measure():
+        lags = []
+        async def ticker():
+            while True:
+                start = time.perf_counter()
+                await asyncio.sleep(tick)
+                lags.append(time.perf_counter() - start - tick)
+        ticker_task = asyncio.create_task(ticker())
+        try:
+            user = await run_blocking(lookup, "latency_test")
+        finally:
+            ticker_task.cancel()
+        return user, lags
+
+    print("⏱️ Testing event loop latency during a DB call")
+    user, lags = asyncio.run(measure())
+    worst = max(lags) if lags else 0.0
+    print(f"Slow call ({db_delay * 1000:.0f} ms) returned {user}")
+    print(f"Ticker ran {len(lags)} times, worst lag {worst * 1000:.1f} ms")
+    assert worst < db_delay / 2, "Event loop was blocked during the DB call"
+    print("✅ Event loop stayed responsive!")
+    return worst
+
 if __name__ == "__main__":
     test_api_integration()
+    test_db_loop_latency()
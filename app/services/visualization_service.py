@@ -1,6 +1,11 @@
 
-from typing import Dict, List, Optional
+from typing import Dict, Optional
+from app.config import Config
 from app.db.ride_data_manager import RideDataManager
+from app.db.ride_snapshot import RideSnapshot, snapshot_cache
+from app.db.ride_rollups import daily_ride_counts
+from app.services.chart_cache import chart_cache, chart_key
+from app.services.chart_renderer import chart_renderer
 from app.ui.components.visualization_components import (
     RideFrequencyChart,
     WaitTimeDistributionChart, 
@@ -8,6 +13,18 @@ from app.ui.components.visualization_components import (
     ComprehensiveDashboard
 )
 
+# Errors for charts drawn from the rides themselves, by chart type
+NO_COMPLETED_RIDES = {
+    "wait_time": "No completed rides yet. Start booking and completing rides to see your wait time patterns!",
+    "coverage": "No completed rides yet. Start booking and completing rides to see your service coverage!",
+    "dashboard": "No completed rides yet. Start booking and completing rides to see your comprehensive dashboard!"
+}
+NO_RIDE_DATA = {
+    "wait_time": "No ride data found. Complete some rides to see wait time analysis.",
+    "coverage": "No ride data found. Complete some rides to see coverage analysis.",
+    "dashboard": "No ride data found. Complete some rides to see your dashboard."
+}
+
 class RideVisualizationService:
     """Service layer for ride data visualization"""
     
@@ -17,13 +34,33 @@ class RideVisualizationService:
         self.wait_time_chart = WaitTimeDistributionChart()
         self.coverage_chart = ServiceCoverageChart()
         self.dashboard = ComprehensiveDashboard()
+        # Chart type -> (component, its generate_* method)
+        self.charts = {
+            "frequency": (self.frequency_chart, self.generate_frequency_analysis),
+            "wait_time": (self.wait_time_chart, self.generate_wait_time_analysis),
+            "coverage": (self.coverage_chart, self.generate_coverage_analysis),
+            "dashboard": (self.dashboard, self.generate_comprehensive_dashboard)
+        }
+        # Everything any chart reads, fetched together when an action draws several
+        self.analysis_fields = tuple(dict.fromkeys(
+            field for chart in (self.frequency_chart, self.wait_time_chart, self.coverage_chart, self.dashboard)
+            for field in chart.FIELDS))
     
-    def generate_frequency_analysis(self, user_id: str, show_plot: bool = True, save_path: str = None) -> Dict:
-        """Generate ride frequency analysis from REAL user data"""
-        try:
-            # Check if user has real data available
-            availability = self.data_manager.check_real_data_availability(user_id)
-            
+    def _daily_ride_counts(self, snapshot: RideSnapshot):
+        """(days, rides per day) from the daily rollup, read once per snapshot"""
+        return snapshot.derived("daily_ride_counts", lambda snap: daily_ride_counts(
+            self.data_manager.get_ride_rollup(snap.user_id, resolution="day")))
+    
+    def prepare_chart(self, chart_type: str, user_id: str, snapshot: RideSnapshot = None) -> Dict:
+        """
+        What a chart is drawn from: {"rides": RideFrame of its FIELDS, "daily": (days, rides per day)},
+        or an error dict when the user has too little data. Only the frequency chart needs 3 completed rides.
+        """
+        chart = self.charts[chart_type][0]
+        snapshot = snapshot or self.data_manager.snapshot(user_id)
+        availability = self.data_manager.check_real_data_availability(user_id, snapshot)
+    
+        if chart_type == "frequency":
             if not availability["can_generate_charts"]:
                 return {
                     "error": "Insufficient real data for visualization",
@@ -32,23 +69,38 @@ class RideVisualizationService:
                     "completed_rides": availability["completed_rides"],
                     "data_source": "real_usage"
                 }
-            
-            # Get real ride data
-            rides_data = self.data_manager.get_user_rides(user_id)
-            if not rides_data:
+            # Rides per day from the daily rollup: a row per day, however many rides
+            daily = self._daily_ride_counts(snapshot)
+            if not daily[0]:
                 return {
                     "error": f"No ride data found for user {user_id}",
                     "message": "Start booking rides to see your analytics!",
                     "data_source": "real_usage"
                 }
+            return {"rides": None, "daily": daily}
+    
+        if not availability["has_data"]:
+            return {"error": NO_COMPLETED_RIDES[chart_type]}
+        rides = snapshot.frame(chart.FIELDS)
+        if not len(rides):
+            return {"error": NO_RIDE_DATA[chart_type]}
+        daily = self._daily_ride_counts(snapshot) if chart_type == "dashboard" else None
+        return {"rides": rides, "daily": daily}
+    
+    def generate_frequency_analysis(self, user_id: str, show_plot: bool = True, save_path: str = None,
+                                    snapshot: RideSnapshot = None) -> Dict:
+        """Generate ride frequency analysis from REAL user data"""
+        try:
+            data = self.prepare_chart("frequency", user_id, snapshot)
+            if "error" in data:
+                return data
             
             # Create chart from real data
-            result = self.frequency_chart.create_chart(rides_data, user_id)
+            result = self.frequency_chart.create_chart(data["daily"], user_id)
             
             # Handle display/save
             if save_path:
-                saved_path = self.frequency_chart.save_plot(save_path)
-                result["saved_to"] = saved_path
+                result["saved_to"] = self.frequency_chart.save_outputs(save_path)
             
             if show_plot:
                 self.frequency_chart.show_plot()
@@ -66,25 +118,20 @@ class RideVisualizationService:
             print(error_msg)
             return {"error": error_msg, "data_source": "real_usage"}
     
-    def generate_wait_time_analysis(self, user_id: str, show_plot: bool = True, save_path: str = None) -> Dict:
+    def generate_wait_time_analysis(self, user_id: str, show_plot: bool = True, save_path: str = None,
+                                    snapshot: RideSnapshot = None) -> Dict:
         """Generate wait time distribution analysis"""
         try:
-            # Check if real data is available
-            if not self.data_manager.check_real_data_availability(user_id):
-                return {"error": "No completed rides yet. Start booking and completing rides to see your wait time patterns!"}
-            
-            # Get data
-            rides_data = self.data_manager.get_user_rides(user_id)
-            if not rides_data:
-                return {"error": "No ride data found. Complete some rides to see wait time analysis."}
+            data = self.prepare_chart("wait_time", user_id, snapshot)
+            if "error" in data:
+                return data
             
             # Create chart
-            result = self.wait_time_chart.create_chart(rides_data, user_id)
+            result = self.wait_time_chart.create_chart(data["rides"], user_id)
             
             # Handle display/save
             if save_path:
-                saved_path = self.wait_time_chart.save_plot(save_path)
-                result["saved_to"] = saved_path
+                result["saved_to"] = self.wait_time_chart.save_outputs(save_path)
             
             if show_plot:
                 self.wait_time_chart.show_plot()
@@ -104,25 +151,20 @@ class RideVisualizationService:
             print(error_msg)
             return {"error": error_msg}
     
-    def generate_coverage_analysis(self, user_id: str, top_n: int = 10, show_plot: bool = True, save_path: str = None) -> Dict:
+    def generate_coverage_analysis(self, user_id: str, top_n: int = 10, show_plot: bool = True, save_path: str = None,
+                                   snapshot: RideSnapshot = None) -> Dict:
         """Generate service coverage analysis"""
         try:
-            # Check if real data is available
-            if not self.data_manager.check_real_data_availability(user_id):
-                return {"error": "No completed rides yet. Start booking and completing rides to see your service coverage!"}
-            
-            # Get data
-            rides_data = self.data_manager.get_user_rides(user_id)
-            if not rides_data:
-                return {"error": "No ride data found. Complete some rides to see coverage analysis."}
+            data = self.prepare_chart("coverage", user_id, snapshot)
+            if "error" in data:
+                return data
             
             # Create chart
-            result = self.coverage_chart.create_chart(rides_data, user_id, top_n)
+            result = self.coverage_chart.create_chart(data["rides"], user_id, top_n)
             
             # Handle display/save
             if save_path:
-                saved_path = self.coverage_chart.save_plot(save_path)
-                result["saved_to"] = saved_path
+                result["saved_to"] = self.coverage_chart.save_outputs(save_path)
             
             if show_plot:
                 self.coverage_chart.show_plot()
@@ -142,25 +184,20 @@ class RideVisualizationService:
             print(error_msg)
             return {"error": error_msg}
     
-    def generate_comprehensive_dashboard(self, user_id: str, show_plot: bool = True, save_path: str = None) -> Dict:
+    def generate_comprehensive_dashboard(self, user_id: str, show_plot: bool = True, save_path: str = None,
+                                         snapshot: RideSnapshot = None) -> Dict:
         """Generate comprehensive dashboard with all visualizations"""
         try:
-            # Check if real data is available
-            if not self.data_manager.check_real_data_availability(user_id):
-                return {"error": "No completed rides yet. Start booking and completing rides to see your comprehensive dashboard!"}
-            
-            # Get data
-            rides_data = self.data_manager.get_user_rides(user_id)
-            if not rides_data:
-                return {"error": "No ride data found. Complete some rides to see your dashboard."}
+            data = self.prepare_chart("dashboard", user_id, snapshot)
+            if "error" in data:
+                return data
             
             # Create dashboard
-            result = self.dashboard.create_dashboard(rides_data, user_id)
+            result = self.dashboard.create_dashboard(data["rides"], user_id, data["daily"])
             
             # Handle display/save
             if save_path:
-                saved_path = self.dashboard.save_plot(save_path)
-                result["saved_to"] = saved_path
+                result["saved_to"] = self.dashboard.save_outputs(save_path)
             
             if show_plot:
                 self.dashboard.show_plot()
@@ -182,6 +219,61 @@ class RideVisualizationService:
             print(error_msg)
             return {"error": error_msg}
     
+    def cached_chart_png(self, chart_type: str, user_id: str, theme: str = "light", dpi: int = 150) -> Optional[Dict]:
+        """The chart's PNG if the user's data_version was seen moments ago and it is cached: one dictionary lookup"""
+        chart = self.charts[chart_type][0]
+        store = self.data_manager.store.value
+        version = chart_cache.known_version(store, user_id)
+        if version is None:
+            return None
+        png = chart_cache.get(chart_key(chart_type, store, user_id, version, theme, dpi, chart.figsize))
+        return {"png": png, "cached": True, "data_version": version} if png is not None else None
+    
+    def get_chart_png(self, chart_type: str, user_id: str, theme: str = "light", dpi: int = 150) -> Dict:
+        """
+        A chart rendered as PNG bytes (under "png") for the UI. Served from the chart cache
+        while the user's rides are unchanged; otherwise drawn once in a render worker and cached.
+        Errors come back as from the generate_* methods. Blocking; see render_chart_png.
+        """
+        cached = self.cached_chart_png(chart_type, user_id, theme, dpi)
+        if cached:
+            return cached
+        
+        chart = self.charts[chart_type][0]
+        store = self.data_manager.store.value
+        snapshot = self.data_manager.snapshot(user_id)
+        chart_cache.remember_version(store, user_id, snapshot.data_version)
+        key = chart_key(chart_type, store, user_id, snapshot.data_version, theme, dpi, chart.figsize)
+        png = chart_cache.get(key)
+        if png is not None:
+            return {"png": png, "cached": True, "data_version": snapshot.data_version}
+        
+        try:
+            data = self.prepare_chart(chart_type, user_id, snapshot)
+            if "error" in data:
+                return data
+            result, png = chart_renderer.draw(chart_type, data["rides"], data["daily"], user_id, dpi)
+        except Exception as e:
+            error_msg = f"Error rendering {chart_type} chart: {e}"
+            print(error_msg)
+            return {"error": error_msg}
+        if "error" in result:
+            return result
+        if png:
+            chart_cache.put(key, png)
+        return {**result, "png": png, "cached": False, "data_version": snapshot.data_version}
+    
+    async def render_chart_png(self, chart_type: str, user_id: str, theme: str = "light", dpi: int = 150) -> Dict:
+        """
+        get_chart_png for async handlers: a cache hit returns at once, anything else is read and drawn
+        off the event loop. Concurrent requests for the same chart share one render.
+        """
+        cached = self.cached_chart_png(chart_type, user_id, theme, dpi)
+        if cached:
+            return cached
+        key = (chart_type, self.data_manager.store.value, user_id, theme, dpi)
+        return await chart_renderer.render(key, lambda: self.get_chart_png(chart_type, user_id, theme, dpi))
+    
     def get_user_statistics(self, user_id: str) -> Dict:
         """Get comprehensive user statistics without generating plots"""
         try:
@@ -201,9 +293,21 @@ class RideVisualizationService:
         }
         
         try:
+            # One snapshot for the whole analysis: one summary read, one ride query
+            queries_before = snapshot_cache.stats()["ride_queries"]
+            snapshot = self.data_manager.snapshot(user_id)
+            snapshot.frame(self.analysis_fields)
+            
+            # Saved charts: hi-res PNG, SVG and thumbnail from one draw each
+            export_dir = Config.CHART_EXPORT_DIR if save_charts else None
+            if export_dir:
+                export_dir.mkdir(parents=True, exist_ok=True)
+            save_path = lambda chart_type: export_dir / f"{user_id}_{chart_type}" if export_dir else None
+            
             # 1. Frequency Analysis
             print("\n1️⃣ Generating Ride Frequency Analysis...")
-            freq_result = self.generate_frequency_analysis(user_id, show_plot=True)
+            freq_result = self.generate_frequency_analysis(user_id, show_plot=True, save_path=save_path("frequency"),
+                                                           snapshot=snapshot)
             if "error" in freq_result:
                 results["errors"].append(f"Frequency analysis: {freq_result['error']}")
             else:
@@ -211,7 +315,8 @@ class RideVisualizationService:
             
             # 2. Wait Time Analysis
             print("\n2️⃣ Generating Wait Time Analysis...")
-            wait_result = self.generate_wait_time_analysis(user_id, show_plot=True)
+            wait_result = self.generate_wait_time_analysis(user_id, show_plot=True, save_path=save_path("wait_time"),
+                                                           snapshot=snapshot)
             if "error" in wait_result:
                 results["errors"].append(f"Wait time analysis: {wait_result['error']}")
             else:
@@ -219,7 +324,8 @@ class RideVisualizationService:
             
             # 3. Coverage Analysis
             print("\n3️⃣ Generating Service Coverage Analysis...")
-            coverage_result = self.generate_coverage_analysis(user_id, show_plot=True)
+            coverage_result = self.generate_coverage_analysis(user_id, show_plot=True, save_path=save_path("coverage"),
+                                                              snapshot=snapshot)
             if "error" in coverage_result:
                 results["errors"].append(f"Coverage analysis: {coverage_result['error']}")
             else:
@@ -227,12 +333,16 @@ class RideVisualizationService:
             
             # 4. Comprehensive Dashboard
             print("\n4️⃣ Generating Comprehensive Dashboard...")
-            dashboard_result = self.generate_comprehensive_dashboard(user_id, show_plot=True)
+            dashboard_result = self.generate_comprehensive_dashboard(user_id, show_plot=True, save_path=save_path("dashboard"),
+                                                                     snapshot=snapshot)
             if "error" in dashboard_result:
                 results["errors"].append(f"Dashboard: {dashboard_result['error']}")
             else:
                 results["dashboard"] = dashboard_result
             
+            results["ride_queries"] = snapshot_cache.stats()["ride_queries"] - queries_before
+            print(f"\n🔎 Ride queries for this analysis: {results['ride_queries']} (data version {snapshot.data_version})")
+            
             # Summary
             if not results["errors"]:
                 results["analysis_complete"] = True
@@ -1,102 +1,299 @@
+"""
+Matplotlib chart components for ride analytics.
 
-import matplotlib.pyplot as plt
+Each component keeps one Figure (object-oriented API, never registered with
+pyplot) and reuses it for every chart it draws: new data updates the existing bars,
+histogram patches, lines and labels in place rather than building a new figure.
+After create_chart / create_dashboard, render_outputs() emits any mix of UI PNG,
+hi-res PNG, SVG and thumbnail from a single layout and a single Agg draw, instead
+of a layout and rasterization per savefig call.
+
+Benchmark per output (against one savefig each) and of refreshing a chart:
+py -m app.ui.components.visualization_components
+"""
 import numpy as np
-from datetime import datetime
-from typing import Dict, List, Optional, Tuple
+from dataclasses import dataclass
+from io import BytesIO
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from typing import Dict, Iterable, List, Optional, Tuple
 import tempfile
 import os
 
+from app.db.ride_frame import RideFrame, FRAME_FIELDS
+
+@dataclass(frozen=True)
+class ChartOutput:
+    """One rendered form of a chart: PNG at a dpi (or scaled to a pixel width), or a vector format"""
+    format: str
+    dpi: Optional[int] = None
+    width: Optional[int] = None
+    suffix: str = ".png"
+
+CHART_OUTPUTS = {
+    "ui_png": ChartOutput("png", dpi=150),
+    "hires_png": ChartOutput("png", dpi=300, suffix="_300dpi.png"),
+    "svg": ChartOutput("svg", suffix=".svg"),
+    "thumbnail": ChartOutput("png", width=320, suffix="_thumb.png")
+}
+SAVE_OUTPUTS = ("hires_png", "svg", "thumbnail")   # What run_complete_analysis(save_charts=True) writes
+FIGURE_DPI = 150    # Draw dpi when only a thumbnail is asked for
+PAD_INCHES = 0.1    # As savefig(bbox_inches='tight')
+
+# == In-place artist updates ==
+# A component keeps one Figure and its artists; new data moves and resizes them
+# instead of building a new figure. Artists are only rebuilt when their count changes.
+def update_bars(ax, bars, positions, values, horizontal: bool = False, **style):
+    """`bars` (a BarContainer) moved to `positions` and resized to `values`, or drawn anew"""
+    if bars is not None and len(bars) == len(values):
+        for bar, position, value in zip(bars, positions, values):
+            if horizontal:
+                bar.set_y(ax.convert_yunits(position) - bar.get_height() / 2)
+                bar.set_width(value)
+            else:
+                bar.set_x(ax.convert_xunits(position) - bar.get_width() / 2)
+                bar.set_height(value)
+        return bars
+    if bars is not None:
+        bars.remove()
+    return (ax.barh if horizontal else ax.bar)(positions, values, **style)
+
+def update_histogram(ax, patches, counts, edges, **style):
+    """Histogram `patches` refilled with precomputed `counts` over bin `edges`, or drawn anew"""
+    if patches is not None and len(patches) == len(counts):
+        for patch, count, left, right in zip(patches, counts, edges[:-1], edges[1:]):
+            patch.set_x(left)
+            patch.set_width(right - left)
+            patch.set_height(count)
+        return patches
+    if patches is not None:
+        patches.remove()
+    return ax.hist(edges[:-1], bins=edges, weights=counts, **style)[2]
+
+def update_reference_line(ax, line, value: float, label: str, vertical: bool = True, **style):
+    """An axvline (or axhline) at `value`, moved rather than redrawn"""
+    if line is None:
+        return (ax.axvline if vertical else ax.axhline)(value, label=label, **style)
+    (line.set_xdata if vertical else line.set_ydata)([value, value])
+    line.set_label(label)
+    line.set_visible(True)
+    return line
+
+def update_labels(ax, texts: list, positions: list, strings: list, **style) -> list:
+    """Text labels at (x, y) `positions`, reusing `texts` when there are as many"""
+    if len(texts) == len(strings):
+        for text, position, string in zip(texts, positions, strings):
+            text.set_position(position)
+            text.set_text(string)
+        return texts
+    for text in texts:
+        text.remove()
+    return [ax.text(x, y, string, **style) for (x, y), string in zip(positions, strings)]
+
+def update_legend(ax):
+    """The legend's texts set to the current labels; rebuilt only if the entries changed"""
+    legend = ax.get_legend()
+    _, labels = ax.get_legend_handles_labels()
+    if legend is None or len(legend.texts) != len(labels):
+        if legend is not None:
+            legend.remove()
+        if labels:
+            ax.legend()
+        return
+    for text, label in zip(legend.texts, labels):
+        text.set_text(label)
+
+def rescale(ax, points: np.ndarray = None):
+    """Fit the view to the updated artists; scatter `points` too, which relim() does not see"""
+    ax.relim()
+    if points is not None and len(points):
+        ax.update_datalim(points)
+    ax.autoscale_view()
+
+
 class BaseVisualizationComponent:
     """Base class for all visualization components"""
     
+    FIELDS = FRAME_FIELDS  # Ride fields the chart reads; only these are fetched
+    
     def __init__(self, title: str = "", figsize: Tuple[int, int] = (10, 6)):
         self.title = title
         self.figsize = figsize
         self.fig = None
         self.ax = None
+        self._laid_out = False
     
     def setup_plot(self, title_override: str = None):
-        """Setup basic plot configuration"""
-        self.fig, self.ax = plt.subplots(figsize=self.figsize)
-        plt.title(title_override or self.title, fontsize=16, fontweight='bold')
-        plt.grid(alpha=0.3)
+        """Setup basic plot configuration; the figure is built once and reused by later charts"""
+        if self.fig is None:
+            self.fig = Figure(figsize=self.figsize)
+            FigureCanvasAgg(self.fig)
+            self.ax = self.fig.subplots()
+            self.ax.grid(alpha=0.3)
+        self.ax.set_title(title_override or self.title, fontsize=16, fontweight='bold')
+        self._laid_out = False
+    
+    def render(self, rides: Optional[RideFrame], user_id: str, daily: Tuple[List, List[int]] = None) -> Dict:
+        """Draw the chart from whichever of `rides` / `daily` it reads (see chart_renderer.draw_chart)"""
+        return self.create_chart(rides, user_id)
+    
+    def layout(self):
+        """Lay the figure out once; every output of render_outputs() reuses it"""
+        if self.fig and not self._laid_out:
+            self.fig.tight_layout()
+            self._laid_out = True
+    
+    def render_outputs(self, outputs: Iterable[str] = ("ui_png",)) -> Dict[str, bytes]:
+        """
+        Bytes for each requested CHART_OUTPUTS entry, from one layout and one Agg draw at the
+        highest dpi asked for. Smaller PNGs are scaled down from that draw; SVG reuses its layout.
+        """
+        specs = {name: CHART_OUTPUTS[name] if isinstance(name, str) else name for name in outputs}
+        return self._render(specs)
+    
+    def _render(self, specs: Dict) -> Dict:
+        if not self.fig:
+            return {name: b'' for name in specs}
+        
+        self.layout()
+        rasters = {name: spec for name, spec in specs.items() if spec.format == "png"}
+        rendered, bbox = {}, "tight"
+        if rasters:
+            rendered, bbox = self._render_rasters(rasters)
+        for name, spec in specs.items():
+            if spec.format != "png":
+                # Vector output has no Agg pass to share, but reuses the layout and tight bbox
+                buffer = BytesIO()
+                self.fig.savefig(buffer, format=spec.format, bbox_inches=bbox)
+                rendered[name] = buffer.getvalue()
+        return {name: rendered[name] for name in specs}
+    
+    def _render_rasters(self, rasters: Dict) -> Tuple[Dict[str, bytes], object]:
+        """PNGs for `rasters` from one Agg draw, plus the tight bbox (inches) they were cropped to"""
+        from PIL import Image
+        
+        dpi = max(spec.dpi or 0 for spec in rasters.values()) or FIGURE_DPI
+        original_dpi = self.fig.dpi
+        try:
+            # The one draw: whole figure at `dpi`, cropped to what bbox_inches='tight' would keep
+            self.fig.set_dpi(dpi)
+            canvas = self.fig.canvas if isinstance(self.fig.canvas, FigureCanvasAgg) else FigureCanvasAgg(self.fig)
+            canvas.draw()
+            bbox = self.fig.get_tightbbox(canvas.get_renderer()).padded(PAD_INCHES)
+            pixels = np.asarray(canvas.buffer_rgba())
+        finally:
+            self.fig.set_dpi(original_dpi)
+        
+        height, width = pixels.shape[:2]
+        left, right = max(0, int(bbox.x0 * dpi)), min(width, int(np.ceil(bbox.x1 * dpi)))
+        top, bottom = max(0, height - int(np.ceil(bbox.y1 * dpi))), min(height, height - int(bbox.y0 * dpi))
+        image = Image.fromarray(pixels[top:bottom, left:right])
+        
+        # Largest first, each scaled from the smallest image already made that is still larger
+        scaled = {1.0: image}
+        target = lambda spec: spec.width / image.width if spec.width else spec.dpi / dpi
+        rendered = {}
+        for name, spec in sorted(rasters.items(), key=lambda item: -target(item[1])):
+            scale = target(spec)
+            if scale not in scaled:
+                source = min(factor for factor in scaled if factor >= scale)
+                size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+                ratio = source / scale
+                scaled[scale] = (scaled[source].reduce(round(ratio)) if ratio == round(ratio)
+                                 else scaled[source].resize(size, Image.Resampling.LANCZOS, reducing_gap=2.0))
+            buffer = BytesIO()
+            scaled[scale].save(buffer, format="PNG", dpi=(round(dpi * scale),) * 2)
+            rendered[name] = buffer.getvalue()
+        return rendered, bbox
+    
+    def save_outputs(self, path: str, outputs: Iterable[str] = SAVE_OUTPUTS) -> Dict[str, str]:
+        """Write each output next to `path` (its suffix is replaced) from one draw; returns the paths"""
+        stem = os.path.splitext(str(path))[0]
+        saved = {}
+        for name, data in self.render_outputs(outputs).items():
+            saved[name] = stem + CHART_OUTPUTS[name].suffix
+            with open(saved[name], "wb") as file:
+                file.write(data)
+        return saved
     
     def save_plot(self, filename: str = None) -> str:
-        """Save plot to temporary file and return path"""
+        """Save plot as a 300 dpi PNG (or SVG, by suffix) and return path"""
         if not filename:
             filename = tempfile.mktemp(suffix='.png')
         
-        plt.tight_layout()
-        plt.savefig(filename, dpi=300, bbox_inches='tight')
+        output = "svg" if filename.lower().endswith(".svg") else "hires_png"
+        with open(filename, "wb") as file:
+            file.write(self.render_outputs((output,))[output])
         return filename
     
     def show_plot(self):
-        """Display the plot"""
-        plt.tight_layout()
-        plt.show()
+        """Display the plot in a window (interactive use; the only place pyplot is loaded)"""
+        import matplotlib.pyplot as plt
+        
+        self.layout()
+        window = plt.figure(figsize=self.figsize)
+        canvas = window.canvas
+        canvas.figure = self.fig
+        self.fig.set_canvas(canvas)
+        try:
+            plt.show()
+        finally:
+            plt.close(window)
+            FigureCanvasAgg(self.fig)
     
     def close_plot(self):
-        """Close the plot to free memory"""
-        if self.fig:
-            plt.close(self.fig)
+        """Nothing to free: the figure is not registered with pyplot, and the next chart reuses it"""
     
-    def get_chart_bytes(self) -> bytes:
+    def get_chart_bytes(self, dpi: int = 150) -> bytes:
         """Get chart as bytes for UI integration"""
-        from io import BytesIO
-        buffer = BytesIO()
-        if self.fig:
-            self.fig.savefig(buffer, format='png', dpi=150, bbox_inches='tight')
-            buffer.seek(0)
-            return buffer.getvalue()
-        return b''
+        return self._render({"png": ChartOutput("png", dpi=dpi)})["png"]
 
 
 class RideFrequencyChart(BaseVisualizationComponent):
     """Component for ride frequency over time visualization"""
     
+    FIELDS = ()  # Reads the daily rollup, not the rides
+    
     def __init__(self):
         super().__init__("📊 Ride Frequency Over Time", (12, 6))
+        self._bars = None
+        self._values = []
+        self._average = None
     
-    def create_chart(self, rides_data: List[Dict], user_id: str) -> Dict:
-        """Create ride frequency chart"""
-        if not rides_data:
+    def render(self, rides: Optional[RideFrame], user_id: str, daily: Tuple[List, List[int]] = None) -> Dict:
+        return self.create_chart(daily, user_id)
+    
+    def create_chart(self, daily: Tuple[List, List[int]], user_id: str) -> Dict:
+        """Create ride frequency chart from (days, rides per day), e.g. ride_rollups.daily_ride_counts()"""
+        sorted_dates, counts = daily
+        if not sorted_dates:
             return {"error": "No rides data provided"}
         
-        # Parse timestamps and group by date
-        timestamps = [datetime.strptime(r['timestamp'], "%Y-%m-%d %H:%M:%S") for r in rides_data]
-        ride_dates = [t.date() for t in timestamps]
-        
-        # Count rides per day
-        date_counts = {}
-        for date in ride_dates:
-            date_counts[date] = date_counts.get(date, 0) + 1
-        
-        # Sort dates
-        sorted_dates = sorted(date_counts.keys())
-        counts = [date_counts[date] for date in sorted_dates]
-        
-        # Create the plot
+        # Create the plot (or reuse it: artists below are updated in place)
         self.setup_plot(f'📊 Ride Frequency Over Time for {user_id}')
         
-        bars = self.ax.bar(sorted_dates, counts, color='skyblue', alpha=0.7, edgecolor='navy')
+        self._bars = update_bars(self.ax, self._bars, sorted_dates, counts,
+                                 color='skyblue', alpha=0.7, edgecolor='navy')
         self.ax.set_xlabel('Date', fontsize=12)
         self.ax.set_ylabel('Number of Rides', fontsize=12)
         self.ax.tick_params(axis='x', rotation=45)
         
         # Add average line
         avg_rides = np.mean(counts)
-        self.ax.axhline(y=avg_rides, color='red', linestyle='--', 
-                       label=f'Average: {avg_rides:.1f} rides/day')
-        self.ax.legend()
+        self._average = update_reference_line(self.ax, self._average, avg_rides, f'Average: {avg_rides:.1f} rides/day',
+                                              vertical=False, color='red', linestyle='--')
+        update_legend(self.ax)
         
         # Add value labels on bars
-        for bar, count in zip(bars, counts):
-            self.ax.text(bar.get_x() + bar.get_width()/2, bar.get_height() + 0.1,
-                        str(count), ha='center', va='bottom', fontweight='bold')
+        self._values = update_labels(
+            self.ax, self._values,
+            [(bar.get_x() + bar.get_width()/2, bar.get_height() + 0.1) for bar in self._bars],
+            [str(count) for count in counts], ha='center', va='bottom', fontweight='bold')
+        rescale(self.ax)
         
         return {
-            "total_rides": len(rides_data),
-            "date_range": f"{min(sorted_dates)} to {max(sorted_dates)}",
+            "total_rides": sum(counts),
+            "date_range": f"{sorted_dates[0]} to {sorted_dates[-1]}",
             "average_per_day": avg_rides,
             "chart_data": {
                 "dates": sorted_dates,
@@ -108,21 +305,27 @@ class RideFrequencyChart(BaseVisualizationComponent):
 class WaitTimeDistributionChart(BaseVisualizationComponent):
     """Component for wait time distribution visualization"""
     
+    FIELDS = ("wait_time",)
+    
     def __init__(self):
         super().__init__("⏱️ Wait Time Distribution", (10, 6))
+        self._patches = None
+        self._average = None
+        self._median = None
     
-    def create_chart(self, rides_data: List[Dict], user_id: str) -> Dict:
+    def create_chart(self, rides: RideFrame, user_id: str) -> Dict:
         """Create wait time distribution chart"""
-        wait_times = [r.get('wait_time', 0) for r in rides_data if 'wait_time' in r]
+        wait_times = rides.recorded("wait_time")
         
-        if not wait_times:
+        if not len(wait_times):
             return {"error": "No wait time data available"}
         
-        # Create histogram
+        # Create histogram (or refill the existing one)
         self.setup_plot(f'⏱️ Wait Time Distribution for {user_id}')
         
-        n, bins, patches = self.ax.hist(wait_times, bins=15, color='lightgreen', 
-                                       edgecolor='darkgreen', alpha=0.7)
+        n, bins = rides.wait_histogram(15)
+        self._patches = update_histogram(self.ax, self._patches, n, bins, color='lightgreen',
+                                         edgecolor='darkgreen', alpha=0.7)
         
         self.ax.set_xlabel('Wait Time (minutes)', fontsize=12)
         self.ax.set_ylabel('Frequency', fontsize=12)
@@ -131,19 +334,20 @@ class WaitTimeDistributionChart(BaseVisualizationComponent):
         avg_wait = np.mean(wait_times)
         median_wait = np.median(wait_times)
         
-        self.ax.axvline(avg_wait, color='red', linestyle='--', linewidth=2, 
-                       label=f'Average: {avg_wait:.1f} min')
-        self.ax.axvline(median_wait, color='orange', linestyle='--', linewidth=2, 
-                       label=f'Median: {median_wait:.1f} min')
+        self._average = update_reference_line(self.ax, self._average, avg_wait, f'Average: {avg_wait:.1f} min',
+                                              color='red', linestyle='--', linewidth=2)
+        self._median = update_reference_line(self.ax, self._median, median_wait, f'Median: {median_wait:.1f} min',
+                                             color='orange', linestyle='--', linewidth=2)
         
-        self.ax.legend()
+        update_legend(self.ax)
+        rescale(self.ax)
         
         return {
             "statistics": {
                 "average": avg_wait,
                 "median": median_wait,
-                "min": min(wait_times),
-                "max": max(wait_times),
+                "min": float(wait_times.min()),
+                "max": float(wait_times.max()),
                 "total_samples": len(wait_times)
             },
             "distribution_data": {
@@ -156,39 +360,42 @@ class WaitTimeDistributionChart(BaseVisualizationComponent):
 class ServiceCoverageChart(BaseVisualizationComponent):
     """Component for service coverage visualization"""
     
+    FIELDS = ("pickup",)
+    
     def __init__(self):
         super().__init__("🗺️ Service Coverage", (12, 8))
+        self._bars = None
+        self._values = []
     
-    def create_chart(self, rides_data: List[Dict], user_id: str, top_n: int = 10) -> Dict:
+    def create_chart(self, rides: RideFrame, user_id: str, top_n: int = 10) -> Dict:
         """Create service coverage chart"""
-        # Count pickup locations
-        pickup_counts = {}
-        for ride in rides_data:
-            pickup = ride.get('pickup', 'Unknown')
-            pickup_counts[pickup] = pickup_counts.get(pickup, 0) + 1
-        
-        if not pickup_counts:
+        if not len(rides):
             return {"error": "No pickup location data available"}
         
-        # Sort by frequency and take top N
-        sorted_locations = sorted(pickup_counts.items(), key=lambda x: x[1], reverse=True)[:top_n]
+        # Most frequent pickup locations first, top N
+        sorted_locations = rides.pickup_counts(top_n)
         locations = [item[0] for item in sorted_locations]
         counts = [item[1] for item in sorted_locations]
         
-        # Create horizontal bar chart
+        # Create horizontal bar chart; rows are numbered so new locations just relabel them
         self.setup_plot(f'🗺️ Service Coverage - Top {len(locations)} Pickup Locations for {user_id}')
         
-        bars = self.ax.barh(locations, counts, color='salmon', alpha=0.7, edgecolor='darkred')
+        rows = np.arange(len(locations))
+        self._bars = update_bars(self.ax, self._bars, rows, counts, horizontal=True,
+                                 color='salmon', alpha=0.7, edgecolor='darkred')
+        self.ax.set_yticks(rows, locations)
         self.ax.set_xlabel('Number of Rides', fontsize=12)
         self.ax.set_ylabel('Pickup Location', fontsize=12)
         
         # Add value labels on bars
-        for bar, count in zip(bars, counts):
-            self.ax.text(bar.get_width() + 0.1, bar.get_y() + bar.get_height()/2, 
-                        str(count), ha='left', va='center', fontweight='bold')
+        self._values = update_labels(
+            self.ax, self._values,
+            [(bar.get_width() + 0.1, bar.get_y() + bar.get_height()/2) for bar in self._bars],
+            [str(count) for count in counts], ha='left', va='center', fontweight='bold')
+        rescale(self.ax)
         
         return {
-            "total_locations": len(pickup_counts),
+            "total_locations": len(rides.pickup_labels),
             "top_locations": dict(sorted_locations),
             "most_popular": sorted_locations[0] if sorted_locations else None,
             "coverage_data": {
@@ -201,87 +408,201 @@ class ServiceCoverageChart(BaseVisualizationComponent):
 class ComprehensiveDashboard(BaseVisualizationComponent):
     """Component for comprehensive dashboard with multiple charts"""
     
+    FIELDS = ("pickup", "wait_time", "duration", "fare")  # Frequency comes from the daily rollup
+    
     def __init__(self):
         super().__init__("🚗 ATS Ride Analytics Dashboard", (16, 12))
+        self.axes = None
+        self._frequency = None
+        self._wait_patches = None
+        self._wait_average = None
+        self._coverage = None
+        self._scatter = None
+        self._trend = None
     
-    def create_dashboard(self, rides_data: List[Dict], user_id: str) -> Dict:
-        """Create comprehensive dashboard"""
-        if not rides_data:
-            return {"error": "No rides data provided"}
-        
-        # Create a 2x2 subplot dashboard
-        self.fig, ((ax1, ax2), (ax3, ax4)) = plt.subplots(2, 2, figsize=self.figsize)
-        self.fig.suptitle(f'🚗 ATS Ride Analytics Dashboard for {user_id}', 
-                         fontsize=18, fontweight='bold')
-        
-        # 1. Ride frequency over time
-        timestamps = [datetime.strptime(r['timestamp'], "%Y-%m-%d %H:%M:%S") for r in rides_data]
-        ride_dates = [t.date() for t in timestamps]
-        date_counts = {}
-        for date in ride_dates:
-            date_counts[date] = date_counts.get(date, 0) + 1
-        
-        sorted_dates = sorted(date_counts.keys())
-        counts = [date_counts[date] for date in sorted_dates]
+    def render(self, rides: Optional[RideFrame], user_id: str, daily: Tuple[List, List[int]] = None) -> Dict:
+        return self.create_dashboard(rides, user_id, daily)
+    
+    def setup_dashboard(self):
+        """The 2x2 dashboard figure, built with its titles and labels on first use"""
+        self._laid_out = False
+        if self.fig is not None:
+            return
+        self.fig = Figure(figsize=self.figsize)
+        FigureCanvasAgg(self.fig)
+        self.axes = self.fig.subplots(2, 2)
+        (ax1, ax2), (ax3, ax4) = self.axes
         
-        ax1.bar(sorted_dates, counts, color='skyblue', alpha=0.7)
         ax1.set_title('📊 Ride Frequency Over Time')
         ax1.set_xlabel('Date')
         ax1.set_ylabel('Number of Rides')
         ax1.tick_params(axis='x', rotation=45)
         ax1.grid(axis='y', alpha=0.3)
         
-        # 2. Wait time distribution
-        wait_times = [r.get('wait_time', 0) for r in rides_data if 'wait_time' in r]
-        ax2.hist(wait_times, bins=10, color='lightgreen', edgecolor='darkgreen', alpha=0.7)
         ax2.set_title('⏱️ Wait Time Distribution')
         ax2.set_xlabel('Wait Time (minutes)')
         ax2.set_ylabel('Frequency')
-        if wait_times:
-            ax2.axvline(np.mean(wait_times), color='red', linestyle='--', 
-                       label=f'Avg: {np.mean(wait_times):.1f} min')
-            ax2.legend()
         ax2.grid(axis='y', alpha=0.3)
         
-        # 3. Service coverage (top 8 locations)
-        pickup_counts = {}
-        for ride in rides_data:
-            pickup = ride.get('pickup', 'Unknown')
-            pickup_counts[pickup] = pickup_counts.get(pickup, 0) + 1
+        ax3.set_title('🗺️ Top Service Areas')
+        ax3.set_xlabel('Number of Rides')
+        ax3.grid(axis='x', alpha=0.3)
+        
+        ax4.set_title('💰 Duration vs Fare Analysis')
+        ax4.set_xlabel('Ride Duration (minutes)')
+        ax4.set_ylabel('Fare (₱)')
+        ax4.grid(alpha=0.3)
+    
+    def create_dashboard(self, rides: RideFrame, user_id: str, daily: Tuple[List, List[int]] = None) -> Dict:
+        """Create comprehensive dashboard; `daily` is (days, rides per day), else counted from `rides`"""
+        if not len(rides):
+            return {"error": "No rides data provided"}
+        
+        # Create the 2x2 dashboard once; later calls update its artists in place
+        self.setup_dashboard()
+        (ax1, ax2), (ax3, ax4) = self.axes
+        self.fig.suptitle(f'🚗 ATS Ride Analytics Dashboard for {user_id}', 
+                          fontsize=18, fontweight='bold')
+        
+        # 1. Ride frequency over time
+        if daily is None:
+            days, counts = rides.daily_counts()
+            daily = days.astype(object).tolist(), counts.tolist()
+        sorted_dates, counts = daily
+        
+        self._frequency = update_bars(ax1, self._frequency, sorted_dates, counts, color='skyblue', alpha=0.7)
+        rescale(ax1)
+        
+        # 2. Wait time distribution
+        wait_times = rides.recorded("wait_time")
+        wait_counts, wait_bins = rides.wait_histogram(10)
+        self._wait_patches = update_histogram(ax2, self._wait_patches, wait_counts, wait_bins,
+                                              color='lightgreen', edgecolor='darkgreen', alpha=0.7)
+        if len(wait_times):
+            avg_wait = wait_times.mean()
+            self._wait_average = update_reference_line(ax2, self._wait_average, avg_wait,
+                                                       f'Avg: {avg_wait:.1f} min', color='red', linestyle='--')
+        elif self._wait_average is not None:
+            self._wait_average.set_visible(False)
+            self._wait_average.set_label('_hidden')
+        update_legend(ax2)
+        rescale(ax2)
         
-        sorted_locations = sorted(pickup_counts.items(), key=lambda x: x[1], reverse=True)[:8]
+        # 3. Service coverage (top 8 locations)
+        sorted_locations = rides.pickup_counts(8)
         locations = [item[0] for item in sorted_locations]
         pickup_freq = [item[1] for item in sorted_locations]
         
-        ax3.barh(locations, pickup_freq, color='salmon', alpha=0.7)
-        ax3.set_title('🗺️ Top Service Areas')
-        ax3.set_xlabel('Number of Rides')
-        ax3.grid(axis='x', alpha=0.3)
+        rows = np.arange(len(locations))
+        self._coverage = update_bars(ax3, self._coverage, rows, pickup_freq, horizontal=True,
+                                     color='salmon', alpha=0.7)
+        ax3.set_yticks(rows, locations)
+        rescale(ax3)
         
         # 4. Ride duration vs fare analysis
-        durations = [r.get('duration', 0) for r in rides_data if 'duration' in r]
-        fares = [r.get('fare', 0) for r in rides_data if 'fare' in r]
-        
-        if durations and fares:
-            ax4.scatter(durations, fares, alpha=0.6, color='purple', s=50)
-            ax4.set_title('💰 Duration vs Fare Analysis')
-            ax4.set_xlabel('Ride Duration (minutes)')
-            ax4.set_ylabel('Fare (₱)')
-            ax4.grid(alpha=0.3)
-            
-            # Add trend line
-            if len(durations) > 1:
-                z = np.polyfit(durations, fares, 1)
-                p = np.poly1d(z)
-                ax4.plot(durations, p(durations), "r--", alpha=0.8, linewidth=2)
-        
+        durations, fares = rides.duration_fare_pairs()
+        points = np.column_stack([durations, fares])
+        
+        if self._scatter is None:
+            self._scatter = ax4.scatter(durations, fares, alpha=0.6, color='purple', s=50)
+        else:
+            self._scatter.set_offsets(points)
+        
+        # Add trend line
+        if len(durations) > 1:
+            z = np.polyfit(durations, fares, 1)
+            p = np.poly1d(z)
+            if self._trend is None:
+                self._trend, = ax4.plot(durations, p(durations), "r--", alpha=0.8, linewidth=2)
+            else:
+                self._trend.set_data(durations, p(durations))
+        if self._trend is not None:
+            self._trend.set_visible(len(durations) > 1)
+        rescale(ax4, points)
+        
+        all_fares = rides.recorded("fare")
+        all_durations = rides.recorded("duration")
         return {
             "dashboard_created": True,
             "summary": {
-                "total_rides": len(rides_data),
-                "avg_wait_time": np.mean(wait_times) if wait_times else 0,
-                "service_locations": len(pickup_counts),
-                "avg_fare": np.mean(fares) if fares else 0,
-                "avg_duration": np.mean(durations) if durations else 0
+                "total_rides": len(rides),
+                "avg_wait_time": wait_times.mean() if len(wait_times) else 0,
+                "service_locations": len(rides.pickup_labels),
+                "avg_fare": all_fares.mean() if len(all_fares) else 0,
+                "avg_duration": all_durations.mean() if len(all_durations) else 0
             }
         }
+
+
+# == Benchmark ==
+def _synthetic_frame(rides: int, seed: int = 3) -> RideFrame:
+    rng = np.random.default_rng(seed)
+    start = np.datetime64("2025-01-01T00:00:00")
+    return RideFrame.from_columns({
+        "timestamp": (start + rng.integers(0, 120 * 86400, rides).astype("timedelta64[s]")).tolist(),
+        "status": ["completed"] * rides,
+        "pickup": [f"Stop {index}" for index in rng.integers(0, 25, rides)],
+        "wait_time": rng.integers(1, 30, rides).tolist(),
+        "duration": rng.integers(5, 60, rides).tolist(),
+        "fare": rng.uniform(40, 400, rides).round(2).tolist()
+    })
+
+def _daily(frame: RideFrame) -> Tuple[List, List[int]]:
+    days, counts = frame.daily_counts()
+    return days.astype(object).tolist(), counts.tolist()
+
+def benchmark(rides: int = 2000, repeat: int = 3):
+    """Per-output time of one savefig each (the old save_plot / get_chart_bytes paths) vs render_outputs."""
+    import time
+    
+    frame = _synthetic_frame(rides)
+    dashboard = ComprehensiveDashboard()
+    
+    def best_of(draw_outputs) -> float:
+        times = []
+        for _ in range(repeat):
+            dashboard.create_dashboard(frame, "benchmark")
+            start = time.perf_counter()
+            draw_outputs()
+            times.append(time.perf_counter() - start)
+            dashboard.close_plot()
+        return min(times)
+    
+    def savefig(name: str):
+        spec = CHART_OUTPUTS[name]
+        # A thumbnail's dpi is approximate: the tight bbox is a little narrower than the figure
+        dpi = spec.dpi or (spec.width / dashboard.figsize[0] if spec.width else "figure")
+        dashboard.fig.tight_layout()
+        dashboard.fig.savefig(BytesIO(), format=spec.format, dpi=dpi, bbox_inches="tight")
+    
+    print(f"Dashboard of {rides:,} rides, best of {repeat}:")
+    separate_total = 0.0
+    for name in CHART_OUTPUTS:
+        separate = best_of(lambda: savefig(name))
+        pipeline = best_of(lambda: dashboard.render_outputs((name,)))
+        separate_total += separate
+        print(f"  {name:>10}: savefig {separate * 1000:7.1f} ms | render_outputs {pipeline * 1000:7.1f} ms")
+    
+    together = best_of(lambda: dashboard.render_outputs(CHART_OUTPUTS))
+    print(f"  {'all four':>10}: savefig {separate_total * 1000:7.1f} ms | render_outputs {together * 1000:7.1f} ms")
+    
+    # Refresh path: a new figure per chart vs one figure whose artists are updated in place
+    frames = [_synthetic_frame(rides, seed) for seed in range(6)]
+    print(f"Refresh with new data (create + UI PNG), mean of {len(frames)}:")
+    for chart_type in (RideFrequencyChart, WaitTimeDistributionChart, ServiceCoverageChart, ComprehensiveDashboard):
+        timings = {}
+        for mode in ("new figure", "reused"):
+            chart = chart_type()
+            chart.render(frames[-1], "benchmark", _daily(frames[-1]))   # Reused: built before timing
+            start = time.perf_counter()
+            for frame in frames:
+                if mode == "new figure":
+                    chart = chart_type()
+                chart.render(frame, "benchmark", _daily(frame))
+                chart.get_chart_bytes(150)
+            timings[mode] = (time.perf_counter() - start) / len(frames)
+        print(f"  {chart_type.__name__:>26}: new figure {timings['new figure'] * 1000:7.1f} ms | "
+              f"reused {timings['reused'] * 1000:7.1f} ms")
+
+if __name__ == "__main__":
+    benchmark()
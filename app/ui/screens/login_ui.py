@@ -6,7 +6,7 @@ import time
 from app.auth.hashing import hash_password, verify_password
 from app.assets.images import set_logo
 from app.assets.audio_manager import audio, SFX
-from app.db.db_manager import init_database, get_current_mode, toggle_db, find_user, insert_user, DBMode
+from app.db.db_manager import init_database, get_current_mode, toggle_db, find_user_async, insert_user_async, DBMode
 from app.ui.components.containers import default_column, default_container, div, spaced_buttons
 from app.ui.components.dialogs import default_notif_dialog, show_auto_closing_dialog
 from app.ui.components.text import default_text, DefaultTextStyle, default_input_field, DefaultInputFieldType
@@ -15,7 +15,7 @@ from app.ui.screens.loading_screen import show_loading_screen
 from app.ui.screens.shared_ui import theme_toggle_button, mod_toggle_theme, preset_exit_button
 from app.ui.animations import container_setup
 from app.ui.styles import apply_default_page_config
-from app.utils import enable_control_after_delay, start_background_loop
+from app.utils import enable_control_after_delay, start_background_loop, run_blocking
 from app.routing.route_data import PageRoute
 
 
@@ -89,8 +89,8 @@ def main_login_ui(page: ft.Page):
             return
         
         if mode[is_login]:  # Login mode
-            user = find_user(username)
-            if user and verify_password(password, user["password"]):
+            user = await find_user_async(username)
+            if user and await run_blocking(verify_password, password, user["password"]):
                 show_message(f"Welcome, {username}! (Logged in with {current_mode}.)")
                 page.session.set("user_authenticated", True)
                 page.session.set("user_id", username)
@@ -107,12 +107,12 @@ def main_login_ui(page: ft.Page):
                 set_error(password_input, "Make sure you typed this correctly.")
                 set_error(confirm_password_input, "Mismatched passwords.")
                 show_message("Passwords do not match!", error=True)
-            elif find_user(username):
+            elif await find_user_async(username):
                 set_error(username_input, "Username already taken.")
                 show_message("Username already exists!", error=True)
             else:
-                hashed = hash_password(password)
-                insert_user(username, hashed)
+                hashed = await run_blocking(hash_password, password)
+                await insert_user_async(username, hashed)
                 switch_mode(None)
                 show_message(f"Registration successful! (Registered in {current_mode}.)")
         
@@ -1,18 +1,50 @@
 import flet as ft
 
 from app.ui.components.text import default_text, DefaultTextStyle
-from app.ui.components.buttons import preset_button, DefaultButton
-from app.ui.components.containers import div, default_row, spaced_buttons
+from app.ui.components.buttons import preset_button, DefaultButton, default_action_button
+from app.ui.components.containers import div, default_row, spaced_buttons, default_column
 from app.ui.screens.shared_ui import (
     render_page, preset_logout_button, theme_toggle_button, mod_toggle_theme, preset_exit_button,
     open_profile)
 from app.ui.animations import container_setup
 from app.assets.images import set_logo
-from app.db.db_manager import find_user
+from app.db.db_manager import find_user_async
+from app.db.fleet_analytics import get_fleet_analytics
+from app.utils import run_blocking
+
+SPARK_BARS = "▁▂▃▄▅▆▇█"
+
+def _minutes(value) -> str:
+    return "—" if value is None else f"{value:g}"
+
+def fleet_kpi_controls(kpis: dict) -> list[ft.Control]:
+    """Fleet numbers as text rows for the control center."""
+    if "error" in kpis:
+        return [default_text(DefaultTextStyle.ERROR, f"Fleet KPIs unavailable: {kpis['message']}")]
+    
+    wait = kpis["wait_times"]
+    demand = kpis["hourly_demand"]
+    peak = max(range(24), key=demand.__getitem__)
+    top = max(demand) or 1
+    sparkline = "".join(SPARK_BARS[round(count / top * (len(SPARK_BARS) - 1))] for count in demand)
+    busiest = ", ".join(f"{location} ({count:,})" for location, count in kpis["busiest_pickups"][:5]) or "—"
+    as_of = f"As of {kpis['computed_at']:%H:%M:%S}" + ("" if kpis["fresh"] else " · refreshing...")
+    if kpis["stale_users"]:
+        as_of += f" · {kpis['stale_users']:,} rider summaries awaiting rebuild (not fully counted)"
+    
+    return [
+        default_text(DefaultTextStyle.LABEL,
+                     f"🚗 {kpis['total_rides']:,} rides ({kpis['completed_rides']:,} completed) · {kpis['users']:,} riders"),
+        default_text(DefaultTextStyle.LABEL,
+                     f"⏱️ Wait p50 {_minutes(wait['p50'])} · p90 {_minutes(wait['p90'])} · p99 {_minutes(wait['p99'])} min"),
+        default_text(DefaultTextStyle.LABEL, f"📍 Busiest pickups: {busiest}"),
+        default_text(DefaultTextStyle.LABEL, f"🕒 Demand by hour {sparkline} (peak {peak:02d}:00)"),
+        default_text(DefaultTextStyle.HINT, as_of)
+    ]
 
 # TODO: Implement Admin controls for: driver and user verification.
-def handle_operator(page: ft.Page, e: ft.RouteChangeEvent, user_id: str):
-    user_doc = find_user(user_id)
+async def handle_operator(page: ft.Page, e: ft.RouteChangeEvent, user_id: str):
+    user_doc = await find_user_async(user_id)
     
     if user_doc:
         subtitle = default_text(DefaultTextStyle.SUBTITLE, "ADMIN ONLY!" if not user_doc['op'] else f"Greetings, {user_doc['username']}")
@@ -43,6 +75,24 @@ def handle_operator(page: ft.Page, e: ft.RouteChangeEvent, user_id: str):
     control_buttons = default_row([logout_btn, back_btn])
     top_row = spaced_buttons([exit_btn], [theme_toggle])
     
+    # Fleet KPIs: operators only, filled in once loaded (cached, so usually instant)
+    is_operator = bool(user_doc and user_doc['op'])
+    fleet_panel = default_column([default_text(DefaultTextStyle.HINT, "Loading fleet KPIs...")])
+    fleet_panel.visible = is_operator
+    fleet_panel.expand = False
+    engine = get_fleet_analytics() if is_operator else None
+    
+    async def show_kpis(load):
+        kpis = await run_blocking(load)
+        fleet_panel.controls = fleet_kpi_controls(kpis)
+        page.update()
+    
+    async def handle_refresh_click(e):
+        await show_kpis(engine.refresh)
+    
+    refresh_btn = default_action_button(text="Refresh", on_click=handle_refresh_click, width=140)
+    refresh_btn.visible = is_operator
+    
     render_page(page, [
         top_row,
         toggleable_logo,
@@ -50,5 +100,11 @@ def handle_operator(page: ft.Page, e: ft.RouteChangeEvent, user_id: str):
         title,
         subtitle,
         div(),
+        fleet_panel,
+        refresh_btn,
+        div(),
         control_buttons
-    ])
\ No newline at end of file
+    ])
+    
+    if is_operator:
+        await show_kpis(engine.kpis)
\ No newline at end of file
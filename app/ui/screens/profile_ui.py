@@ -1,10 +1,9 @@
 import flet as ft
 import re
-import asyncio
 
 from app.assets.audio_manager import audio, SFX
 from app.assets.images import set_logo
-from app.db.db_manager import find_user, update_user, check_matching_document
+from app.db.db_manager import find_user_async, update_user_if_changed_async
 from app.ui.components.text import default_text, DefaultTextStyle, mod_input_field
 from app.ui.components.buttons import preset_button, DefaultButton, default_action_button
 from app.ui.components.containers import div, default_row, spaced_buttons
@@ -18,8 +17,8 @@ from app.routing.route_data import PageRoute
 from datetime import datetime
 
 
-def handle_profile(page: ft.Page, e: ft.RouteChangeEvent, user_id: str):
-    user_doc = find_user(user_id)
+async def handle_profile(page: ft.Page, e: ft.RouteChangeEvent, user_id: str):
+    user_doc = await find_user_async(user_id)
     
     def on_date_picker_change(e):
         audio.play_sfx(SFX.NOTIF)
@@ -64,7 +63,7 @@ def handle_profile(page: ft.Page, e: ft.RouteChangeEvent, user_id: str):
     )
     email_field = mod_input_field(label="Email", keyboard_type=ft.KeyboardType.EMAIL)
     
-    def validate_fields(e):
+    async def validate_fields(e):
         reset_errors(e)
         
         # Sanitize phone number (remove dashes and spaces)
@@ -95,9 +94,10 @@ def handle_profile(page: ft.Page, e: ft.RouteChangeEvent, user_id: str):
         
         formatted_phone = f"+63{raw_phone}"
         
-        check = check_matching_document(
+        # One conditional write: "no changes" and "updated" come back as matched/modified
+        result = await update_user_if_changed_async(
             filter_query={"username": user_doc["username"]},
-            value_checks={
+            updated_fields={
                 "full_name": full_name_field.value.strip(),
                 "address": address_field.value.strip(),
                 "date_of_birth": dob_field.value.strip(),
@@ -105,20 +105,8 @@ def handle_profile(page: ft.Page, e: ft.RouteChangeEvent, user_id: str):
                 "email": email_field.value.strip()
             }
         )
-        
-        if not check:
-            success = update_user(
-                filter_query={"username": user_doc["username"]},
-                updated_fields={
-                    "full_name": full_name_field.value.strip(),
-                    "address": address_field.value.strip(),
-                    "date_of_birth": dob_field.value.strip(),
-                    "phone": formatted_phone,
-                    "email": email_field.value.strip()
-                }
-            )
-        else:
-            success = False
+        success = result["modified"] > 0
+        unchanged = result["matched"] > 0 and not success
             
         if success:
             audio.play_sfx(SFX.REWARD)
@@ -126,7 +114,7 @@ def handle_profile(page: ft.Page, e: ft.RouteChangeEvent, user_id: str):
             dialog_title = default_text(DefaultTextStyle.TITLE, "User Updated")
             dialog_content = default_text(DefaultTextStyle.SUBTITLE, f"{user_doc['username']}'s details successfully updated!")
             dialog_icon = ft.Icon(name=ft.Icons.INFO_ROUNDED, color=ft.Colors.PRIMARY, size=50)
-        elif not success and check:
+        elif unchanged:
             audio.play_sfx(SFX.NOTIF)
             print(f"Nothing to update for user \"{user_doc['username']}\"")
             dialog_title = default_text(DefaultTextStyle.TITLE, "No Updates")
@@ -145,7 +133,7 @@ def handle_profile(page: ft.Page, e: ft.RouteChangeEvent, user_id: str):
             content=dialog_content
         )
         
-        asyncio.run(show_auto_closing_dialog(page, dialog, 2.0))
+        await show_auto_closing_dialog(page, dialog, 2.0)
     
     submit_button = default_action_button(text="Save Profile", on_click=validate_fields)
     
@@ -1,20 +1,22 @@
 import flet as ft
 
-from app.db.mongo import connect_to_mongo
+from app.db.mongo import mongo_supervisor, PING_TIMEOUT_MS
 from app.assets.images import ImageData, default_image
-from app.db.db_manager import init_database, toggle_db
+from app.db.db_manager import init_database, toggle_db, get_collection_async
 from app.ui.components.containers import default_container, default_column
 from app.ui.components.text import default_text, DefaultTextStyle
 from app.ui.components.dialogs import default_notif_dialog
 from app.routing.route_data import PageRoute
 from app.ui.components.buttons import default_action_button
+from app.ui.screens.loading_screen import show_loading_screen
+from app.utils import run_blocking
 
 
 login_page = PageRoute.LOGIN.value
 retry_page = PageRoute.RETRY.value
 
-def check_mongo_connection(page: ft.Page):
-    collection = connect_to_mongo()
+async def check_mongo_connection(page: ft.Page, _=None):
+    collection = await get_collection_async()
 
     if collection is None:
         page.controls.clear()
@@ -27,10 +29,20 @@ def check_mongo_connection(page: ft.Page):
         warning_title.color = ft.Colors.RED
         warning_desc = default_text(DefaultTextStyle.SUBTITLE, "Please ensure the MongoDB cluster is running...")
 
-        def retry(e):
-            # Show loading while retrying
-            new_collection = init_database(page)
-            if new_collection is not None:
+        # Non-blocking snapshot from the background health monitor
+        status = mongo_supervisor.status()
+        status_text = ft.Text(
+            f"Last error: {status['last_error'] or 'unknown'}"
+            + (f" · next automatic retry in {status['next_probe_in']:.0f}s" if status["next_probe_in"] is not None else ""),
+            italic=True, opacity=0.6, text_align=ft.TextAlign.CENTER
+        )
+
+        async def retry(e):
+            # Show loading while the supervisor runs a fresh probe
+            page.controls.clear()
+            show_loading_screen(page, "Retrying MongoDB connection...")
+            healthy = await run_blocking(mongo_supervisor.wait_for_probe, PING_TIMEOUT_MS / 1000 + 1, True)
+            if healthy:
                 page.go(login_page)
             else:
                 page.go(retry_page)  # show again if still fails
@@ -60,6 +72,7 @@ def check_mongo_connection(page: ft.Page):
                 current_image,
                 warning_title,
                 warning_desc,
+                status_text,
                 retry_btn,
                 switch_btn
             ]
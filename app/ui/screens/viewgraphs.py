@@ -11,12 +11,15 @@ from app.ui.animations import container_setup
 from app.assets.images import set_logo
 from app.routing.route_data import PageRoute
 from app.services.visualization_service import RideVisualizationService
+from app.services.chart_cache import chart_cache
+from app.services.chart_renderer import chart_renderer
 
 def handle_viewgraphs(page: ft.Page, _):
     logo = set_logo()
     
-    # Initialize visualization service
+    # Initialize visualization service; render workers start while the user picks a chart
     viz_service = RideVisualizationService()
+    chart_renderer.warm_up()
     
     # Get current user from session (Flet session syntax)
     current_user = page.session.get("user_id")
@@ -48,14 +51,29 @@ def handle_viewgraphs(page: ft.Page, _):
             )
         ], horizontal_alignment=ft.CrossAxisAlignment.CENTER, spacing=10)
     
-    def show_frequency_chart(e):
-        """Show ride frequency analysis chart"""
+    def chart_theme() -> str:
+        return page.theme_mode.value if page.theme_mode else ft.ThemeMode.SYSTEM.value
+    
+    def rendering_placeholder(heading: str) -> ft.Column:
+        """Shown in the chart container while the chart renders"""
+        return ft.Column([
+            ft.ProgressRing(width=48, height=48),
+            ft.Text(heading, size=18, weight=ft.FontWeight.BOLD, text_align=ft.TextAlign.CENTER),
+            ft.Text("Rendering chart...", size=14, color=ft.Colors.OUTLINE)
+        ], alignment=ft.MainAxisAlignment.CENTER, horizontal_alignment=ft.CrossAxisAlignment.CENTER, spacing=10)
+    
+    async def show_chart(chart_type: str, icon: str, heading: str, title: str, error_label: str):
+        """Render a chart off the event loop, showing a placeholder until its PNG arrives"""
         try:
-            result = viz_service.generate_frequency_analysis(current_user, show_plot=False)
+            cached = viz_service.cached_chart_png(chart_type, current_user, chart_theme())
+            if cached is None:
+                chart_container_ref.current.content = rendering_placeholder(heading)
+                page.update()
+            result = cached or await viz_service.render_chart_png(chart_type, current_user, chart_theme())
             if "error" in result:
                 chart_container_ref.current.content = ft.Column([
-                    ft.Icon(ft.Icons.ANALYTICS, size=100, color=ft.Colors.OUTLINE),
-                    ft.Text("📊 Ride Frequency Analysis", size=24, text_align=ft.TextAlign.CENTER),
+                    ft.Icon(icon, size=100, color=ft.Colors.OUTLINE),
+                    ft.Text(heading, size=24, text_align=ft.TextAlign.CENTER),
                     ft.Text(result["error"], size=16, text_align=ft.TextAlign.CENTER, color=ft.Colors.OUTLINE),
                     ft.ElevatedButton(
                         "Start Booking Rides",
@@ -68,98 +86,38 @@ def handle_viewgraphs(page: ft.Page, _):
                     )
                 ], alignment=ft.MainAxisAlignment.CENTER, horizontal_alignment=ft.CrossAxisAlignment.CENTER)
             else:
-                chart_bytes = viz_service.frequency_chart.get_chart_bytes()
-                chart_image = create_chart_image_from_bytes(chart_bytes, "📈 Ride Frequency Analysis")
+                chart_bytes = result["png"]  # Cached while the rides are unchanged
+                chart_image = create_chart_image_from_bytes(chart_bytes, title)
                 chart_container_ref.current.content = chart_image
             page.update()
         except Exception as ex:
-            show_error_dialog(f"Failed to generate frequency chart: {str(ex)}")
+            show_error_dialog(f"Failed to generate {error_label}: {str(ex)}")
     
-    def show_wait_time_chart(e):
+    async def show_frequency_chart(e):
+        """Show ride frequency analysis chart"""
+        await show_chart("frequency", ft.Icons.ANALYTICS, "📊 Ride Frequency Analysis",
+                         "📈 Ride Frequency Analysis", "frequency chart")
+    
+    async def show_wait_time_chart(e):
         """Show wait time distribution chart"""
-        try:
-            result = viz_service.generate_wait_time_analysis(current_user, show_plot=False)
-            if "error" in result:
-                chart_container_ref.current.content = ft.Column([
-                    ft.Icon(ft.Icons.TIMER, size=100, color=ft.Colors.OUTLINE),
-                    ft.Text("⏱️ Wait Time Distribution", size=24, text_align=ft.TextAlign.CENTER),
-                    ft.Text(result["error"], size=16, text_align=ft.TextAlign.CENTER, color=ft.Colors.OUTLINE),
-                    ft.ElevatedButton(
-                        "Start Booking Rides",
-                        icon=ft.Icons.ADD_LOCATION,
-                        on_click=lambda _: page.go("/dashboard"),
-                        style=ft.ButtonStyle(
-                            bgcolor=ft.Colors.PRIMARY,
-                            color=ft.Colors.ON_PRIMARY
-                        )
-                    )
-                ], alignment=ft.MainAxisAlignment.CENTER, horizontal_alignment=ft.CrossAxisAlignment.CENTER)
-            else:
-                chart_bytes = viz_service.wait_time_chart.get_chart_bytes()
-                chart_image = create_chart_image_from_bytes(chart_bytes, "⏱️ Wait Time Distribution")
-                chart_container_ref.current.content = chart_image
-            page.update()
-        except Exception as ex:
-            show_error_dialog(f"Failed to generate wait time chart: {str(ex)}")
+        await show_chart("wait_time", ft.Icons.TIMER, "⏱️ Wait Time Distribution",
+                         "⏱️ Wait Time Distribution", "wait time chart")
     
-    def show_coverage_chart(e):
+    async def show_coverage_chart(e):
         """Show service coverage chart"""
-        try:
-            result = viz_service.generate_coverage_analysis(current_user, show_plot=False)
-            if "error" in result:
-                chart_container_ref.current.content = ft.Column([
-                    ft.Icon(ft.Icons.MAP, size=100, color=ft.Colors.OUTLINE),
-                    ft.Text("🗺️ Service Coverage Analysis", size=24, text_align=ft.TextAlign.CENTER),
-                    ft.Text(result["error"], size=16, text_align=ft.TextAlign.CENTER, color=ft.Colors.OUTLINE),
-                    ft.ElevatedButton(
-                        "Start Booking Rides",
-                        icon=ft.Icons.ADD_LOCATION,
-                        on_click=lambda _: page.go("/dashboard"),
-                        style=ft.ButtonStyle(
-                            bgcolor=ft.Colors.PRIMARY,
-                            color=ft.Colors.ON_PRIMARY
-                        )
-                    )
-                ], alignment=ft.MainAxisAlignment.CENTER, horizontal_alignment=ft.CrossAxisAlignment.CENTER)
-            else:
-                chart_bytes = viz_service.coverage_chart.get_chart_bytes()
-                chart_image = create_chart_image_from_bytes(chart_bytes, "🗺️ Service Coverage Analysis")
-                chart_container_ref.current.content = chart_image
-            page.update()
-        except Exception as ex:
-            show_error_dialog(f"Failed to generate coverage chart: {str(ex)}")
+        await show_chart("coverage", ft.Icons.MAP, "🗺️ Service Coverage Analysis",
+                         "🗺️ Service Coverage Analysis", "coverage chart")
     
-    def show_dashboard_chart(e):
+    async def show_dashboard_chart(e):
         """Show comprehensive dashboard"""
-        try:
-            result = viz_service.generate_comprehensive_dashboard(current_user, show_plot=False)
-            if "error" in result:
-                chart_container_ref.current.content = ft.Column([
-                    ft.Icon(ft.Icons.DASHBOARD, size=100, color=ft.Colors.OUTLINE),
-                    ft.Text("📋 Comprehensive Dashboard", size=24, text_align=ft.TextAlign.CENTER),
-                    ft.Text(result["error"], size=16, text_align=ft.TextAlign.CENTER, color=ft.Colors.OUTLINE),
-                    ft.ElevatedButton(
-                        "Start Booking Rides",
-                        icon=ft.Icons.ADD_LOCATION,
-                        on_click=lambda _: page.go("/dashboard"),
-                        style=ft.ButtonStyle(
-                            bgcolor=ft.Colors.PRIMARY,
-                            color=ft.Colors.ON_PRIMARY
-                        )
-                    )
-                ], alignment=ft.MainAxisAlignment.CENTER, horizontal_alignment=ft.CrossAxisAlignment.CENTER)
-            else:
-                chart_bytes = viz_service.dashboard.get_chart_bytes()
-                chart_image = create_chart_image_from_bytes(chart_bytes, "📋 Comprehensive Dashboard")
-                chart_container_ref.current.content = chart_image
-            page.update()
-        except Exception as ex:
-            show_error_dialog(f"Failed to generate dashboard: {str(ex)}")
+        await show_chart("dashboard", ft.Icons.DASHBOARD, "📋 Comprehensive Dashboard",
+                         "📋 Comprehensive Dashboard", "dashboard")
     
     def refresh_data(e):
         """Refresh charts with latest real data"""
         try:
-            # Just clear the current chart to force refresh on next view
+            # Clear the current chart, and re-check the rides on the next view
+            chart_cache.forget_version(viz_service.data_manager.store.value, current_user)
             chart_container_ref.current.content = ft.Column([
                 ft.Icon(ft.Icons.REFRESH, size=100, color=ft.Colors.PRIMARY),
                 ft.Text("Data Refreshed", size=24, text_align=ft.TextAlign.CENTER),
@@ -5,8 +5,11 @@ import asyncio
 import json
 import re
 import threading
+import functools
 
 from pathlib import Path
+from typing import Callable
+from concurrent.futures import ThreadPoolExecutor
 
 # == Debug Functions ==
 def where_am_i(stack: int = 1):
@@ -122,6 +125,15 @@ def start_background_loop():
 def get_loop():
     return _loop
 
+# Bounded pool for blocking work (DB round trips, bcrypt) awaited from async handlers.
+BLOCKING_WORKERS = 4
+_blocking_executor = ThreadPoolExecutor(max_workers=BLOCKING_WORKERS, thread_name_prefix="blocking")
+
+async def run_blocking(func: Callable, *args, **kwargs):
+    """Await a blocking call without stalling the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_blocking_executor, functools.partial(func, *args, **kwargs))
+
 
 # == Flet Utilities ==
 def flatten_controls(controls_list: list[ft.Control]) -> list[ft.Control]: